@@ -0,0 +1,147 @@
+# attack_tables.py
+#
+# Move and attack tables shared by the board backends. Everything is built once at import.
+# Squares are numbered row * 8 + col, so a8 is 0 and h1 is 63 (same orientation as ChessBoard.board).
+# Each table comes in two forms: bitboards (int, bit n = square n) for the bitboard backend,
+# and tuples of (row, col) positions for backends that walk the squares.
+
+POSITIONS = [(square // 8, square % 8) for square in range(64)]
+
+# Direction indices and their (row_delta, col_delta)
+# Directions are stored in opposite pairs, so direction ^ 1 is the reverse direction
+NORTH, SOUTH, WEST, EAST, NORTH_WEST, SOUTH_EAST, NORTH_EAST, SOUTH_WEST = range(8)
+DIRECTION_DELTAS = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1), (-1, 1), (1, -1)]
+ROOK_DIRECTIONS = (NORTH, SOUTH, WEST, EAST)
+BISHOP_DIRECTIONS = (NORTH_WEST, SOUTH_EAST, NORTH_EAST, SOUTH_WEST)
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+KNIGHT_DELTAS = [(1, 2), (1, -2), (-1, 2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1)]
+KING_DELTAS = [(1, 1), (1, 0), (1, -1), (0, 1), (0, -1), (-1, 1), (-1, 0), (-1, -1)]
+# Pawn capture deltas per color: white pawns move towards row 0, black pawns towards row 7
+PAWN_CAPTURE_DELTAS = [[(-1, -1), (-1, 1)], [(1, -1), (1, 1)]]
+
+
+def _on_board(row, col):
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def _to_bitboard(positions):
+    bitboard = 0
+    for row, col in positions:
+        bitboard |= 1 << (row * 8 + col)
+    return bitboard
+
+
+def _build_step_positions(deltas):
+    """
+    Builds the per-square target positions of a piece that moves a single step in each direction.
+    Args:
+        deltas (list): List of (row_delta, col_delta) steps.
+    Returns:
+        list: 64 tuples of reachable (row, col) positions.
+    """
+    return [tuple((row + row_delta, col + col_delta) for row_delta, col_delta in deltas
+                  if _on_board(row + row_delta, col + col_delta))
+            for row, col in POSITIONS]
+
+
+def _build_ray_positions(row_delta, col_delta):
+    """
+    Builds the per-square ray for one sliding direction, ordered outward and excluding the origin.
+    """
+    rays = []
+    for row, col in POSITIONS:
+        ray = []
+        row, col = row + row_delta, col + col_delta
+        while _on_board(row, col):
+            ray.append((row, col))
+            row, col = row + row_delta, col + col_delta
+        rays.append(tuple(ray))
+    return rays
+
+
+# Leaper tables
+KNIGHT_TARGETS = _build_step_positions(KNIGHT_DELTAS)
+KING_TARGETS = _build_step_positions(KING_DELTAS)
+PAWN_CAPTURE_TARGETS = [_build_step_positions(deltas) for deltas in PAWN_CAPTURE_DELTAS]
+
+KNIGHT_ATTACKS = [_to_bitboard(targets) for targets in KNIGHT_TARGETS]
+KING_ATTACKS = [_to_bitboard(targets) for targets in KING_TARGETS]
+PAWN_ATTACKS = [[_to_bitboard(targets) for targets in table] for table in PAWN_CAPTURE_TARGETS]
+
+# Slider tables, indexed [direction][square]
+RAY_POSITIONS = [_build_ray_positions(row_delta, col_delta) for row_delta, col_delta in DIRECTION_DELTAS]
+RAYS = [[_to_bitboard(ray) for ray in table] for table in RAY_POSITIONS]
+
+# Union of the rays on an empty board, indexed by square
+ROOK_MASKS = [RAYS[NORTH][square] | RAYS[SOUTH][square] | RAYS[WEST][square] | RAYS[EAST][square]
+              for square in range(64)]
+BISHOP_MASKS = [RAYS[NORTH_WEST][square] | RAYS[NORTH_EAST][square] | RAYS[SOUTH_WEST][square]
+                | RAYS[SOUTH_EAST][square] for square in range(64)]
+
+# Rays that increase the square index find their nearest blocker with the lowest set bit,
+# rays that decrease it with the highest set bit.
+_INCREASING = [row_delta * 8 + col_delta > 0 for row_delta, col_delta in DIRECTION_DELTAS]
+ROOK_RAYS = [(RAYS[direction], _INCREASING[direction]) for direction in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(RAYS[direction], _INCREASING[direction]) for direction in BISHOP_DIRECTIONS]
+
+
+def _build_square_pair_tables():
+    """
+    Builds the between-squares and line tables for every pair of squares.
+    Returns:
+        tuple: (DIRECTION_BETWEEN, BETWEEN, BETWEEN_POSITIONS, LINE). DIRECTION_BETWEEN[a][b] is the
+        direction from a to b or None when the squares do not share a rank, file or diagonal.
+        BETWEEN[a][b] holds the squares strictly between a and b (0 if not aligned), BETWEEN_POSITIONS
+        the same squares as positions, and LINE[a][b] the full board line through both (0 if not aligned).
+    """
+    direction_between = [[None] * 64 for _ in range(64)]
+    between = [[0] * 64 for _ in range(64)]
+    between_positions = [[()] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for start in range(64):
+        for direction, table in enumerate(RAY_POSITIONS):
+            full_line = RAYS[direction][start] | RAYS[direction ^ 1][start] | (1 << start)
+            ray = table[start]
+            for index, (row, col) in enumerate(ray):
+                end = row * 8 + col
+                direction_between[start][end] = direction
+                between_positions[start][end] = ray[:index]
+                between[start][end] = _to_bitboard(ray[:index])
+                line[start][end] = full_line
+    return direction_between, between, between_positions, line
+
+
+DIRECTION_BETWEEN, BETWEEN, BETWEEN_POSITIONS, LINE = _build_square_pair_tables()
+
+
+def _slider_attacks(square, occupied, rays):
+    """
+    Computes the attack set of a sliding piece from a square given the board occupancy.
+    Args:
+        square (int): The square of the slider.
+        occupied (int): Bitboard of all occupied squares.
+        rays (list): ROOK_RAYS or BISHOP_RAYS.
+    Returns:
+        int: Bitboard of attacked squares (including the first blocker on each ray).
+    """
+    attacks = 0
+    for table, increasing in rays:
+        ray = table[square]
+        blockers = ray & occupied
+        if blockers:
+            if increasing:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= table[blocker]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(square, occupied):
+    return _slider_attacks(square, occupied, ROOK_RAYS)
+
+
+def bishop_attacks(square, occupied):
+    return _slider_attacks(square, occupied, BISHOP_RAYS)
@@ -0,0 +1,26 @@
+# backends.py
+
+from chess_board import ChessBoard
+from bitboard import BitboardChessBoard
+
+# Board representations that implement the ChessBoard public API
+BACKENDS = {
+    'mailbox': ChessBoard,
+    'bitboard': BitboardChessBoard,
+}
+
+
+def create_board(backend='mailbox', fen=None):
+    """
+    Creates a board using the selected representation.
+    Args:
+        backend (str): Name of the backend ('mailbox' or 'bitboard').
+        fen (str): Optional starting position in FEN; the standard starting position if omitted.
+    Returns:
+        ChessBoard or BitboardChessBoard: The new board.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown board backend: {backend}")
+    if fen is not None:
+        return BACKENDS[backend].from_fen(fen)
+    return BACKENDS[backend]()
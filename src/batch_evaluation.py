@@ -0,0 +1,219 @@
+# batch_evaluation.py
+#
+# Scores many positions in one call with NumPy, for work that can collect positions before it needs
+# their scores: ranking root moves, labelling training data. Positions are encoded as one row of 64
+# piece codes (zobrist.PIECE_NAMES numbering, EMPTY for an empty square) per position, squares
+# numbered row * 8 + col from a8, built from boards or straight from FEN strings. The score is the
+# tapered piece-square evaluation of evaluation.py plus mobility: every knight, bishop, rook and
+# queen earns MOBILITY centipawns for each square it attacks that is not occupied by a piece of its
+# own color. Every term is computed for all positions at once, so the per-position cost is a few
+# array elements rather than interpreted Python.
+#
+# Usage:
+#   python batch_evaluation.py positions.epd --output labels.tsv   label a file of FEN or EPD lines
+#   python batch_evaluation.py positions.epd --no-mobility         piece-square terms only
+
+import argparse
+import sys
+from itertools import islice
+
+try:
+    import numpy as np
+    from bitboard_arrays import (DIAGONAL_STEPS, KNIGHT_STEPS, STRAIGHT_STEPS, piece_bitboards, popcount,
+                                 ray_attacks, step)
+except ImportError:
+    np = None
+
+from evaluation import MIDDLEGAME_TABLES, ENDGAME_TABLES, PIECE_PHASES, MAX_PHASE
+from zobrist import PIECE_NAMES
+
+NUMPY_AVAILABLE = np is not None
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+EMPTY = 12
+
+# Centipawns per attacked square, as (middlegame, endgame), by piece type
+MOBILITY = {KNIGHT: (4, 4), BISHOP: (5, 5), ROOK: (2, 4), QUEEN: (1, 2)}
+
+# Positions scored per block, which bounds the memory taken by the intermediate arrays
+BLOCK_SIZE = 4096
+
+# Piece code of each FEN letter
+_FEN_CODES = {name[1] if name[0] == 'w' else name[1].lower(): code for code, name in enumerate(PIECE_NAMES)}
+# Expands a FEN piece placement field to one character per square
+_FEN_EXPANSION = str.maketrans({**{str(count): '.' * count for count in range(1, 9)}, '/': ''})
+
+if NUMPY_AVAILABLE:
+    _CODES = np.full(256, 255, dtype=np.uint8)  # Piece code by FEN character; 255 marks invalid characters
+    _CODES[ord('.')] = EMPTY
+    for _letter, _code in _FEN_CODES.items():
+        _CODES[ord(_letter)] = _code
+
+    # Tables by piece code (EMPTY adds nothing) and square
+    _MIDDLEGAME = np.array(MIDDLEGAME_TABLES + [[0] * 64], dtype=np.int32)
+    _ENDGAME = np.array(ENDGAME_TABLES + [[0] * 64], dtype=np.int32)
+    _PHASES = np.array(PIECE_PHASES + (0,), dtype=np.int32)
+    _SQUARES = np.arange(64)
+
+
+def _require_numpy():
+    if not NUMPY_AVAILABLE:
+        raise ImportError("Batch evaluation needs NumPy (pip install numpy)")
+
+
+def encode_boards(boards):
+    """
+    Encodes positions for evaluate_encoded.
+    Args:
+        boards (iterable): ChessBoard or BitboardChessBoard positions.
+    Returns:
+        ndarray: uint8 piece codes shaped (positions, 64).
+    """
+    _require_numpy()
+    return np.array([board.piece_codes() for board in boards], dtype=np.uint8).reshape(-1, 64)
+
+
+def encode_fens(fens):
+    """
+    Encodes positions for evaluate_encoded from their FEN strings, without building boards. Only the
+    piece placement field is read, so EPD records work as well.
+    Args:
+        fens (iterable): FEN or EPD strings.
+    Returns:
+        ndarray: uint8 piece codes shaped (positions, 64).
+    Raises:
+        ValueError: If a piece placement field is malformed.
+    """
+    _require_numpy()
+    placements = [fen.split(None, 1)[0].translate(_FEN_EXPANSION) for fen in fens]
+    for placement in placements:
+        if len(placement) != 64:
+            raise ValueError(f"Invalid FEN piece placement: {placement!r}")
+    codes = _CODES[np.frombuffer(''.join(placements).encode('ascii', 'replace'), dtype=np.uint8)]
+    if (codes == 255).any():
+        raise ValueError("Invalid character in a FEN piece placement")
+    return codes.reshape(-1, 64)
+
+
+def evaluate_encoded(codes, mobility=True):
+    """
+    Scores encoded positions.
+    Args:
+        codes (ndarray): Piece codes shaped (positions, 64), as from encode_boards or encode_fens.
+        mobility (bool): Whether to add the mobility terms; without them every score equals the
+            board's own evaluate().
+    Returns:
+        ndarray: int32 scores in centipawns, positive when white is better, one per position.
+    """
+    _require_numpy()
+    codes = np.asarray(codes, dtype=np.uint8).reshape(-1, 64)
+    scores = np.empty(len(codes), dtype=np.int32)
+    for start in range(0, len(codes), BLOCK_SIZE):
+        block = codes[start:start + BLOCK_SIZE]
+        middlegame = _MIDDLEGAME[block, _SQUARES].sum(axis=1)
+        endgame = _ENDGAME[block, _SQUARES].sum(axis=1)
+        phase = np.minimum(_PHASES[block].sum(axis=1), MAX_PHASE)
+        if mobility:
+            middlegame_mobility, endgame_mobility = _mobility(block)
+            middlegame += middlegame_mobility
+            endgame += endgame_mobility
+        total = middlegame * phase + endgame * (MAX_PHASE - phase)
+        # Round towards zero, as tapered_score does
+        scores[start:start + BLOCK_SIZE] = np.sign(total) * (np.abs(total) // MAX_PHASE)
+    return scores
+
+
+def _mobility(codes):
+    """
+    Returns:
+        tuple: (middlegame, endgame) mobility totals of each position, as int32 arrays.
+    """
+    pieces = piece_bitboards(codes)
+    occupancy = [np.bitwise_or.reduce(pieces[:, 6 * color:6 * color + 6], axis=1) for color in range(2)]
+    empty = ~(occupancy[0] | occupancy[1])
+
+    middlegame = np.zeros(len(codes), dtype=np.int32)
+    endgame = np.zeros(len(codes), dtype=np.int32)
+    for color, sign in ((0, 1), (1, -1)):
+        targets = ~occupancy[color]
+        for piece_type, steps, slides in ((KNIGHT, KNIGHT_STEPS, False), (BISHOP, DIAGONAL_STEPS, True),
+                                          (ROOK, STRAIGHT_STEPS, True), (QUEEN, DIAGONAL_STEPS + STRAIGHT_STEPS, True)):
+            movers = pieces[:, 6 * color + piece_type]
+            # Along one direction no two sliders attack the same square, and a knight step moves every
+            # knight to a different square, so one count per step adds up the counts of every piece
+            count = sum(popcount((ray_attacks(movers, empty, direction) if slides else step(movers, direction))
+                                 & targets).astype(np.int32) for direction in steps)
+            middlegame += sign * MOBILITY[piece_type][0] * count
+            endgame += sign * MOBILITY[piece_type][1] * count
+    return middlegame, endgame
+
+
+class PositionBatch:
+    def __init__(self):
+        """
+        Collects positions to be scored together by evaluate.
+        """
+        self._codes = []  # Piece codes of each position added, as from board.piece_codes
+
+    def __len__(self):
+        return len(self._codes)
+
+    def add(self, board):
+        """
+        Adds a board's current position; the board may change afterwards.
+        """
+        self._codes.append(board.piece_codes())
+
+    def clear(self):
+        self._codes = []
+
+    def evaluate(self, mobility=True):
+        """
+        Scores every position added, in order (see evaluate_encoded).
+        Returns:
+            ndarray: int32 scores in centipawns, positive when white is better.
+        """
+        _require_numpy()
+        return evaluate_encoded(np.array(self._codes, dtype=np.uint8).reshape(-1, 64), mobility)
+
+
+def label_positions(lines, mobility=True, block_size=BLOCK_SIZE):
+    """
+    Scores a stream of positions a block at a time, so that files of any size can be labelled.
+    Args:
+        lines (iterable): FEN or EPD lines; blank lines and lines starting with '#' are skipped.
+        mobility (bool): Whether to add the mobility terms.
+        block_size (int): Positions read and scored at once.
+    Yields:
+        tuple: (FEN or EPD line without its line break, score in centipawns, positive when white is better).
+    """
+    positions = (line.strip() for line in lines)
+    positions = (line for line in positions if line and not line.startswith('#'))
+    while True:
+        block = list(islice(positions, block_size))
+        if not block:
+            return
+        yield from zip(block, evaluate_encoded(encode_fens(block), mobility).tolist())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Label positions with the batch evaluation.")
+    parser.add_argument('positions', help="file with one FEN or EPD position per line")
+    parser.add_argument('--output', metavar='PATH', help="write 'position<TAB>score' lines here instead of stdout")
+    parser.add_argument('--no-mobility', action='store_true', help="leave out the mobility terms")
+    args = parser.parse_args(argv)
+    _require_numpy()
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        with open(args.positions) as positions:
+            for position, score in label_positions(positions, not args.no_mobility):
+                output.write(f"{position}\t{score}\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1104 @@
+# bitboard.py
+
+from attack_tables import (POSITIONS, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, BETWEEN, LINE, ROOK_MASKS,
+                           BISHOP_MASKS, rook_attacks, bishop_attacks)
+from fen import STARTING_FEN, parse_fen, format_fen
+from moves import (QUIET, DOUBLE_PAWN_PUSH, KING_CASTLE, QUEEN_CASTLE, CAPTURE, EN_PASSANT, PROMOTION,
+                   PROMOTION_FLAGS, MAX_MOVES, NULL_MOVE, encode, decode_move)
+from evaluation import (SEE_VALUES, MIDDLEGAME_TABLES, ENDGAME_TABLES, PIECE_PHASES, evaluation_terms,
+                        tapered_score)
+from zobrist import (PIECE_NAMES, PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EN_PASSANT_KEYS, CASTLING_BITS,
+                     WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE, compute_key,
+                     compute_pawn_key)
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+EMPTY = 12  # Piece code piece_codes gives empty squares, as on the mailbox board
+
+# Piece index = color * 6 + piece type, in PIECE_NAMES order
+PIECE_INDEX = {name: index for index, name in enumerate(PIECE_NAMES)}
+PIECE_SQUARE_KEYS = [PIECE_KEYS[name] for name in PIECE_NAMES]
+
+# Move flags shifted into place, so generation can OR them straight into a packed move
+_CAPTURE = CAPTURE << 12
+_DOUBLE_PAWN_PUSH = DOUBLE_PAWN_PUSH << 12
+_EN_PASSANT = EN_PASSANT << 12
+_PROMOTIONS = tuple(PROMOTION_FLAGS[letter] << 12 for letter in 'QRBN')
+
+# Rights that survive a move touching each square (king and rook home squares clear their rights)
+CASTLING_MASK = [0b1111] * 64
+CASTLING_MASK[60] = 0b1111 & ~(WHITE_KING_SIDE | WHITE_QUEEN_SIDE)
+CASTLING_MASK[63] = 0b1111 & ~WHITE_KING_SIDE
+CASTLING_MASK[56] = 0b1111 & ~WHITE_QUEEN_SIDE
+CASTLING_MASK[4] = 0b1111 & ~(BLACK_KING_SIDE | BLACK_QUEEN_SIDE)
+CASTLING_MASK[7] = 0b1111 & ~BLACK_KING_SIDE
+CASTLING_MASK[0] = 0b1111 & ~BLACK_QUEEN_SIDE
+
+# (right bit, king from, king to, rook from, rook to, squares that must be empty, squares that must not be attacked,
+#  packed move)
+CASTLING_MOVES = [
+    [(WHITE_KING_SIDE, 60, 62, 63, 61, (1 << 61) | (1 << 62), (60, 61, 62), encode(60, 62, KING_CASTLE)),
+     (WHITE_QUEEN_SIDE, 60, 58, 56, 59, (1 << 57) | (1 << 58) | (1 << 59), (60, 59, 58), encode(60, 58, QUEEN_CASTLE))],
+    [(BLACK_KING_SIDE, 4, 6, 7, 5, (1 << 5) | (1 << 6), (4, 5, 6), encode(4, 6, KING_CASTLE)),
+     (BLACK_QUEEN_SIDE, 4, 2, 0, 3, (1 << 1) | (1 << 2) | (1 << 3), (4, 3, 2), encode(4, 2, QUEEN_CASTLE))],
+]
+CASTLING_ROOK_MOVES = {(60, 62): (63, 61), (60, 58): (56, 59), (4, 6): (7, 5), (4, 2): (0, 3)}
+
+# Back ranks, where pawn pushes promote
+PROMOTION_RANKS = 0xFF000000000000FF
+
+
+def iter_squares(bitboard):
+    """
+    Yields the index of every set bit in a bitboard.
+    """
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+class BitboardChessBoard:
+    def __init__(self, fen=None):
+        """
+        Initializes a bitboard position. Exposes the same public API as ChessBoard.
+        Args:
+            fen (str): Optional position in Forsyth-Edwards Notation; the starting setup if omitted.
+        """
+        self.move_history = []             # Packed moves made so far
+        self._undo_stack = []
+        self._null_stack = []              # One record per null move made, consumed by undo_null_move
+        self._move_buffer = [0] * MAX_MOVES  # Scratch buffer for the list-returning move queries
+        self.debug_zobrist = False         # When True, every make/undo checks the key against a full recompute
+        self.debug_evaluation = False      # When True, every make/undo checks the evaluation totals the same way
+        self.instrumentation = None        # Receives the events of execute_move when set
+        self.accumulator = None            # NNUE accumulator updated by every make/undo when set, see nnue.py
+        self._legal_index = None           # (zobrist key, side, index) behind legal_move_index
+        self._set_position(parse_fen(fen or STARTING_FEN))
+
+    @classmethod
+    def from_fen(cls, fen):
+        """
+        Creates a board from a position in Forsyth-Edwards Notation.
+        Args:
+            fen (str): The position, e.g. 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1'.
+        Returns:
+            BitboardChessBoard: The new board.
+        Raises:
+            ValueError: If the FEN is malformed or a side does not have exactly one king.
+        """
+        board = cls(fen)
+        if bin(board.pieces[KING]).count('1') != 1 or bin(board.pieces[6 + KING]).count('1') != 1:
+            raise ValueError(f"Invalid FEN (each side needs exactly one king): {fen!r}")
+        return board
+
+    def _set_position(self, position):
+        """
+        Replaces the board contents with a position parsed by fen.parse_fen.
+        """
+        self.pieces = [0] * 12             # One bitboard per piece index
+        self.squares = [None] * 64         # Piece index on each square, None if empty
+        self.occupancy = [0, 0]            # White and black occupancy
+        self.occupied = 0
+        for piece, (row, col) in position['pieces']:
+            self._put(PIECE_INDEX[piece], row * 8 + col)
+        self.castling = 0
+        for color, sides in CASTLING_BITS.items():
+            for side, bit in sides.items():
+                if position['castling_rights'][color][side]:
+                    self.castling |= bit
+        target = position['en_passant_target']
+        self.ep_square = target[0] * 8 + target[1] if target else None  # Square eligible for en passant capture
+        self.side = WHITE if position['turn'] == 'white' else BLACK
+        self._start_clocks = (position['halfmove_clock'], position['fullmove_number'])  # Move counters at load time
+        self._hashed_ep_file = self._ep_hash_file()  # En passant file included in the key
+        self.zobrist_key = self.compute_zobrist_key()
+        self.pawn_key = self.compute_pawn_key()  # Zobrist key of the pawns alone
+        # Running evaluation totals, see evaluation.py
+        self.middlegame_score, self.endgame_score, self.phase = self.compute_evaluation_terms()
+
+    def _put(self, piece, square):
+        bit = 1 << square
+        self.pieces[piece] |= bit
+        self.occupancy[piece // 6] |= bit
+        self.occupied |= bit
+        self.squares[square] = piece
+
+    def _remove(self, piece, square):
+        bit = 1 << square
+        self.pieces[piece] ^= bit
+        self.occupancy[piece // 6] ^= bit
+        self.occupied ^= bit
+        self.squares[square] = None
+
+    # Compatibility views used by the GUI and the AI
+
+    @property
+    def turn(self):
+        return 'white' if self.side == WHITE else 'black'
+
+    @turn.setter
+    def turn(self, color):
+        self.side = WHITE if color == 'white' else BLACK
+
+    @property
+    def board(self):
+        """
+        Returns:
+            list: 8x8 grid with piece representation, built from the bitboards.
+        """
+        grid = [['..'] * 8 for _ in range(8)]
+        for square, piece in enumerate(self.squares):
+            if piece is not None:
+                grid[square // 8][square % 8] = PIECE_NAMES[piece]
+        return grid
+
+    @property
+    def piece_positions(self):
+        """
+        Returns:
+            dict: A dictionary mapping every piece type (even if absent) to its list of positions.
+        """
+        return {PIECE_NAMES[piece]: [POSITIONS[square] for square in iter_squares(bitboard)]
+                for piece, bitboard in enumerate(self.pieces)}
+
+    @property
+    def king_positions(self):
+        return [POSITIONS[self._king_square(WHITE)], POSITIONS[self._king_square(BLACK)]]
+
+    @property
+    def castling_rights(self):
+        return {color: {side: bool(self.castling & bit) for side, bit in sides.items()}
+                for color, sides in CASTLING_BITS.items()}
+
+    @property
+    def en_passant_target(self):
+        return POSITIONS[self.ep_square] if self.ep_square is not None else None
+
+    @property
+    def halfmove_clock(self):
+        """
+        Returns:
+            int: Plies since the last capture or pawn move, counting from the clock the position was loaded with.
+        """
+        clock = 0
+        for record in reversed(self._undo_stack):
+            if record[1] % 6 == PAWN or record[0] >> 12 & CAPTURE:
+                return clock
+            clock += 1
+        return clock + self._start_clocks[0]
+
+    @property
+    def fullmove_number(self):
+        """
+        Returns:
+            int: The number of the current full move, starting from the number the position was loaded with.
+        """
+        started_black = (self.side ^ len(self._undo_stack)) & 1
+        return self._start_clocks[1] + (len(self._undo_stack) + started_black) // 2
+
+    def to_fen(self):
+        """
+        Returns:
+            str: The position in Forsyth-Edwards Notation.
+        """
+        return format_fen({
+            'pieces': [(piece, position) for piece, positions in self.piece_positions.items() for position in positions],
+            'turn': self.turn,
+            'castling_rights': self.castling_rights,
+            'en_passant_target': self.en_passant_target,
+            'halfmove_clock': self.halfmove_clock,
+            'fullmove_number': self.fullmove_number,
+        })
+
+    def piece_at(self, position):
+        """
+        Args:
+            position (tuple): The square (row, col).
+        Returns:
+            str: The piece on the square (e.g. 'wP'), or '..' if it is empty.
+        """
+        piece = self.squares[position[0] * 8 + position[1]]
+        return PIECE_NAMES[piece] if piece is not None else '..'
+
+    def display_board(self):
+        """
+        Prints the chessboard in a human-readable format.
+        """
+        for row in self.board:
+            print(' '.join(row))
+        print()
+
+    # Attack queries
+
+    def _king_square(self, color):
+        return self.pieces[color * 6 + KING].bit_length() - 1
+
+    def _is_attacked(self, square, by_color, occupied, exclude=0):
+        """
+        Checks whether a square is attacked by a color, looking outward from the square.
+        Args:
+            square (int): The target square.
+            by_color (int): WHITE or BLACK, the attacking side.
+            occupied (int): Occupancy to use for sliding attacks.
+            exclude (int): Bitboard of attacking pieces to ignore (e.g. a piece about to be captured).
+        Returns:
+            bool: True if any piece of by_color attacks the square.
+        """
+        pieces = self.pieces
+        base = by_color * 6
+        if KNIGHT_ATTACKS[square] & pieces[base + KNIGHT] & ~exclude:
+            return True
+        # A pawn of by_color attacks the square if it stands where a pawn of the other color on the square would attack
+        if PAWN_ATTACKS[by_color ^ 1][square] & pieces[base + PAWN] & ~exclude:
+            return True
+        if KING_ATTACKS[square] & pieces[base + KING]:
+            return True
+        rooks = (pieces[base + ROOK] | pieces[base + QUEEN]) & ~exclude
+        if rooks and rook_attacks(square, occupied) & rooks:
+            return True
+        bishops = (pieces[base + BISHOP] | pieces[base + QUEEN]) & ~exclude
+        if bishops and bishop_attacks(square, occupied) & bishops:
+            return True
+        return False
+
+    def is_check(self, color):
+        """
+        Checks if the player's king is in check.
+        Args:
+            color (str): The color of the player ('white' or 'black').
+        Returns:
+            bool: True if the king is in check, False otherwise.
+        """
+        side = WHITE if color == 'white' else BLACK
+        return self._is_attacked(self._king_square(side), side ^ 1, self.occupied)
+
+    def is_check_on_position(self, position, color):
+        """
+        Checks if a specific position is under attack by opponent pieces.
+        Args:
+            position (tuple): The position to check (row, col).
+            color (str): The color of the player ('white' or 'black').
+        Returns:
+            bool: True if the position is under attack, False otherwise.
+        """
+        side = WHITE if color == 'white' else BLACK
+        return self._is_attacked(position[0] * 8 + position[1], side ^ 1, self.occupied)
+
+    def is_square_attacked(self, square, by_color):
+        """
+        Checks if a square is attacked by a color, stopping at the first attacker found.
+        Args:
+            square (tuple): The square to check (row, col).
+            by_color (str): The attacking color ('white' or 'black').
+        Returns:
+            bool: True if any piece of by_color attacks the square, False otherwise.
+        """
+        return self._is_attacked(square[0] * 8 + square[1], WHITE if by_color == 'white' else BLACK, self.occupied)
+
+    def king_squares(self):
+        """
+        Returns:
+            tuple: The white and black king squares, numbered row * 8 + col.
+        """
+        return self._king_square(WHITE), self._king_square(BLACK)
+
+    def piece_codes(self):
+        """
+        Returns:
+            list: The piece code on each square numbered row * 8 + col, EMPTY (12) for an empty
+            square; pieces are numbered as in zobrist.PIECE_NAMES.
+        """
+        return [EMPTY if piece is None else piece for piece in self.squares]
+
+    def pawn_bitboards(self):
+        """
+        Returns:
+            tuple: White and black pawns as 64-bit masks, bit row * 8 + col set for each pawn.
+        """
+        return self.pieces[PAWN], self.pieces[6 + PAWN]
+
+    def non_pawn_material(self, color):
+        """
+        Args:
+            color (str): 'white' or 'black'.
+        Returns:
+            int: The SEE_VALUES total of the color's knights, bishops, rooks and queens.
+        """
+        base = 0 if color == 'white' else 6
+        return sum(SEE_VALUES[piece_type] * bin(self.pieces[base + piece_type]).count('1')
+                   for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN))
+
+    def see(self, move):
+        """
+        Static exchange evaluation: the material the side to move wins by playing a move and then
+        letting both sides keep recapturing on its destination square with their least valuable
+        attacker, each side free to stop when continuing would lose more. X-ray attackers behind
+        the pieces that capture join in as the line opens.
+        Args:
+            move (int): A packed move of the side to move, usually a capture.
+        Returns:
+            int: The expected material balance of the exchange, in SEE_VALUES units (negative if it loses).
+        """
+        frm, to, flags = move & 63, move >> 6 & 63, move >> 12
+        pieces = self.pieces
+        occupancy = self.occupancy
+        occupied = self.occupied ^ (1 << frm)
+        gains = [0]
+        if flags == EN_PASSANT:
+            gains[0] = SEE_VALUES[PAWN]
+            occupied ^= 1 << (to + (8 if self.side == WHITE else -8))
+        elif flags & CAPTURE:
+            gains[0] = SEE_VALUES[self.squares[to] % 6]
+        attacker_value = SEE_VALUES[self.squares[frm] % 6]
+        if flags & PROMOTION:
+            attacker_value = SEE_VALUES[KNIGHT + (flags & 3)]
+            gains[0] += attacker_value - SEE_VALUES[PAWN]
+
+        bishops = pieces[BISHOP] | pieces[QUEEN] | pieces[6 + BISHOP] | pieces[6 + QUEEN]
+        rooks = pieces[ROOK] | pieces[QUEEN] | pieces[6 + ROOK] | pieces[6 + QUEEN]
+        attackers = ((KNIGHT_ATTACKS[to] & (pieces[KNIGHT] | pieces[6 + KNIGHT]))
+                     | (KING_ATTACKS[to] & (pieces[KING] | pieces[6 + KING]))
+                     | (PAWN_ATTACKS[BLACK][to] & pieces[PAWN]) | (PAWN_ATTACKS[WHITE][to] & pieces[6 + PAWN])
+                     | (bishop_attacks(to, occupied) & bishops) | (rook_attacks(to, occupied) & rooks)) & occupied
+        side = self.side ^ 1
+        while True:
+            own = attackers & occupancy[side]
+            if not own:
+                break
+            for piece_type in range(6):
+                candidates = own & pieces[side * 6 + piece_type]
+                if candidates:
+                    break
+            if piece_type == KING and attackers & occupancy[side ^ 1]:  # The king may not capture into check
+                break
+            gains.append(attacker_value - gains[-1])
+            attacker_value = SEE_VALUES[piece_type]
+            occupied ^= candidates & -candidates  # Lowest square first, as on the mailbox board
+            attackers = (attackers | (bishop_attacks(to, occupied) & bishops)
+                         | (rook_attacks(to, occupied) & rooks)) & occupied
+            side ^= 1
+        # Work back from the end of the sequence: each side only captures if it does not lose by it
+        for index in range(len(gains) - 1, 0, -1):
+            gains[index - 1] = -max(-gains[index - 1], gains[index])
+        return gains[0]
+
+    def is_path_clear(self, start, end):
+        """
+        Checks if the path between two squares on a shared rank, file or diagonal is clear.
+        Args:
+            start (tuple): Starting position (row, col).
+            end (tuple): Ending position (row, col).
+        Returns:
+            bool: True if the path is clear, False otherwise.
+        """
+        return not BETWEEN[start[0] * 8 + start[1]][end[0] * 8 + end[1]] & self.occupied
+
+    # Move generation
+
+    def _pawn_moves(self, frm, targets, moves, count):
+        """
+        Stores the pawn moves from one square to the target squares, expanding moves to the last rank
+        into the four promotions.
+        """
+        squares = self.squares
+        for to in iter_squares(targets):
+            flags = _CAPTURE if squares[to] is not None else 0
+            if to < 8 or to >= 56:
+                for promotion in _PROMOTIONS:
+                    moves[count] = frm | to << 6 | flags | promotion
+                    count += 1
+            else:
+                moves[count] = frm | to << 6 | flags
+                count += 1
+        return count
+
+    def _pseudo_legal_moves(self, side, moves, count=0, origins=-1, noisy=True, quiet=True):
+        """
+        Generates pseudo-legal moves for one side with set operations on the bitboards.
+        Args:
+            side (int): WHITE or BLACK.
+            moves (list): Buffer the packed moves are stored into.
+            count (int): Index of the first free slot in the buffer.
+            origins (int): Optional bitboard restricting the origin squares.
+            noisy (bool): Whether to generate captures, en passant and promotions.
+            quiet (bool): Whether to generate the remaining moves, castling included.
+        Returns:
+            int: The index after the last stored move.
+        """
+        pieces = self.pieces
+        base = side * 6
+        enemy = self.occupancy[side ^ 1]
+        occupied = self.occupied
+        empty = ~occupied
+        targets = (enemy if noisy else 0) | (empty if quiet else 0)
+
+        # Pawns: pushes, double pushes, captures and en passant
+        pawns = pieces[base + PAWN] & origins
+        if side == WHITE:
+            single = (pawns >> 8) & empty
+            double = ((single & 0x0000FF0000000000) >> 8) & empty
+            step = 8
+        else:
+            single = (pawns << 8) & empty & 0xFFFFFFFFFFFFFFFF
+            double = ((single & 0x0000000000FF0000) << 8) & empty
+            step = -8
+        if not noisy:
+            single &= ~PROMOTION_RANKS
+        elif not quiet:
+            single &= PROMOTION_RANKS
+        for to in iter_squares(single):
+            count = self._pawn_moves(to + step, 1 << to, moves, count)
+        if quiet:
+            for to in iter_squares(double):
+                moves[count] = (to + 2 * step) | to << 6 | _DOUBLE_PAWN_PUSH
+                count += 1
+        if noisy:
+            ep_square = self.ep_square if side == self.side else None  # Only the side to move may take en passant
+            pawn_attacks = PAWN_ATTACKS[side]
+            for frm in iter_squares(pawns):
+                count = self._pawn_moves(frm, pawn_attacks[frm] & enemy, moves, count)
+                if ep_square is not None and pawn_attacks[frm] >> ep_square & 1:
+                    moves[count] = frm | ep_square << 6 | _EN_PASSANT
+                    count += 1
+
+        for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            for frm in iter_squares(pieces[base + piece_type] & origins):
+                if piece_type == KNIGHT:
+                    attacks = KNIGHT_ATTACKS[frm]
+                elif piece_type == BISHOP:
+                    attacks = bishop_attacks(frm, occupied)
+                elif piece_type == ROOK:
+                    attacks = rook_attacks(frm, occupied)
+                elif piece_type == QUEEN:
+                    attacks = rook_attacks(frm, occupied) | bishop_attacks(frm, occupied)
+                else:
+                    attacks = KING_ATTACKS[frm]
+                attacks &= targets
+                for to in iter_squares(attacks & enemy):
+                    moves[count] = frm | to << 6 | _CAPTURE
+                    count += 1
+                for to in iter_squares(attacks & empty):
+                    moves[count] = frm | to << 6
+                    count += 1
+        if quiet and pieces[base + KING] & origins:
+            for right, king_from, _, _, _, empty_mask, safe_squares, move in CASTLING_MOVES[side]:
+                if (self.castling & right and pieces[base + KING] >> king_from & 1 and not occupied & empty_mask
+                        and not any(self._is_attacked(square, side ^ 1, occupied) for square in safe_squares)):
+                    moves[count] = move
+                    count += 1
+        return count
+
+    def _is_legal(self, frm, to, side):
+        """
+        Checks that a pseudo-legal move does not leave the mover's king attacked, without making it.
+        """
+        piece = self.squares[frm]
+        captured_square = to
+        if piece == side * 6 + PAWN and to == self.ep_square:
+            captured_square = to + (8 if side == WHITE else -8)
+        captured_bit = 1 << captured_square if self.squares[captured_square] is not None else 0
+        occupied = (self.occupied ^ (1 << frm) ^ captured_bit) | (1 << to)
+        king_square = to if piece == side * 6 + KING else self._king_square(side)
+        return not self._is_attacked(king_square, side ^ 1, occupied, captured_bit)
+
+    def _checkers_and_pins(self, side):
+        """
+        Works out the pieces giving check and the absolutely pinned pieces from the king's square.
+        Args:
+            side (int): WHITE or BLACK, the side whose king is examined.
+        Returns:
+            tuple: (checkers, pins). checkers is a bitboard of checking pieces, pins maps each pinned
+            square to the bitboard of squares it may still move to (the line up to and including the pinner).
+        """
+        pieces = self.pieces
+        base = (side ^ 1) * 6
+        king_square = self._king_square(side)
+        occupied = self.occupied
+        rooks = pieces[base + ROOK] | pieces[base + QUEEN]
+        bishops = pieces[base + BISHOP] | pieces[base + QUEEN]
+
+        checkers = ((KNIGHT_ATTACKS[king_square] & pieces[base + KNIGHT])
+                    | (PAWN_ATTACKS[side][king_square] & pieces[base + PAWN])
+                    | (rook_attacks(king_square, occupied) & rooks)
+                    | (bishop_attacks(king_square, occupied) & bishops))
+
+        # Sliders lined up with the king behind exactly one own piece pin it
+        pins = {}
+        own = self.occupancy[side]
+        snipers = ((ROOK_MASKS[king_square] & rooks) | (BISHOP_MASKS[king_square] & bishops)) & ~checkers
+        for sniper in iter_squares(snipers):
+            between = BETWEEN[king_square][sniper]
+            blockers = between & occupied
+            if blockers & own and not blockers & (blockers - 1):
+                pins[blockers.bit_length() - 1] = between | (1 << sniper)
+        return checkers, pins
+
+    def _legal_moves(self, side, moves, count=0, origins=-1):
+        """
+        Generates legal moves directly, using the checkers and pins so that only king moves and
+        en passant need an attack test.
+        Args:
+            side (int): WHITE or BLACK.
+            moves (list): Buffer the packed moves are stored into.
+            count (int): Index of the first free slot in the buffer.
+            origins (int): Optional bitboard restricting the origin squares.
+        Returns:
+            int: The index after the last stored move.
+        """
+        pieces = self.pieces
+        base = side * 6
+        own = self.occupancy[side]
+        enemy = self.occupancy[side ^ 1]
+        occupied = self.occupied
+        king_square = self._king_square(side)
+        checkers, pins = self._checkers_and_pins(side)
+
+        # King moves: the destination must not be attacked once the king has left its square
+        if origins & (1 << king_square):
+            without_king = occupied ^ (1 << king_square)
+            for to in iter_squares(KING_ATTACKS[king_square] & ~own):
+                if not self._is_attacked(to, side ^ 1, without_king):
+                    moves[count] = king_square | to << 6 | (_CAPTURE if enemy >> to & 1 else 0)
+                    count += 1
+            if not checkers:
+                for right, king_from, _, _, _, empty_mask, safe_squares, move in CASTLING_MOVES[side]:
+                    if (self.castling & right and king_square == king_from and not occupied & empty_mask
+                            and not any(self._is_attacked(square, side ^ 1, occupied) for square in safe_squares[1:])):
+                        moves[count] = move
+                        count += 1
+
+        if checkers & (checkers - 1):  # Double check, only the king can move
+            return count
+
+        # Other pieces may only capture or block a single checker
+        if checkers:
+            checker = checkers.bit_length() - 1
+            targets = BETWEEN[king_square][checker] | checkers
+        else:
+            targets = ~own
+
+        # Pawns
+        pawns = pieces[base + PAWN] & origins
+        empty = ~occupied
+        if side == WHITE:
+            single = (pawns >> 8) & empty
+            double = ((single & 0x0000FF0000000000) >> 8) & empty
+            step = 8
+        else:
+            single = (pawns << 8) & empty
+            double = ((single & 0x0000000000FF0000) << 8) & empty
+            step = -8
+        for to in iter_squares(single & targets):
+            frm = to + step
+            if frm not in pins or pins[frm] >> to & 1:
+                count = self._pawn_moves(frm, 1 << to, moves, count)
+        for to in iter_squares(double & targets):
+            frm = to + 2 * step
+            if frm not in pins or pins[frm] >> to & 1:
+                moves[count] = frm | to << 6 | _DOUBLE_PAWN_PUSH
+                count += 1
+        pawn_attacks = PAWN_ATTACKS[side]
+        ep_square = self.ep_square if side == self.side else None
+        for frm in iter_squares(pawns):
+            attacks = pawn_attacks[frm]
+            allowed = targets & pins[frm] if frm in pins else targets
+            count = self._pawn_moves(frm, attacks & enemy & allowed, moves, count)
+            # En passant removes a second piece from the board, so it gets a full attack test
+            if ep_square is not None and attacks >> ep_square & 1 and self._is_legal(frm, ep_square, side):
+                moves[count] = frm | ep_square << 6 | _EN_PASSANT
+                count += 1
+
+        # Pinned knights can never move; pinned sliders stay on their pin line
+        for frm in iter_squares(pieces[base + KNIGHT] & origins):
+            if frm not in pins:
+                attacks = KNIGHT_ATTACKS[frm] & targets
+                for to in iter_squares(attacks & enemy):
+                    moves[count] = frm | to << 6 | _CAPTURE
+                    count += 1
+                for to in iter_squares(attacks & empty):
+                    moves[count] = frm | to << 6
+                    count += 1
+        for frm in iter_squares((pieces[base + BISHOP] | pieces[base + QUEEN]) & origins):
+            attacks = bishop_attacks(frm, occupied) & (targets & pins[frm] if frm in pins else targets)
+            for to in iter_squares(attacks & enemy):
+                moves[count] = frm | to << 6 | _CAPTURE
+                count += 1
+            for to in iter_squares(attacks & empty):
+                moves[count] = frm | to << 6
+                count += 1
+        for frm in iter_squares((pieces[base + ROOK] | pieces[base + QUEEN]) & origins):
+            attacks = rook_attacks(frm, occupied) & (targets & pins[frm] if frm in pins else targets)
+            for to in iter_squares(attacks & enemy):
+                moves[count] = frm | to << 6 | _CAPTURE
+                count += 1
+            for to in iter_squares(attacks & empty):
+                moves[count] = frm | to << 6
+                count += 1
+        return count
+
+    def generate_moves(self, moves):
+        """
+        Generates the legal moves of the side to move in packed form (see moves.py).
+        Args:
+            moves (list): Buffer of at least MAX_MOVES slots, e.g. one from allocate_move_buffers.
+        Returns:
+            int: The number of moves stored at the start of the buffer.
+        """
+        return self._legal_moves(self.side, moves)
+
+    def generate_legal_moves(self, color):
+        """
+        Generates all legal moves for a player.
+        Args:
+            color (str): The color of the player ('white' or 'black').
+        Returns:
+            list: List of legal moves [(start_pos, end_pos)].
+        """
+        side = WHITE if color == 'white' else BLACK
+        if side == self.side:
+            return [move for moves in self.legal_move_index().values() for move in moves]
+        buffer = self._move_buffer
+        return [decode_move(buffer[index]) for index in range(self._legal_moves(side, buffer))]
+
+    def legal_move_index(self):
+        """
+        Returns the legal moves of the side to move grouped by origin square. The index is built once per
+        position and reused until the position changes, so the GUI, the game-over checks and move
+        validation share a single generation per ply.
+        Returns:
+            dict: Maps each (row, col) with at least one legal move to its moves [(start_pos, end_pos)].
+            The dictionary and its lists are shared and must not be modified.
+        """
+        cached = self._legal_index
+        if cached is not None and cached[0] == self.zobrist_key and cached[1] == self.side:
+            return cached[2]
+        index = {}
+        buffer = self._move_buffer
+        for slot in range(self._legal_moves(self.side, buffer)):
+            move = decode_move(buffer[slot])
+            if move[0] in index:
+                index[move[0]].append(move)
+            else:
+                index[move[0]] = [move]
+        self._legal_index = (self.zobrist_key, self.side, index)
+        return index
+
+    def generate_noisy_moves(self, moves, count=0):
+        """
+        Generates the pseudo-legal captures, en passant captures and promotions of the side to move.
+        Legality is left to is_legal, so a search that cuts off early never pays for it.
+        Args:
+            moves (list): Buffer the packed moves are stored into.
+            count (int): Index of the first free slot in the buffer.
+        Returns:
+            int: The index after the last stored move.
+        """
+        return self._pseudo_legal_moves(self.side, moves, count, -1, True, False)
+
+    def generate_quiet_moves(self, moves, count=0):
+        """
+        Generates the pseudo-legal moves of the side to move that generate_noisy_moves leaves out.
+        Args:
+            moves (list): Buffer the packed moves are stored into.
+            count (int): Index of the first free slot in the buffer.
+        Returns:
+            int: The index after the last stored move.
+        """
+        return self._pseudo_legal_moves(self.side, moves, count, -1, False, True)
+
+    def is_pseudo_legal(self, move):
+        """
+        Checks that a packed move from elsewhere (a hash table or killer slot) can be played by the side
+        to move in this position, apart from leaving its own king in check.
+        Args:
+            move (int): The packed move.
+        Returns:
+            bool: True if the move is among the pseudo-legal moves of the position.
+        """
+        frm = move & 63
+        if not self.occupancy[self.side] >> frm & 1:
+            return False
+        buffer = self._move_buffer
+        for index in range(self._pseudo_legal_moves(self.side, buffer, 0, 1 << frm)):
+            if buffer[index] == move:
+                return True
+        return False
+
+    def is_legal(self, move, in_check=None):
+        """
+        Checks that a pseudo-legal move of the side to move does not leave its king attacked.
+        Args:
+            move (int): The packed move.
+            in_check (bool): Whether the side to move is in check, if the caller already knows. Out of
+                check, a move by any piece other than the king that is not lined up with it is always legal.
+        Returns:
+            bool: True if the move is legal.
+        """
+        side = self.side
+        frm = move & 63
+        if in_check is None:
+            in_check = self.is_check(self.turn)
+        if (not in_check and move >> 12 != EN_PASSANT and self.squares[frm] != side * 6 + KING
+                and not LINE[self._king_square(side)][frm]):
+            return True
+        return self._is_legal(frm, move >> 6 & 63, side)
+
+    def piece_type_at(self, square):
+        """
+        Args:
+            square (int): The square, numbered row * 8 + col.
+        Returns:
+            int: The type (PAWN to KING) of the piece on the square, or None if it is empty.
+        """
+        piece = self.squares[square]
+        return piece % 6 if piece is not None else None
+
+    def encode_move(self, move):
+        """
+        Packs a move given in the public format, working out its flags from the position.
+        Args:
+            move (tuple): ((start_row, start_col), (end_row, end_col)), optionally followed by the
+                promotion piece type ('R', 'B' or 'N'; a queen by default).
+        Returns:
+            int: The packed move.
+        """
+        (start_row, start_col), (end_row, end_col) = move[0], move[1]
+        frm, to = start_row * 8 + start_col, end_row * 8 + end_col
+        piece_type = self.squares[frm] % 6
+        flags = CAPTURE if self.squares[to] is not None else QUIET
+        if piece_type == PAWN:
+            if to == self.ep_square:
+                flags = EN_PASSANT
+            elif abs(to - frm) == 16:
+                flags = DOUBLE_PAWN_PUSH
+            elif to < 8 or to >= 56:
+                flags |= PROMOTION_FLAGS[move[2] if len(move) > 2 else 'Q']
+        elif piece_type == KING and (frm, to) in CASTLING_ROOK_MOVES:
+            flags = KING_CASTLE if to > frm else QUEEN_CASTLE
+        return encode(frm, to, flags)
+
+    def _get_piece_moves(self, position, piece):
+        """
+        Gets all legal moves for the piece on a square.
+        Args:
+            position (tuple): Position of the piece (row, col).
+            piece (str): The piece at the position (e.g., 'wP', 'bK').
+        Returns:
+            list: List of legal moves [(start_pos, end_pos)].
+        """
+        side = WHITE if piece[0] == 'w' else BLACK
+        if side == self.side:
+            return list(self.legal_move_index().get(tuple(position), ()))
+        square = position[0] * 8 + position[1]
+        buffer = self._move_buffer
+        return [decode_move(buffer[index]) for index in range(self._legal_moves(side, buffer, 0, 1 << square))]
+
+    def move_puts_king_in_check(self, move, color):
+        """
+        Checks if a move would leave the player's king in check.
+        Args:
+            move (tuple): The move to test, in the format ((start_row, start_col), (end_row, end_col)).
+            color (str): The color of the player ('white' or 'black').
+        Returns:
+            bool: True if the move leaves the king in check, False otherwise.
+        """
+        (start_row, start_col), (end_row, end_col) = move[0], move[1]
+        side = WHITE if color == 'white' else BLACK
+        return not self._is_legal(start_row * 8 + start_col, end_row * 8 + end_col, side)
+
+    def can_castle(self, color, side):
+        """
+        Determines if castling is legal for the given color and side (king-side or queen-side).
+        Args:
+            color (str): 'white' or 'black', representing the player.
+            side (str): 'king_side' or 'queen_side', representing the side to castle.
+        Returns:
+            bool: True if castling is legal, False otherwise.
+        """
+        mover = WHITE if color == 'white' else BLACK
+        right = CASTLING_BITS[color][side]
+        for bit, king_from, _, _, _, empty_mask, safe_squares, _ in CASTLING_MOVES[mover]:
+            if bit == right:
+                return bool(self.castling & right and self.squares[king_from] == mover * 6 + KING
+                            and not self.occupied & empty_mask
+                            and not any(self._is_attacked(square, mover ^ 1, self.occupied)
+                                        for square in safe_squares))
+        return False
+
+    def has_legal_move(self, color):
+        """
+        Checks whether the player has at least one legal move.
+        Args:
+            color (str): The color of the player ('white' or 'black').
+        Returns:
+            bool: True if a legal move exists, False otherwise.
+        """
+        side = WHITE if color == 'white' else BLACK
+        cached = self._legal_index
+        if cached is not None and cached[0] == self.zobrist_key and cached[1] == side:
+            return bool(cached[2])
+        # Most positions have a king move or a legal move for some piece; try the king first
+        king = 1 << self._king_square(side)
+        buffer = self._move_buffer
+        return bool(self._legal_moves(side, buffer, 0, king) or self._legal_moves(side, buffer, 0, ~king))
+
+    def is_checkmate(self, color):
+        """
+        Returns True if player is checkmated
+        """
+        return self.is_check(color) and not self.has_legal_move(color)
+
+    def is_stalemate(self, color):
+        """
+        Returns True if player is stalemated
+        """
+        return not self.is_check(color) and not self.has_legal_move(color)
+
+    # Making and unmaking moves
+
+    def execute_move(self, move):
+        """
+        Executes a given move on the board, updates game state variables,
+        and handles special cases like promotion, castling, and en passant.
+        Events are reported to the board's instrumentation, if one is attached.
+        Args:
+            move (tuple): The move to execute, in the format ((start_row, start_col), (end_row, end_col)),
+                optionally followed by the promotion piece type ('R', 'B' or 'N'; a queen by default).
+        """
+        move = self.encode_move(move)
+        if self.instrumentation is None:
+            self.make_packed_move(move)
+        else:
+            self.instrumentation.execute(self, move)
+
+    def make_move(self, move):
+        """
+        Makes a move and pushes an undo record so that undo_move can reverse it exactly.
+        Args:
+            move (tuple): The move to execute, in the format ((start_row, start_col), (end_row, end_col)),
+                optionally followed by the promotion piece type ('R', 'B' or 'N'; a queen by default).
+        """
+        self.make_packed_move(self.encode_move(move))
+
+    def make_packed_move(self, move):
+        """
+        Makes a packed move, as produced by generate_moves or encode_move.
+        Args:
+            move (int): The packed move.
+        """
+        self._make(move)
+        self.move_history.append(move)
+
+    def undo_move(self):
+        """
+        Reverts the last move made with make_move, make_packed_move or execute_move.
+        """
+        self._unmake()
+        self.move_history.pop()
+
+    def make_null_move(self):
+        """
+        Passes the turn without moving, for null-move pruning in the search. The en passant right
+        lapses and NULL_MOVE is recorded in move_history. Not allowed while the side to move is in check.
+        """
+        self._null_stack.append((self.ep_square, self.zobrist_key, self._hashed_ep_file))
+        key = self.zobrist_key
+        if self._hashed_ep_file is not None:
+            key ^= EN_PASSANT_KEYS[self._hashed_ep_file]
+        self.ep_square = None
+        self._hashed_ep_file = None
+        self.side ^= 1
+        self.zobrist_key = key ^ SIDE_KEY
+        self.move_history.append(NULL_MOVE)
+        if self.debug_zobrist:
+            self._verify_zobrist_key()
+
+    def undo_null_move(self):
+        """
+        Reverts the last make_null_move.
+        """
+        self.ep_square, self.zobrist_key, self._hashed_ep_file = self._null_stack.pop()
+        self.side ^= 1
+        self.move_history.pop()
+
+    def _make(self, move):
+        frm = move & 63
+        to = move >> 6 & 63
+        flags = move >> 12
+        piece = self.squares[frm]
+        captured = self.squares[to]
+        side = piece // 6
+        key = self.zobrist_key
+        middlegame = self.middlegame_score
+        endgame = self.endgame_score
+        phase = self.phase
+        pawn_key = self.pawn_key
+        self._undo_stack.append((move, piece, captured, self.castling, self.ep_square, key, self._hashed_ep_file,
+                                 middlegame, endgame, phase, pawn_key))
+        if self.accumulator is not None:
+            self.accumulator.push(move, piece, captured)
+
+        if captured is not None:
+            self._remove(captured, to)
+            key ^= PIECE_SQUARE_KEYS[captured][to]
+            if captured % 6 == PAWN:
+                pawn_key ^= PIECE_SQUARE_KEYS[captured][to]
+            middlegame -= MIDDLEGAME_TABLES[captured][to]
+            endgame -= ENDGAME_TABLES[captured][to]
+            phase -= PIECE_PHASES[captured]
+        self._remove(piece, frm)
+        key ^= PIECE_SQUARE_KEYS[piece][frm]
+        if piece % 6 == PAWN:
+            pawn_key ^= PIECE_SQUARE_KEYS[piece][frm]
+        middlegame -= MIDDLEGAME_TABLES[piece][frm]
+        endgame -= ENDGAME_TABLES[piece][frm]
+
+        if flags & PROMOTION:
+            piece = side * 6 + KNIGHT + (flags & 3)
+            phase += PIECE_PHASES[piece]
+        elif flags == EN_PASSANT:
+            captured_square = to + (8 if side == WHITE else -8)
+            captured_pawn = self.squares[captured_square]
+            self._remove(captured_pawn, captured_square)
+            key ^= PIECE_SQUARE_KEYS[captured_pawn][captured_square]
+            pawn_key ^= PIECE_SQUARE_KEYS[captured_pawn][captured_square]
+            middlegame -= MIDDLEGAME_TABLES[captured_pawn][captured_square]
+            endgame -= ENDGAME_TABLES[captured_pawn][captured_square]
+        elif flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            rook_from, rook_to = CASTLING_ROOK_MOVES[(frm, to)]
+            rook = self.squares[rook_from]
+            self._remove(rook, rook_from)
+            self._put(rook, rook_to)
+            key ^= PIECE_SQUARE_KEYS[rook][rook_from] ^ PIECE_SQUARE_KEYS[rook][rook_to]
+            middlegame += MIDDLEGAME_TABLES[rook][rook_to] - MIDDLEGAME_TABLES[rook][rook_from]
+            endgame += ENDGAME_TABLES[rook][rook_to] - ENDGAME_TABLES[rook][rook_from]
+        self._put(piece, to)
+        key ^= PIECE_SQUARE_KEYS[piece][to]
+        if piece % 6 == PAWN:
+            pawn_key ^= PIECE_SQUARE_KEYS[piece][to]
+        self.pawn_key = pawn_key
+        self.middlegame_score = middlegame + MIDDLEGAME_TABLES[piece][to]
+        self.endgame_score = endgame + ENDGAME_TABLES[piece][to]
+        self.phase = phase
+
+        key ^= CASTLING_KEYS[self.castling]
+        self.castling &= CASTLING_MASK[frm] & CASTLING_MASK[to]
+        key ^= CASTLING_KEYS[self.castling]
+        self.ep_square = (frm + to) // 2 if flags == DOUBLE_PAWN_PUSH else None
+        self.side ^= 1
+
+        if self._hashed_ep_file is not None:
+            key ^= EN_PASSANT_KEYS[self._hashed_ep_file]
+        self._hashed_ep_file = self._ep_hash_file()
+        if self._hashed_ep_file is not None:
+            key ^= EN_PASSANT_KEYS[self._hashed_ep_file]
+        self.zobrist_key = key ^ SIDE_KEY
+        if self.debug_zobrist:
+            self._verify_zobrist_key()
+        if self.debug_evaluation:
+            self._verify_evaluation()
+
+    def _unmake(self):
+        (move, piece, captured, castling, ep_square, key, hashed_ep_file,
+         middlegame, endgame, phase, pawn_key) = self._undo_stack.pop()
+        if self.accumulator is not None:
+            self.accumulator.pop()
+        frm = move & 63
+        to = move >> 6 & 63
+        flags = move >> 12
+        side = piece // 6
+        self._remove(self.squares[to], to)
+        self._put(piece, frm)
+        if captured is not None:
+            self._put(captured, to)
+        elif flags == EN_PASSANT:
+            self._put((side ^ 1) * 6 + PAWN, to + (8 if side == WHITE else -8))
+        elif flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            rook_from, rook_to = CASTLING_ROOK_MOVES[(frm, to)]
+            rook = self.squares[rook_to]
+            self._remove(rook, rook_to)
+            self._put(rook, rook_from)
+        self.castling = castling
+        self.ep_square = ep_square
+        self.side ^= 1
+        self.zobrist_key = key
+        self._hashed_ep_file = hashed_ep_file
+        self.pawn_key = pawn_key
+        self.middlegame_score = middlegame
+        self.endgame_score = endgame
+        self.phase = phase
+        if self.debug_zobrist:
+            self._verify_zobrist_key()
+        if self.debug_evaluation:
+            self._verify_evaluation()
+
+    # Evaluation
+
+    def evaluate(self):
+        """
+        Evaluates the position from its running piece-square totals, without looking at the pieces.
+        Returns:
+            int: The tapered score in centipawns, positive when white is better (see evaluation.py).
+        """
+        return tapered_score(self.middlegame_score, self.endgame_score, self.phase)
+
+    def compute_evaluation_terms(self):
+        """
+        Computes the running evaluation totals from scratch.
+        Returns:
+            tuple: (middlegame, endgame, phase), as kept in middlegame_score, endgame_score and phase.
+        """
+        return evaluation_terms((piece, square) for square, piece in enumerate(self.squares) if piece is not None)
+
+    def _verify_evaluation(self):
+        """
+        Raises RuntimeError if the incrementally updated evaluation totals differ from a full recompute.
+        """
+        expected = self.compute_evaluation_terms()
+        if (self.middlegame_score, self.endgame_score, self.phase) != expected:
+            raise RuntimeError(f"Evaluation out of sync: {(self.middlegame_score, self.endgame_score, self.phase)} "
+                               f"!= {expected} after {[decode_move(move) for move in self.move_history]}")
+
+    # Position key
+
+    def _ep_hash_file(self):
+        """
+        Returns:
+            int: The en passant file to include in the key, or None. The file only counts when the
+            side to move has a pawn that could capture en passant, so transpositions hash alike.
+        """
+        if self.ep_square is not None and PAWN_ATTACKS[self.side ^ 1][self.ep_square] & self.pieces[self.side * 6 + PAWN]:
+            return self.ep_square % 8
+        return None
+
+    def compute_zobrist_key(self):
+        """
+        Computes the position's Zobrist key from scratch.
+        Returns:
+            int: The 64-bit key.
+        """
+        pieces = ((PIECE_NAMES[piece], square) for square, piece in enumerate(self.squares) if piece is not None)
+        return compute_key(pieces, self.turn, self.castling, self._ep_hash_file())
+
+    def compute_pawn_key(self):
+        """
+        Computes the position's pawn key from scratch.
+        Returns:
+            int: The 64-bit key of the pawns alone.
+        """
+        return compute_pawn_key((PIECE_NAMES[piece], square) for piece in (PAWN, 6 + PAWN)
+                                for square in iter_squares(self.pieces[piece]))
+
+    def _verify_zobrist_key(self):
+        """
+        Raises RuntimeError if the incrementally updated keys differ from a full recompute.
+        """
+        expected = self.compute_zobrist_key()
+        if self.zobrist_key != expected:
+            raise RuntimeError(f"Zobrist key out of sync: {self.zobrist_key:#018x} != {expected:#018x} "
+                               f"after {[decode_move(move) for move in self.move_history]}")
+        expected = self.compute_pawn_key()
+        if self.pawn_key != expected:
+            raise RuntimeError(f"Pawn key out of sync: {self.pawn_key:#018x} != {expected:#018x} "
+                               f"after {[decode_move(move) for move in self.move_history]}")
@@ -0,0 +1,119 @@
+# bitboard_arrays.py
+#
+# Stacked bitboards: NumPy uint64 arrays holding one bitboard per position (or per piece, or per
+# move), with bit n for square n, squares numbered row * 8 + col from a8 as in attack_tables. Every
+# operation here works on a whole array at once, so the Python cost of a step is paid once for all
+# of the positions rather than once for each. Used by batch_evaluation and bulk_movegen.
+#
+# A step is (shift, towards higher squares, mask of the squares it can land on without wrapping
+# around the board's edge). North is towards row 0, i.e. towards lower squares.
+#
+# NumPy is an optional dependency: only this module, batch_evaluation, bulk_movegen and nnue use it.
+# Importing this module without it fails; the other three import without it and raise ImportError
+# when they are used.
+
+import numpy as np
+
+NOT_FILE_A = np.uint64(0xFEFEFEFEFEFEFEFE)
+NOT_FILE_H = np.uint64(0x7F7F7F7F7F7F7F7F)
+NOT_FILES_AB = np.uint64(0xFCFCFCFCFCFCFCFC)
+NOT_FILES_GH = np.uint64(0x3F3F3F3F3F3F3F3F)
+ALL = np.uint64(0xFFFFFFFFFFFFFFFF)
+ZERO = np.uint64(0)
+
+NORTH_STEP = (np.uint64(8), False, ALL)
+SOUTH_STEP = (np.uint64(8), True, ALL)
+STRAIGHT_STEPS = (NORTH_STEP, SOUTH_STEP, (np.uint64(1), False, NOT_FILE_H), (np.uint64(1), True, NOT_FILE_A))
+# North-west, north-east, south-west, south-east
+DIAGONAL_STEPS = ((np.uint64(9), False, NOT_FILE_H), (np.uint64(7), False, NOT_FILE_A),
+                  (np.uint64(7), True, NOT_FILE_H), (np.uint64(9), True, NOT_FILE_A))
+KING_STEPS = STRAIGHT_STEPS + DIAGONAL_STEPS
+KNIGHT_STEPS = ((np.uint64(17), False, NOT_FILE_H), (np.uint64(15), False, NOT_FILE_A),
+                (np.uint64(10), False, NOT_FILES_GH), (np.uint64(6), False, NOT_FILES_AB),
+                (np.uint64(6), True, NOT_FILES_GH), (np.uint64(10), True, NOT_FILES_AB),
+                (np.uint64(15), True, NOT_FILE_H), (np.uint64(17), True, NOT_FILE_A))
+
+_PIECES = np.arange(12, dtype=np.uint8)[:, None]
+# A de Bruijn sequence: multiplying it by a single bit puts a distinct value in the top six bits
+_DE_BRUIJN = np.uint64(0x03F79D71B4CB0A89)
+_DE_BRUIJN_SQUARES = np.zeros(64, dtype=np.int64)
+_DE_BRUIJN_SQUARES[[(0x03F79D71B4CB0A89 << square & 0xFFFFFFFFFFFFFFFF) >> 58 for square in range(64)]] = np.arange(64)
+_DOUBLINGS = (np.uint64(1), np.uint64(2), np.uint64(4))
+
+popcount = getattr(np, 'bitwise_count', None)  # NumPy 2.0 and later
+if popcount is None:
+    _BYTE_COUNTS = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+    def popcount(bitboards):
+        bitboards = np.ascontiguousarray(bitboards, dtype='<u8')
+        return _BYTE_COUNTS[bitboards.view(np.uint8)].reshape(bitboards.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def step(bitboards, direction):
+    """
+    Moves every bit one step in a direction, dropping bits that would leave the board.
+    """
+    shift, up, mask = direction
+    return (bitboards << shift if up else bitboards >> shift) & mask
+
+
+def ray_attacks(sliders, empty, direction):
+    """
+    Squares attacked along one direction by sets of sliders, filling through empty squares
+    (Kogge-Stone). The first occupied square on each ray is included. Along one direction no two
+    sliders attack the same square, since the nearer one blocks the ray of the one behind it.
+    """
+    shift, up, mask = direction
+    propagators = empty & mask
+    for doubling in _DOUBLINGS:
+        distance = shift * doubling
+        if up:
+            sliders = sliders | propagators & (sliders << distance)
+            propagators = propagators & (propagators << distance)
+        else:
+            sliders = sliders | propagators & (sliders >> distance)
+            propagators = propagators & (propagators >> distance)
+    return step(sliders, direction)
+
+
+def piece_bitboards(codes):
+    """
+    Args:
+        codes (ndarray): Piece codes shaped (positions, 64), as from batch_evaluation.encode_fens.
+    Returns:
+        ndarray: uint64 bitboards shaped (positions, 12), one per piece code in zobrist.PIECE_NAMES order.
+    """
+    codes = np.asarray(codes, dtype=np.uint8).reshape(-1, 64)
+    return np.packbits(codes[:, None, :] == _PIECES, axis=2, bitorder='little').view('<u8')[:, :, 0].astype(np.uint64)
+
+
+def bit_squares(bitboards):
+    """
+    Lists the set bits of an array of bitboards, isolating the lowest remaining bit of every
+    bitboard at once until none are left.
+    Returns:
+        tuple: (indices, squares) int64 arrays, one entry per set bit, in no particular order.
+    """
+    remaining = np.array(bitboards, dtype=np.uint64).reshape(-1)
+    indices = np.nonzero(remaining)[0]
+    remaining = remaining[indices]
+    found_indices, found_squares = [], []
+    while len(indices):
+        lowest = remaining & (~remaining + np.uint64(1))
+        found_indices.append(indices)
+        found_squares.append(_DE_BRUIJN_SQUARES[(lowest * _DE_BRUIJN) >> np.uint64(58)])
+        remaining ^= lowest
+        left = remaining != 0
+        indices = indices[left]
+        remaining = remaining[left]
+    if not found_indices:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(found_indices), np.concatenate(found_squares)
+
+
+def square_bits(squares):
+    """
+    Returns:
+        ndarray: The uint64 bitboard of each square in an array of 0-63 squares.
+    """
+    return np.left_shift(np.uint64(1), np.asarray(squares, dtype=np.uint64))
@@ -0,0 +1,429 @@
+# bulk_movegen.py
+#
+# Move generation for many positions at once, for offline work where throughput matters more than
+# the latency of any one position: perft, dataset generation, mass analysis. A BoardArray holds N
+# positions as stacked bitboards (see bitboard_arrays.py): an (N, 12) uint64 array with one
+# bitboard per piece code, plus arrays for the side to move, castling rights, en passant square and
+# move counters. Every stage of generation is a handful of shift and mask operations over all the
+# positions, or over all of their pieces or moves, at once:
+#
+#   1. pawn pushes, double pushes, captures, promotions and en passant, set-wise per side to move
+#   2. knight, bishop, rook, queen and king targets, per piece, with Kogge-Stone fills for sliders
+#   3. castling, where the rights, empty squares and unattacked squares allow it
+#   4. for legal moves, every pseudo-legal move that could expose the mover's king (any move out of
+#      check, king moves, en passant, and moves from a square on a line with the king) is made on
+#      copies of its position's bitboards and dropped if the king is attacked afterwards
+#
+# Moves come back as flat arrays: for each move the index of its position and the packed move
+# (moves.py format), grouped by position. make_moves plays such arrays to give a new BoardArray with
+# one position per move, which is how bulk_perft walks the tree a level at a time.
+#
+# Usage:
+#   boards = BoardArray.from_fens(fens)
+#   positions, moves = boards.legal_moves()   # moves[i] is legal in position positions[i]
+#   children = boards.make_moves(positions, moves)
+
+try:
+    import numpy as np
+    from bitboard_arrays import (ALL, DIAGONAL_STEPS, KING_STEPS, KNIGHT_STEPS, NORTH_STEP, SOUTH_STEP, STRAIGHT_STEPS,
+                                 ZERO, bit_squares, piece_bitboards, ray_attacks, square_bits, step)
+except ImportError:
+    np = None
+
+from batch_evaluation import encode_fens
+from bitboard import CASTLING_MASK
+from fen import format_fen, parse_fen
+from moves import (DOUBLE_PAWN_PUSH, KING_CASTLE, QUEEN_CASTLE, CAPTURE, EN_PASSANT, PROMOTION, PROMOTION_FLAGS)
+from zobrist import (PIECE_NAMES, CASTLING_BITS, WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE,
+                     BLACK_QUEEN_SIDE)
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+NO_SQUARE = -1  # En passant square of a position without one
+
+# Moves made per block when testing legality, which bounds the memory taken by intermediate arrays
+BLOCK_SIZE = 1 << 16
+
+# Promotion flags in generation order, as on the boards
+PROMOTIONS = tuple(PROMOTION_FLAGS[letter] for letter in 'QRBN')
+
+# (right bit, king from, king to, squares that must be empty, squares that must not be attacked, flag,
+#  rook from, rook to) per color
+CASTLING_MOVES = [
+    [(WHITE_KING_SIDE, 60, 62, (61, 62), (60, 61, 62), KING_CASTLE, 63, 61),
+     (WHITE_QUEEN_SIDE, 60, 58, (57, 58, 59), (60, 59, 58), QUEEN_CASTLE, 56, 59)],
+    [(BLACK_KING_SIDE, 4, 6, (5, 6), (4, 5, 6), KING_CASTLE, 7, 5),
+     (BLACK_QUEEN_SIDE, 4, 2, (1, 2, 3), (4, 3, 2), QUEEN_CASTLE, 0, 3)],
+]
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Bulk move generation needs NumPy (pip install numpy)")
+
+
+if np is not None:
+    _CASTLING_MASK = np.array(CASTLING_MASK, dtype=np.uint8)
+    # Bitboards of the rank a pawn of each color promotes on, and of the rank it double-pushes through
+    _PROMOTION_RANK = (np.uint64(0xFF), np.uint64(0xFF << 56))
+    _PUSH_RANK = (np.uint64(0xFF << 40), np.uint64(0xFF << 16))
+    # Pawn steps per color: forward, then the captures towards file a and towards file h
+    _PAWN_STEPS = ((NORTH_STEP, DIAGONAL_STEPS[0], DIAGONAL_STEPS[1]),
+                   (SOUTH_STEP, DIAGONAL_STEPS[2], DIAGONAL_STEPS[3]))
+    # Square difference from a pawn's square to each of those targets, per color
+    _PAWN_DELTAS = ((-8, -9, -7), (8, 7, 9))
+    # Steps from a square to the squares a pawn of each color attacks it from
+    _PAWN_ATTACKER_STEPS = ((DIAGONAL_STEPS[2], DIAGONAL_STEPS[3]), (DIAGONAL_STEPS[0], DIAGONAL_STEPS[1]))
+
+
+def _attacked(targets, by_color, occupied, pawns, knights, diagonal, straight, kings):
+    """
+    Tests squares for attack, one square per element.
+    Args:
+        targets (ndarray): uint64 bitboards with one bit each, the squares to test.
+        by_color (ndarray): Color of the attackers of each square.
+        occupied, pawns, knights, diagonal, straight, kings (ndarray): uint64 bitboards of the
+            occupied squares and of the attackers' pawns, knights, bishops and queens, rooks and
+            queens and king, per square.
+    Returns:
+        ndarray: bool, True where the square is attacked.
+    """
+    empty = ~occupied
+    hits = ZERO
+    for direction in KNIGHT_STEPS:
+        hits = hits | step(targets, direction) & knights
+    for direction in KING_STEPS:
+        hits = hits | step(targets, direction) & kings
+    for direction in DIAGONAL_STEPS:
+        hits = hits | ray_attacks(targets, empty, direction) & diagonal
+    for direction in STRAIGHT_STEPS:
+        hits = hits | ray_attacks(targets, empty, direction) & straight
+    for color in (WHITE, BLACK):
+        from_pawns = ZERO
+        for direction in _PAWN_ATTACKER_STEPS[color]:
+            from_pawns = from_pawns | step(targets, direction)
+        hits = hits | np.where(by_color == color, from_pawns & pawns, ZERO)
+    return hits != 0
+
+
+class BoardArray:
+    def __init__(self, pieces, side, castling, ep_square, halfmove_clock=None, fullmove_number=None):
+        """
+        Holds positions as stacked bitboards.
+        Args:
+            pieces (ndarray): uint64 bitboards shaped (positions, 12), in zobrist.PIECE_NAMES order.
+            side (ndarray): Side to move of each position, WHITE (0) or BLACK (1).
+            castling (ndarray): Castling rights of each position, as zobrist.CASTLING_BITS.
+            ep_square (ndarray): En passant target square of each position, or NO_SQUARE.
+            halfmove_clock, fullmove_number (ndarray): Move counters of each position; 0 and 1 if omitted.
+        Raises:
+            ImportError: If NumPy is not installed.
+        """
+        _require_numpy()
+        self.pieces = np.asarray(pieces, dtype=np.uint64).reshape(-1, 12)
+        count = len(self.pieces)
+        self.side = np.asarray(side, dtype=np.uint8).reshape(count)
+        self.castling = np.asarray(castling, dtype=np.uint8).reshape(count)
+        self.ep_square = np.asarray(ep_square, dtype=np.int8).reshape(count)
+        self.halfmove_clock = (np.zeros(count, dtype=np.int32) if halfmove_clock is None
+                               else np.asarray(halfmove_clock, dtype=np.int32).reshape(count))
+        self.fullmove_number = (np.ones(count, dtype=np.int32) if fullmove_number is None
+                                else np.asarray(fullmove_number, dtype=np.int32).reshape(count))
+
+    def __len__(self):
+        return len(self.pieces)
+
+    @classmethod
+    def from_fens(cls, fens):
+        """
+        Creates a BoardArray from FEN strings.
+        Args:
+            fens (iterable): The positions; the move counters may be omitted.
+        Returns:
+            BoardArray: One position per FEN, in order.
+        Raises:
+            ValueError: If a FEN is malformed.
+        """
+        _require_numpy()
+        fens = list(fens)
+        states = []
+        for fen in fens:
+            # parse_fen validates the fields and drops castling rights without their king and rook
+            position = parse_fen(fen)
+            castling = sum(bit for color, sides in CASTLING_BITS.items() for name, bit in sides.items()
+                           if position['castling_rights'][color][name])
+            target = position['en_passant_target']
+            states.append((WHITE if position['turn'] == 'white' else BLACK, castling,
+                           target[0] * 8 + target[1] if target else NO_SQUARE,
+                           position['halfmove_clock'], position['fullmove_number']))
+        states = np.array(states, dtype=np.int32).reshape(-1, 5)
+        return cls(piece_bitboards(encode_fens(fens)), *states.T)
+
+    @classmethod
+    def from_boards(cls, boards):
+        """
+        Creates a BoardArray from ChessBoard or BitboardChessBoard positions.
+        """
+        return cls.from_fens(board.to_fen() for board in boards)
+
+    def to_fens(self):
+        """
+        Returns:
+            list: The FEN of each position.
+        """
+        positions, squares = bit_squares(self.pieces.reshape(-1))
+        boards, pieces = np.divmod(positions, 12)
+        placements = [[] for _ in range(len(self))]
+        for board, piece, square in zip(boards.tolist(), pieces.tolist(), squares.tolist()):
+            placements[board].append((PIECE_NAMES[piece], divmod(square, 8)))
+        return [format_fen({
+            'pieces': placement,
+            'turn': 'white' if side == WHITE else 'black',
+            'castling_rights': {color: {name: bool(castling & bit) for name, bit in sides.items()}
+                                for color, sides in CASTLING_BITS.items()},
+            'en_passant_target': divmod(ep_square, 8) if ep_square != NO_SQUARE else None,
+            'halfmove_clock': halfmove_clock,
+            'fullmove_number': fullmove_number,
+        }) for placement, side, castling, ep_square, halfmove_clock, fullmove_number
+            in zip(placements, self.side.tolist(), self.castling.tolist(), self.ep_square.tolist(),
+                   self.halfmove_clock.tolist(), self.fullmove_number.tolist())]
+
+    def _own_and_enemy(self):
+        """
+        Returns:
+            tuple: (own, enemy) uint64 arrays shaped (positions, 6), the side to move's and the
+            opponent's bitboards by piece type.
+        """
+        black = (self.side == BLACK)[:, None]
+        white_pieces, black_pieces = self.pieces[:, :6], self.pieces[:, 6:]
+        return np.where(black, black_pieces, white_pieces), np.where(black, white_pieces, black_pieces)
+
+    def pseudo_legal_moves(self):
+        """
+        Generates the moves of every position that follow the piece movement rules, whether or not
+        they leave the mover's king attacked. Castling is only generated when it is fully legal.
+        Returns:
+            tuple: (positions, moves): int64 position indices and uint16 packed moves, one entry per
+            move, grouped by position.
+        """
+        own, enemy = self._own_and_enemy()
+        own_occupied = np.bitwise_or.reduce(own, axis=1)
+        enemy_occupied = np.bitwise_or.reduce(enemy, axis=1)
+        occupied = own_occupied | enemy_occupied
+        empty = ~occupied
+        parts = []  # (positions, from squares, to squares, flags) per kind of move
+
+        # Pawns, set-wise for all positions of each side to move
+        for color in (WHITE, BLACK):
+            mover = np.nonzero(self.side == color)[0]
+            if not len(mover):
+                continue
+            pawns = own[mover, PAWN]
+            forward, capture_west, capture_east = _PAWN_STEPS[color]
+            forward_delta, west_delta, east_delta = _PAWN_DELTAS[color]
+            ep_squares = self.ep_square[mover]
+            ep_targets = np.where(ep_squares >= 0, square_bits(np.maximum(ep_squares, 0)), ZERO)
+            single = step(pawns, forward) & empty[mover]
+            double = step(single & _PUSH_RANK[color], forward) & empty[mover]
+            west = step(pawns, capture_west)
+            east = step(pawns, capture_east)
+            last_rank = _PROMOTION_RANK[color]
+            for targets, delta, flag in ((single, forward_delta, 0), (double, 2 * forward_delta, DOUBLE_PAWN_PUSH),
+                                         (west & enemy_occupied[mover], west_delta, CAPTURE),
+                                         (east & enemy_occupied[mover], east_delta, CAPTURE),
+                                         (west & ep_targets, west_delta, EN_PASSANT),
+                                         (east & ep_targets, east_delta, EN_PASSANT)):
+                if flag in (0, CAPTURE):
+                    indices, to = bit_squares(targets & ~last_rank)
+                    parts.append((mover[indices], to - delta, to, flag))
+                    indices, to = bit_squares(targets & last_rank)
+                    for promotion in PROMOTIONS:
+                        parts.append((mover[indices], to - delta, to, promotion | flag))
+                else:
+                    indices, to = bit_squares(targets)
+                    parts.append((mover[indices], to - delta, to, flag))
+
+        # Other pieces, one bitboard of targets per piece
+        rows, start = bit_squares(own[:, KNIGHT:])
+        positions, types = np.divmod(rows, KING - KNIGHT + 1)
+        types += KNIGHT
+        pieces = square_bits(start)
+        piece_empty = empty[positions]
+        attacks = np.zeros(len(pieces), dtype=np.uint64)
+        for piece_type, steps, slides in ((KNIGHT, KNIGHT_STEPS, False), (BISHOP, DIAGONAL_STEPS, True),
+                                          (ROOK, STRAIGHT_STEPS, True), (QUEEN, STRAIGHT_STEPS + DIAGONAL_STEPS, True),
+                                          (KING, KING_STEPS, False)):
+            selected = np.nonzero(types == piece_type)[0]
+            if not len(selected):
+                continue
+            movers = pieces[selected]
+            targets = ZERO
+            for direction in steps:
+                if slides:
+                    targets = targets | ray_attacks(movers, piece_empty[selected], direction)
+                else:
+                    targets = targets | step(movers, direction)
+            attacks[selected] = targets
+        attacks &= ~own_occupied[positions]
+        indices, to = bit_squares(attacks)
+        positions = positions[indices]
+        captures = enemy_occupied[positions] & square_bits(to) != 0
+        parts.append((positions, start[indices], to, captures * CAPTURE))
+
+        # Castling, checked one right at a time across every position that has it
+        for color in (WHITE, BLACK):
+            for right, king_from, king_to, between, crossed, flag, _, _ in CASTLING_MOVES[color]:
+                candidates = np.nonzero((self.side == color) & (self.castling & right != 0))[0]
+                if not len(candidates):
+                    continue
+                must_be_empty = np.uint64(sum(1 << square for square in between))
+                candidates = candidates[occupied[candidates] & must_be_empty == 0]
+                for square in crossed:
+                    if not len(candidates):
+                        break
+                    attacker = enemy[candidates]
+                    safe = ~_attacked(np.full(len(candidates), np.uint64(1 << square)),
+                                      np.full(len(candidates), color ^ 1), occupied[candidates], attacker[:, PAWN],
+                                      attacker[:, KNIGHT], attacker[:, BISHOP] | attacker[:, QUEEN],
+                                      attacker[:, ROOK] | attacker[:, QUEEN], attacker[:, KING])
+                    candidates = candidates[safe]
+                parts.append((candidates, np.full(len(candidates), king_from), np.full(len(candidates), king_to), flag))
+
+        positions = np.concatenate([part[0] for part in parts])
+        moves = np.concatenate([np.broadcast_to(start | to << 6 | np.asarray(flags, dtype=np.int64) << 12,
+                                                part_positions.shape)
+                                for part_positions, start, to, flags in parts])
+        order = np.argsort(positions, kind='stable')
+        return positions[order], moves[order].astype(np.uint16)
+
+    def legal_moves(self):
+        """
+        Generates the legal moves of every position.
+        Returns:
+            tuple: (positions, moves): int64 position indices and uint16 packed moves, one entry per
+            move, grouped by position.
+        """
+        positions, moves = self.pseudo_legal_moves()
+        own, enemy = self._own_and_enemy()
+        king = own[:, KING]
+        attackers = (enemy[:, PAWN], enemy[:, KNIGHT], enemy[:, BISHOP] | enemy[:, QUEEN],
+                     enemy[:, ROOK] | enemy[:, QUEEN], enemy[:, KING])
+        own_occupied = np.bitwise_or.reduce(own, axis=1)
+        occupied = own_occupied | np.bitwise_or.reduce(enemy, axis=1)
+        in_check = _attacked(king, self.side ^ 1, occupied, *attackers)
+        # Every square on a line with the king: only a piece moving off one of these can uncover an attack
+        lines = ZERO
+        for direction in STRAIGHT_STEPS + DIAGONAL_STEPS:
+            lines = lines | ray_attacks(king, ALL, direction)
+
+        # A move needs making only when the side to move is in check, the king moves, or it may uncover the king
+        flags = moves >> 12
+        origin = square_bits(moves & 63)
+        tested = np.nonzero(in_check[positions] | (origin & (lines | king)[positions] != 0)
+                            | (flags == EN_PASSANT))[0]
+        tested = tested[(flags[tested] != KING_CASTLE) & (flags[tested] != QUEEN_CASTLE)]
+        legal = np.ones(len(moves), dtype=bool)
+        for start in range(0, len(tested), BLOCK_SIZE):
+            block = tested[start:start + BLOCK_SIZE]
+            block_positions = positions[block]
+            legal[block] = self._leaves_king_safe(block_positions, moves[block], king[block_positions],
+                                                  own_occupied[block_positions],
+                                                  occupied[block_positions] ^ own_occupied[block_positions],
+                                                  [bitboards[block_positions] for bitboards in attackers])
+        return positions[legal], moves[legal]
+
+    def _leaves_king_safe(self, positions, moves, king, own_occupied, enemy_occupied, attackers):
+        """
+        Makes each move on copies of its position's bitboards and tests whether the mover's king is
+        attacked afterwards.
+        Args:
+            positions (ndarray): Index of each move's position.
+            moves (ndarray): The packed moves, none of them castling.
+            king, own_occupied, enemy_occupied (ndarray): The mover's king, the mover's pieces and the
+                opponent's pieces, per move.
+            attackers (list): The opponent's pawns, knights, bishops and queens, rooks and queens and
+                king, per move.
+        Returns:
+            ndarray: bool, True for the moves that are legal.
+        """
+        moves = moves.astype(np.int64)
+        origin = square_bits(moves & 63)
+        target = square_bits(moves >> 6 & 63)
+        side = self.side[positions]
+
+        # The captured piece leaves the opponent's bitboards; en passant takes the pawn behind the target
+        captured = np.where(moves >> 12 == EN_PASSANT,
+                            np.where(side == WHITE, target << np.uint64(8), target >> np.uint64(8)), target)
+        attackers = [bitboards & ~captured for bitboards in attackers]
+        occupied = own_occupied & ~origin | target | enemy_occupied & ~captured
+        king = np.where(king == origin, target, king)
+        return ~_attacked(king, side ^ 1, occupied, *attackers)
+
+    def make_moves(self, positions, moves):
+        """
+        Plays moves, each in its own copy of a position.
+        Args:
+            positions (ndarray): Index of the position to play each move in.
+            moves (ndarray): The packed moves, as from legal_moves.
+        Returns:
+            BoardArray: One position per move, in order.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        moves = np.asarray(moves).astype(np.int64)
+        count = len(moves)
+        rows = np.arange(count)
+        start = moves & 63
+        end = moves >> 6 & 63
+        flags = moves >> 12
+        origin = square_bits(start)
+        target = square_bits(end)
+        side = self.side[positions]
+        pieces = self.pieces[positions]
+
+        base = side.astype(np.int64) * 6
+        moved = base + np.argmax(pieces[:, :6] & origin[:, None] != 0, axis=1)
+        moved = np.where(side == BLACK, base + np.argmax(pieces[:, 6:] & origin[:, None] != 0, axis=1), moved)
+        moved_type = moved - base
+        captured = (np.bitwise_or.reduce(pieces, axis=1) & target != 0) | (flags == EN_PASSANT)
+
+        pieces &= ~target[:, None]  # Whatever stood on the target is captured
+        behind = np.where(side == WHITE, target << np.uint64(8), target >> np.uint64(8))
+        en_passant = flags == EN_PASSANT
+        pawns = 6 * (side ^ 1).astype(np.int64) + PAWN
+        pieces[rows[en_passant], pawns[en_passant]] &= ~behind[en_passant]
+        pieces[rows, moved] &= ~origin
+        promoted = flags & PROMOTION != 0
+        placed = np.where(promoted, base + KNIGHT + (flags & 3), moved)
+        pieces[rows, placed] |= target
+        for color in (WHITE, BLACK):
+            for _, king_from, king_to, _, _, flag, rook_from, rook_to in CASTLING_MOVES[color]:
+                castled = rows[(flags == flag) & (side == color) & (start == king_from) & (end == king_to)]
+                pieces[castled, 6 * color + ROOK] ^= np.uint64(1 << rook_from | 1 << rook_to)
+
+        castling = self.castling[positions] & _CASTLING_MASK[start] & _CASTLING_MASK[end]
+        ep_square = np.where(flags == DOUBLE_PAWN_PUSH, (start + end) // 2, NO_SQUARE)
+        halfmove_clock = np.where(captured | (moved_type == PAWN), 0, self.halfmove_clock[positions] + 1)
+        fullmove_number = self.fullmove_number[positions] + side
+        return BoardArray(pieces, side ^ 1, castling, ep_square, halfmove_clock, fullmove_number)
+
+
+def bulk_perft(boards, depth):
+    """
+    Counts the leaf nodes of the legal move tree below each position, a whole level at a time.
+    Memory grows with the number of positions at the second deepest level.
+    Args:
+        boards (BoardArray): The positions.
+        depth (int): The number of plies to search.
+    Returns:
+        ndarray: int64 leaf counts, one per position.
+    """
+    count = len(boards)
+    if depth == 0:
+        return np.ones(count, dtype=np.int64)
+    roots = np.arange(count)  # Root position of each position in the current level
+    for _ in range(depth - 1):
+        positions, moves = boards.legal_moves()
+        boards = boards.make_moves(positions, moves)
+        roots = roots[positions]
+    positions, _ = boards.legal_moves()
+    return np.bincount(roots[positions], minlength=count)
@@ -1,13 +1,104 @@
+import math
 import random
+import time
+
+from batch_evaluation import NUMPY_AVAILABLE, PositionBatch
+from evaluation import Evaluator
+from nnue import NNUEEvaluator
+from move_picker import MoveOrdering, pick_captures, pick_moves
+from moves import CAPTURE, MAX_PLY, NULL_MOVE, PROMOTION, allocate_move_buffers, decode_move
+from parallel_search import SearchPool
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+# Score of a checkmate at the root, larger than any material balance. A mate found n plies from the
+# root scores MATE_SCORE - n, so shorter mates are preferred.
+MATE_SCORE = 32000
+# Scores beyond this are mate scores
+MATE_BOUND = MATE_SCORE - MAX_PLY
+
+# Depth searched when no time or node budget is given, and the deepest iteration otherwise
+DEFAULT_DEPTH = 3
+MAX_SEARCH_DEPTH = 64
+# Fraction of the time or node budget after which no new iteration is started
+SOFT_LIMIT_FRACTION = 0.5
+# Nodes searched between clock readings
+CHECK_INTERVAL = 1024
+# Quiescence search skips a capture that cannot lift the score to within this margin of alpha (beta
+# when minimizing), even if the exchange it starts goes as well as static exchange evaluation says
+DELTA_MARGIN = 200
+
+# Search techniques of 'hard' that can be switched off one by one, e.g. to measure what each is worth:
+#   'pvs'         principal variation search: moves after the first are searched with a zero window,
+#                 and only re-searched with the full window if they turn out better
+#   'aspiration'  each iteration starts with a window of ASPIRATION_WINDOW around the previous score
+#   'null_move'   outside the principal variation, a side that can pass and still reach beta is cut off
+#   'lmr'         late move reductions: quiet moves late in the ordering are searched less deeply first
+SEARCH_FEATURES = frozenset({'pvs', 'aspiration', 'null_move', 'lmr'})
+ASPIRATION_WINDOW = 25
+ASPIRATION_MIN_DEPTH = 4
+NULL_MOVE_MIN_DEPTH = 3
+# Null-move searches are this much shallower than depth - 1, and one ply more from depth 7 on
+NULL_MOVE_REDUCTION = 2
+# At or below this much non-pawn material the side to move may be in zugzwang, so a null-move cutoff
+# is only taken once a normal search, reduced as much as the null move was, confirms it
+NULL_MOVE_VERIFY_MATERIAL = 500
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3  # Moves searched at full depth before reductions start
+# Reduction by remaining depth and move number, growing with the logarithm of each
+LMR_REDUCTIONS = [[int(0.75 + math.log(depth) * math.log(number) / 2.25) if depth and number else 0
+                   for number in range(64)] for depth in range(64)]
+
 
 class ChessAI:
-    def __init__(self, difficulty='easy'):
+    def __init__(self, difficulty='easy', depth=None, hash_megabytes=16, move_time=None, max_nodes=None,
+                 features=SEARCH_FEATURES, workers=1, network=None):
         """
         Initializes the ChessAI with a specified difficulty level.
         Args:
             difficulty (str): 'easy', 'medium', or 'hard'.
+            depth (int): Deepest iteration for 'hard'; DEFAULT_DEPTH without a budget, else MAX_SEARCH_DEPTH.
+            hash_megabytes (float): Memory cap of the transposition table used by 'hard'.
+            move_time (float): Seconds 'hard' may spend on a move. No iteration is started once
+                SOFT_LIMIT_FRACTION of it has passed, and a running one is abandoned when it runs out.
+            max_nodes (int): Node budget per move for 'hard', applied the same way as move_time.
+            features (iterable): The SEARCH_FEATURES 'hard' uses; all of them by default.
+            workers (int): Processes 'hard' searches with (see parallel_search.py). With more than one,
+                call close() when done with the AI. If the helper processes cannot be started, or one
+                of them dies, the AI carries on searching in this process alone.
+            network (str): Path of an NNUE weight file (see nnue.py) for 'hard' to evaluate with,
+                instead of the hand-written evaluation. Needs NumPy.
+        Raises:
+            ValueError: If a feature is not one of SEARCH_FEATURES, or the weight file is not valid.
+            ImportError: If a network is given and NumPy is not installed.
         """
+        features = frozenset(features)
+        if not features <= SEARCH_FEATURES:
+            raise ValueError(f"Unknown search features: {', '.join(sorted(features - SEARCH_FEATURES))}")
         self.difficulty = difficulty
+        self.features = features
+        if depth is None:
+            depth = DEFAULT_DEPTH if move_time is None and max_nodes is None else MAX_SEARCH_DEPTH
+        self.depth = depth
+        self.move_time = move_time
+        self.max_nodes = max_nodes
+        self.workers = workers
+        self.hash_megabytes = hash_megabytes
+        self.table = TranspositionTable(hash_megabytes) if difficulty == 'hard' and workers <= 1 else None
+        self.nodes = 0  # Positions visited by the last search
+        self.iterations = []  # Per completed iteration of the last search: depth, move, score, nodes, seconds
+        self.principal_variation = []  # Expected line of play (packed moves) from the last completed iteration
+        self._stopped = False  # Set when the budget runs out during an iteration
+        self._next_check = 0   # Node count at which the budget is next checked
+        self._deadline = None
+        self.stop_signal = None  # Shared flag that stops the search once set, when helping a parallel search
+        self._search_pool = None
+        self._follow_pv = False  # True while the search is still on the previous iteration's principal variation
+        self._move_buffers = allocate_move_buffers()  # Reused packed move lists, one per ply
+        self._score_buffers = allocate_move_buffers()  # Ordering scores for the move lists
+        self.ordering = MoveOrdering()  # Killer, history and counter-move tables, kept across moves
+        self.network = network
+        # Holds the pawn hash table, or the network, also kept across moves
+        self.evaluator = NNUEEvaluator(network) if network is not None else Evaluator()
 
     def choose_move(self, board):
         """
@@ -22,7 +113,19 @@ class ChessAI:
         elif self.difficulty == 'medium':
             return self._basic_evaluation(board)
         elif self.difficulty == 'hard':
-            return self._minimax(board, depth=3)
+            self.ordering.new_search()
+            self.evaluator.attach(board)
+            try:
+                if self.workers > 1:
+                    move = self._parallel_search(board)
+                else:
+                    if self.table is None:
+                        self.table = TranspositionTable(self.hash_megabytes)
+                    self.table.new_search()
+                    move = self._iterative_deepening(board)
+            finally:
+                self.evaluator.detach(board)
+            return decode_move(move) if move is not None else None
         else:
             raise ValueError("Invalid difficulty level.")
 
@@ -36,89 +139,441 @@ class ChessAI:
         Returns:
             tuple: A randomly chosen legal move.
         """
-        board.display_board()
-
         legal_moves = board.generate_legal_moves(board.turn)
         return random.choice(legal_moves) if legal_moves else None
 
     def _basic_evaluation(self, board):
         """
-        Chooses a move based on a basic evaluation function.
+        Chooses a move based on a basic evaluation function. Moves are ranked by what the exchange
+        they start wins, and moves that win the same by the batch evaluation of the position they
+        lead to (see batch_evaluation.py), when NumPy is installed.
         Args:
             board (ChessBoard): The current game board.
         Returns:
             tuple: The move with the highest evaluation score.
         """
         def evaluate_move(move):
-            start, end = move
-            target_piece = board.board[end[0]][end[1]]
-            # Assign values to pieces (higher for more valuable pieces)
-            piece_values = {'P': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 0}
-            return piece_values.get(target_piece[1], 0) if target_piece != '..' else 0
+            # Captures score what the exchange they start wins (negative if it loses material)
+            packed = board.encode_move(move)
+            return board.see(packed) if packed >> 12 & (CAPTURE | PROMOTION) else 0
 
         legal_moves = board.generate_legal_moves(board.turn)
         if not legal_moves:
             return None
+        if not NUMPY_AVAILABLE:
+            return max(legal_moves, key=evaluate_move)
+
+        # The positions after every move are scored together
+        batch = PositionBatch()
+        for move in legal_moves:
+            board.make_move(move)
+            batch.add(board)
+            board.undo_move()
+        sign = 1 if board.turn == 'white' else -1
+        scores = batch.evaluate().tolist()
 
         # Choose the move with the highest evaluation
-        return max(legal_moves, key=evaluate_move)
+        return max(zip(legal_moves, scores), key=lambda item: (evaluate_move(item[0]), sign * item[1]))[0]
+
+    def close(self):
+        """
+        Stops the helper processes of a parallel search and frees the table they share.
+        """
+        if self._search_pool is not None:
+            self.table = None
+            self._search_pool.close()
+            self._search_pool = None
+
+    def _parallel_search(self, board):
+        """
+        Lazy SMP: runs the search here while workers - 1 helper processes search the same position,
+        sharing the transposition table. Once the search here ends the helpers are stopped, and the
+        deepest completed iteration of any of the searches gives the move.
+        Args:
+            board (ChessBoard): The current game board.
+        Returns:
+            int: The best packed move found, or None if there is no legal move.
+        """
+        if self._search_pool is None:
+            try:
+                self._search_pool = SearchPool(self.workers - 1, self.hash_megabytes, self.network)
+            except OSError:
+                self.workers = 1
+                self.table = TranspositionTable(self.hash_megabytes)
+                self.table.new_search()
+                return self._iterative_deepening(board)
+        pool = self._search_pool
+        self.table = pool.table
+        self.table.new_search()
+        futures = pool.start(board, self.depth, self.move_time, self.max_nodes, self.features)
+        try:
+            best_move = self._iterative_deepening(board)
+        finally:
+            results = pool.finish(futures)
+
+        for result in results:
+            self.nodes += result['nodes']
+            iterations = result['iterations']
+            if iterations and (not self.iterations or iterations[-1]['depth'] > self.iterations[-1]['depth']):
+                self.iterations = iterations
+                self.principal_variation = result['principal_variation']
+                best_move = iterations[-1]['move']
+        if pool.broken:  # Search alone from now on
+            self.close()
+            self.workers = 1
+        return best_move
+
+    def _iterative_deepening(self, board, first_depth=1):
+        """
+        Searches one ply deeper at a time until the depth or the budget runs out. Each iteration
+        searches the previous one's principal variation first, and an iteration cut short by the
+        budget is discarded in favour of the last completed one (the first is always completed).
+        Each iteration's search features are set by self.features (see SEARCH_FEATURES).
+        Args:
+            board (ChessBoard): The current game board.
+            first_depth (int): Depth of the first iteration.
+        Returns:
+            int: The best packed move found, or None if there is no legal move.
+        """
+        self.nodes = 0
+        self.iterations = []
+        self.principal_variation = []
+        self._stopped = False
+        self._next_check = float('inf')  # The first iteration runs without limits
+        start = time.perf_counter()
+        self._deadline = start + self.move_time if self.move_time is not None else None
+        maximizing_player = board.turn == 'white'
+
+        best_move = None
+        score = 0
+        for depth in range(first_depth, self.depth + 1):
+            score, move = self._search_root(board, depth, maximizing_player, score)
+            if self._stopped:
+                break
+            best_move = move
+            elapsed = time.perf_counter() - start
+            self.iterations.append({'depth': depth, 'move': move, 'score': score, 'nodes': self.nodes,
+                                    'seconds': elapsed})
+            if move is None or abs(score) > MATE_BOUND:  # No legal move, or a forced mate was found
+                break
+            self.principal_variation = self._extract_principal_variation(board, move, depth)
+            if ((self.move_time is not None and elapsed >= self.move_time * SOFT_LIMIT_FRACTION)
+                    or (self.max_nodes is not None and self.nodes >= self.max_nodes * SOFT_LIMIT_FRACTION)):
+                break
+            self._next_check = self.nodes + CHECK_INTERVAL
+        return best_move
+
+    def _search_root(self, board, depth, maximizing_player, previous_score):
+        """
+        Runs one iteration. With 'aspiration', the search starts with a narrow window around the
+        previous iteration's score and widens it on the side it fails on until the score falls inside.
+        Returns:
+            tuple: (evaluation, move), as returned by _minimax.
+        """
+        window = ASPIRATION_WINDOW
+        if ('aspiration' in self.features and depth >= ASPIRATION_MIN_DEPTH
+                and abs(previous_score) < MATE_BOUND):
+            alpha, beta = previous_score - window, previous_score + window
+        else:
+            alpha, beta = float('-inf'), float('inf')
+        while True:
+            self._follow_pv = True
+            score, move = self._minimax(board, depth, maximizing_player, alpha, beta)
+            if self._stopped:
+                return score, move
+            if score <= alpha:
+                alpha = score - window if window < MATE_BOUND else float('-inf')
+            elif score >= beta:
+                beta = score + window if window < MATE_BOUND else float('inf')
+            else:
+                return score, move
+            window *= 4
+
+    def _check_limits(self):
+        """
+        Stops the search once the node budget or the deadline is reached.
+        """
+        self._next_check = self.nodes + CHECK_INTERVAL
+        if self.max_nodes is not None:
+            if self.nodes >= self.max_nodes:
+                self._stopped = True
+            self._next_check = min(self._next_check, self.max_nodes)
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            self._stopped = True
+        if self.stop_signal is not None and self.stop_signal[0]:
+            self._stopped = True
+
+    def _extract_principal_variation(self, board, move, depth):
+        """
+        Follows the transposition table's best moves from the root to recover the expected line of play.
+        """
+        line = [move]
+        board.make_packed_move(move)
+        while len(line) < depth:
+            entry = self.table.probe(board.zobrist_key)
+            if entry is None or not entry[3] or not (board.is_pseudo_legal(entry[3]) and board.is_legal(entry[3])):
+                break
+            line.append(entry[3])
+            board.make_packed_move(entry[3])
+        for _ in line:
+            board.undo_move()
+        return line
 
-    def _minimax(self, board, depth, maximizing_player=True, alpha=float('-inf'), beta=float('inf')):
+    def _minimax(self, board, depth, maximizing_player=True, alpha=float('-inf'), beta=float('inf'), ply=0,
+                 null_move=True, pv_node=True):
         """
-        Implements the minimax algorithm with alpha-beta pruning.
+        Implements the minimax algorithm with alpha-beta pruning. Moves are made and unmade
+        on the board in place, so the board is left unchanged when the search returns.
+        Moves come from pick_moves, which generates and legality-checks them lazily in stages, so a
+        node that cuts off early never generates its quiet moves. Results are kept in the
+        transposition table, whose best move is searched first when the position comes up again.
+        Leaves are scored by _quiescence rather than by the static evaluation, and self.features
+        decides which of the SEARCH_FEATURES prune and reduce the tree.
         Args:
             board (ChessBoard): The current game board.
             depth (int): The search depth.
-            maximizing_player (bool): True if the AI is maximizing, False if minimizing.
+            maximizing_player (bool): True if the side to move is maximizing (white), False if minimizing.
             alpha (float): Alpha value for pruning.
             beta (float): Beta value for pruning.
+            ply (int): Distance from the root of the search.
+            null_move (bool): False to rule out null-move pruning at this node, as when verifying one.
+            pv_node (bool): Whether the node is on the principal variation: the root, and the first
+                child of a PV node. Null-move pruning and late-move reductions only apply off it.
         Returns:
-            tuple: (evaluation, move) - The best evaluation and the corresponding move.
+            tuple: (evaluation, move) - The best evaluation and the corresponding packed move. Meaningless
+            once the budget has stopped the search.
         """
-        if depth == 0 or board.is_checkmate('white') or board.is_stalemate('white'):
-            return self._evaluate_board(board), None
+        if depth == 0:
+            return self._quiescence(board, maximizing_player, alpha, beta, ply), None
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check_limits()
+        if self._stopped:
+            return 0, None
 
-        legal_moves = board.generate_legal_moves(board.turn)
-        if maximizing_player:
-            max_eval = float('-inf')
-            best_move = None
-            for move in legal_moves:
-                board.execute_move(move)
-                eval, _ = self._minimax(board, depth - 1, False, alpha, beta)
-                board.undo_move()  # Restore board state
-                if eval > max_eval:
-                    max_eval = eval
+        key = board.zobrist_key
+        table = self.table
+        hash_move = 0
+        if table is not None:
+            entry = table.probe(key)
+            if entry is not None:
+                entry_depth, bound, score, hash_move = entry
+                # The root always searches, so that it returns a move
+                if ply and entry_depth >= depth:
+                    score = _score_from_table(score, ply)
+                    if (bound == EXACT or (bound == LOWER and score >= beta)
+                            or (bound == UPPER and score <= alpha)):
+                        return score, hash_move or None
+        if self._follow_pv:
+            if ply < len(self.principal_variation):
+                hash_move = self.principal_variation[ply]
+            else:
+                self._follow_pv = False
+
+        features = self.features
+        in_check = board.is_check(board.turn)
+        if (null_move and 'null_move' in features and not pv_node and ply and depth >= NULL_MOVE_MIN_DEPTH
+                and not in_check and board.move_history and board.move_history[-1] != NULL_MOVE):
+            score = self._null_move_search(board, depth, maximizing_player, alpha, beta, ply)
+            if self._stopped:
+                return 0, None
+            if score is not None:
+                return score, None
+
+        original_alpha, original_beta = alpha, beta
+        ordering = self.ordering
+        killers = ordering.killers[ply]
+        counter_move = ordering.counter_move(board)
+        best_eval = float('-inf') if maximizing_player else float('inf')
+        best_move = None
+        moves = pick_moves(board, self._move_buffers[ply], self._score_buffers[ply], hash_move,
+                           killers, counter_move, ordering.history, in_check)
+        for move_number, move in enumerate(moves):
+            board.make_packed_move(move)
+            if move_number == 0:
+                eval, _ = self._minimax(board, depth - 1, not maximizing_player, alpha, beta, ply + 1,
+                                        pv_node=pv_node)
+            else:
+                reduction = 0
+                if ('lmr' in features and not pv_node and ply and depth >= LMR_MIN_DEPTH
+                        and move_number >= LMR_MIN_MOVES and not in_check and not move >> 12 & (CAPTURE | PROMOTION)
+                        and move not in killers and move != counter_move and not board.is_check(board.turn)):
+                    reduction = min(LMR_REDUCTIONS[min(depth, 63)][min(move_number, 63)], depth - 2)
+                # With 'pvs' the move only has to be shown no better than the best so far
+                if 'pvs' in features:
+                    low, high = (alpha, alpha + 1) if maximizing_player else (beta - 1, beta)
+                else:
+                    low, high = alpha, beta
+                eval, _ = self._minimax(board, depth - 1 - reduction, not maximizing_player, low, high, ply + 1,
+                                        pv_node=False)
+                if reduction and (eval > alpha if maximizing_player else eval < beta):
+                    eval, _ = self._minimax(board, depth - 1, not maximizing_player, low, high, ply + 1,
+                                            pv_node=False)
+                if (low, high) != (alpha, beta) and alpha < eval < beta:
+                    # The move may be the new best, so it is searched again as part of the PV
+                    eval, _ = self._minimax(board, depth - 1, not maximizing_player, alpha, beta, ply + 1,
+                                            pv_node=pv_node)
+            board.undo_move()  # Restore board state
+            self._follow_pv = False
+            if self._stopped:
+                return 0, None
+            if maximizing_player:
+                if eval > best_eval:
+                    best_eval = eval
                     best_move = move
                 alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break
-            return max_eval, best_move
-        else:
-            min_eval = float('inf')
-            best_move = None
-            for move in legal_moves:
-                board.execute_move(move)
-                eval, _ = self._minimax(board, depth - 1, True, alpha, beta)
-                board.undo_move()  # Restore board state
-                if eval < min_eval:
-                    min_eval = eval
+            else:
+                if eval < best_eval:
+                    best_eval = eval
                     best_move = move
                 beta = min(beta, eval)
-                if beta <= alpha:
-                    break
-            return min_eval, best_move
+            if beta <= alpha:
+                ordering.record_cutoff(board, move, ply, depth, move_number)
+                break
+
+        if best_move is None:  # No legal move
+            if board.is_check(board.turn):  # Checkmate, the side to move has lost
+                best_eval = -(MATE_SCORE - ply) if maximizing_player else MATE_SCORE - ply
+            else:
+                best_eval = 0  # Stalemate
+        if table is not None:
+            if best_eval <= original_alpha:
+                bound = UPPER
+            elif best_eval >= original_beta:
+                bound = LOWER
+            else:
+                bound = EXACT
+            table.store(key, depth, bound, _score_to_table(best_eval, ply), best_move or 0)
+        return best_eval, best_move
+
+    def _null_move_search(self, board, depth, maximizing_player, alpha, beta, ply):
+        """
+        Null-move pruning: lets the side to move pass and searches the opponent's reply at reduced
+        depth. If passing still reaches beta (alpha when minimizing), a real move would too, so the
+        node can be cut off. Skipped when the static evaluation is already short of the bound, and
+        verified by a normal reduced search when the side to move has little non-pawn material,
+        where zugzwang (every move making things worse) would make the assumption wrong.
+        Returns:
+            int: The score to cut off with, or None to search the node normally.
+        """
+        static_eval = self._evaluate_board(board)
+        if static_eval < beta if maximizing_player else static_eval > alpha:
+            return None
+        reduction = NULL_MOVE_REDUCTION + (depth >= 7)
+        board.make_null_move()
+        score, _ = self._minimax(board, max(depth - 1 - reduction, 0), not maximizing_player, alpha, beta, ply + 1,
+                                 pv_node=False)
+        board.undo_null_move()
+        if self._stopped or (score < beta if maximizing_player else score > alpha):
+            return None
+        if abs(score) > MATE_BOUND:  # A mate found after passing is not proven
+            score = beta if maximizing_player else alpha
+        if board.non_pawn_material(board.turn) <= NULL_MOVE_VERIFY_MATERIAL:
+            verified, _ = self._minimax(board, max(depth - reduction, 1), maximizing_player, alpha, beta, ply,
+                                        null_move=False, pv_node=False)
+            if self._stopped or (verified < beta if maximizing_player else verified > alpha):
+                return None
+        return score
+
+    def _quiescence(self, board, maximizing_player, alpha, beta, ply):
+        """
+        Extends a leaf of the main search until the position is quiet, so that a piece left hanging
+        at the horizon is not scored as safe. The side to move may stand pat on the static
+        evaluation or try its captures and promotions; captures that lose material by static exchange
+        evaluation, or that cannot reach alpha (beta when minimizing) even with DELTA_MARGIN to
+        spare, are skipped. A side in check must answer it and is searched on all its moves instead.
+        Args:
+            board (ChessBoard): The current game board.
+            maximizing_player (bool): True if the side to move is maximizing (white), False if minimizing.
+            alpha (float): Alpha value for pruning.
+            beta (float): Beta value for pruning.
+            ply (int): Distance from the root of the search.
+        Returns:
+            int: The evaluation. Meaningless once the budget has stopped the search.
+        """
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check_limits()
+        if self._stopped:
+            return 0
+        if ply >= MAX_PLY - 1:
+            return self._evaluate_board(board)
+
+        in_check = board.is_check(board.turn)
+        if in_check:
+            best_eval = float('-inf') if maximizing_player else float('inf')
+            moves = pick_moves(board, self._move_buffers[ply], self._score_buffers[ply])
+        else:
+            stand_pat = best_eval = self._evaluate_board(board)
+            if maximizing_player:
+                if best_eval >= beta:
+                    return best_eval
+                alpha = max(alpha, best_eval)
+            else:
+                if best_eval <= alpha:
+                    return best_eval
+                beta = min(beta, best_eval)
+            moves = pick_captures(board, self._move_buffers[ply], self._score_buffers[ply])
+
+        for move in moves:
+            if not in_check:
+                gain = board.see(move)
+                if gain < 0:
+                    continue
+                if (stand_pat + gain + DELTA_MARGIN <= alpha if maximizing_player
+                        else stand_pat - gain - DELTA_MARGIN >= beta):
+                    continue
+            board.make_packed_move(move)
+            eval = self._quiescence(board, not maximizing_player, alpha, beta, ply + 1)
+            board.undo_move()
+            if self._stopped:
+                return 0
+            if maximizing_player:
+                best_eval = max(best_eval, eval)
+                alpha = max(alpha, eval)
+            else:
+                best_eval = min(best_eval, eval)
+                beta = min(beta, eval)
+            if beta <= alpha:
+                break
+
+        if in_check and best_eval in (float('-inf'), float('inf')):  # Checkmate
+            best_eval = -(MATE_SCORE - ply) if maximizing_player else MATE_SCORE - ply
+        return best_eval
 
     def _evaluate_board(self, board):
         """
-        Evaluates the board position for the AI.
+        Evaluates the board position for the AI: material, piece placement and pawn structure, tapered
+        between the middlegame and the endgame (see evaluation.py). The board keeps the piece-square
+        totals up to date as moves are made, and pawn structure comes from the pawn hash table
+        whenever the same pawns have been seen before. With a network, the NNUE evaluation replaces
+        all of this (see nnue.py).
         Args:
             board (ChessBoard): The current game board.
         Returns:
-            int: The evaluation score (positive for advantage, negative for disadvantage).
+            int: The evaluation score in centipawns (positive when white is better).
         """
-        piece_values = {'P': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 0}
-        score = 0
-        for piece, positions in board.piece_positions.items():
-            value = piece_values.get(piece[1], 0)
-            score += value * len(positions) if piece.startswith('w') else -value * len(positions)
-        return score
+        return self.evaluator.evaluate(board)
+
+
+def _score_to_table(score, ply):
+    """
+    Converts a mate score from distance-to-root to distance-to-this-node, so that a stored entry is
+    valid wherever the position recurs in the tree.
+    """
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    """
+    Converts a stored mate score back to distance-to-root at the current ply.
+    """
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
@@ -1,56 +1,277 @@
 # chess_board.py
+#
+# Mailbox board. Squares live in a 0x88 array of 128 small-int piece codes: square = row * 16 + col,
+# and a square is on the board exactly when square & 0x88 == 0, so one AND detects stepping off any
+# edge (this also holds for the negative squares reached from the top rows). Piece codes follow
+# zobrist.PIECE_NAMES (color * 6 + piece type) and EMPTY marks an empty square. Each piece code keeps
+# a list of its squares plus a square -> slot map, so pieces are added and removed in O(1).
+# The string grid ('wP', '..') is only built when the GUI asks for it.
 
-from pprint import pprint
+from attack_tables import POSITIONS, BETWEEN_POSITIONS, LINE
+from fen import STARTING_FEN, parse_fen, format_fen
+from moves import (QUIET, DOUBLE_PAWN_PUSH, KING_CASTLE, QUEEN_CASTLE, CAPTURE, EN_PASSANT, PROMOTION,
+                   PROMOTION_FLAGS, MAX_MOVES, NULL_MOVE, encode, decode_move)
+from evaluation import (SEE_VALUES, MIDDLEGAME_TABLES, ENDGAME_TABLES, PIECE_PHASES, evaluation_terms,
+                        tapered_score)
+from zobrist import (PIECE_NAMES, PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EN_PASSANT_KEYS, CASTLING_BITS,
+                     WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE, compute_key,
+                     compute_pawn_key)
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+EMPTY = 12  # EMPTY // 6 == 2, so the color of an empty square matches neither side
+
+PIECE_CODES = {name: code for code, name in enumerate(PIECE_NAMES)}
+
+# Conversions between 0x88 squares, 0-63 squares (as used by packed moves) and (row, col) positions
+SQUARE_88 = [row * 16 + col for row, col in POSITIONS]
+SQUARE_64 = [(square + (square & 7)) >> 1 for square in range(128)]
+POSITIONS_88 = [(square >> 4, square & 7) for square in range(128)]
+
+# Zobrist keys by piece code and 0x88 square
+PIECE_KEYS_88 = [[PIECE_KEYS[name][SQUARE_64[square]] if not square & 0x88 else 0 for square in range(128)]
+                 for name in PIECE_NAMES]
+
+# Evaluation tables (see evaluation.py) by piece code and 0x88 square
+MIDDLEGAME_TABLES_88 = [[table[SQUARE_64[square]] if not square & 0x88 else 0 for square in range(128)]
+                        for table in MIDDLEGAME_TABLES]
+ENDGAME_TABLES_88 = [[table[SQUARE_64[square]] if not square & 0x88 else 0 for square in range(128)]
+                     for table in ENDGAME_TABLES]
+
+KNIGHT_OFFSETS = (-33, -31, -18, -14, 14, 18, 31, 33)
+KING_OFFSETS = (-17, -16, -15, -1, 1, 15, 16, 17)
+ROOK_OFFSETS = (-16, 16, -1, 1)
+BISHOP_OFFSETS = (-17, -15, 15, 17)
+QUEEN_OFFSETS = ROOK_OFFSETS + BISHOP_OFFSETS
+SLIDER_OFFSETS = {BISHOP: BISHOP_OFFSETS, ROOK: ROOK_OFFSETS, QUEEN: QUEEN_OFFSETS}
+# Pawn moves per color: white pawns move towards row 0, black pawns towards row 7
+PAWN_PUSH = (-16, 16)
+PAWN_CAPTURE_OFFSETS = ((-17, -15), (15, 17))
+PAWN_START_ROW = (6, 1)
+
+# Move flags shifted into place, so generation can OR them straight into a packed move
+_CAPTURE = CAPTURE << 12
+_DOUBLE_PAWN_PUSH = DOUBLE_PAWN_PUSH << 12
+_EN_PASSANT = EN_PASSANT << 12
+_PROMOTIONS = tuple(PROMOTION_FLAGS[letter] << 12 for letter in 'QRBN')
+
+# Rights that survive a move touching each square (king and rook home squares clear their rights)
+CASTLING_MASK = [0b1111] * 128
+CASTLING_MASK[116] = 0b1111 & ~(WHITE_KING_SIDE | WHITE_QUEEN_SIDE)
+CASTLING_MASK[119] = 0b1111 & ~WHITE_KING_SIDE
+CASTLING_MASK[112] = 0b1111 & ~WHITE_QUEEN_SIDE
+CASTLING_MASK[4] = 0b1111 & ~(BLACK_KING_SIDE | BLACK_QUEEN_SIDE)
+CASTLING_MASK[7] = 0b1111 & ~BLACK_KING_SIDE
+CASTLING_MASK[0] = 0b1111 & ~BLACK_QUEEN_SIDE
+
+# (right bit, king from, king to, squares that must be empty, squares the king crosses or lands on, packed move)
+CASTLING_MOVES = [
+    [(WHITE_KING_SIDE, 116, 118, (117, 118), (117, 118), encode(60, 62, KING_CASTLE)),
+     (WHITE_QUEEN_SIDE, 116, 114, (113, 114, 115), (115, 114), encode(60, 58, QUEEN_CASTLE))],
+    [(BLACK_KING_SIDE, 4, 6, (5, 6), (5, 6), encode(4, 6, KING_CASTLE)),
+     (BLACK_QUEEN_SIDE, 4, 2, (1, 2, 3), (3, 2), encode(4, 2, QUEEN_CASTLE))],
+]
+CASTLING_ROOK_MOVES = {(116, 118): (119, 117), (116, 114): (112, 115), (4, 6): (7, 5), (4, 2): (0, 3)}
 
 
 class ChessBoard:
-    def __init__(self):
-        """
-        Initializes the chessboard with pieces in their starting positions and sets game state variables.
-        """
-        self.board = self._initialize_board()
-        self.move_history = []
-        self.king_positions = [(7, 4), (0, 4)] # Track king positions
-        self.piece_positions = self._initialize_piece_positions() # Track piece positions
-        self.castling_rights = {'white': {'king_side': True, 'queen_side': True},
-                                'black': {'king_side': True, 'queen_side': True}}
-        self.en_passant_target = None  # Square eligible for en passant capture
-        self.turn = 'white'
-
-    def _initialize_piece_positions(self):
-        """
-        Creates the initial hash map of piece positions.
-        Returns:
-            dict: A dictionary mapping each piece type to its list of positions.
-        """
-        positions = {}
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece != '..':
-                    if piece not in positions:
-                        positions[piece] = []
-                    positions[piece].append((row, col))
-        return positions
-
-    def _initialize_board(self):
-        """
-        Creates the starting position of the chessboard.
-        Returns:
-            list: 8x8 grid with piece representation (e.g., 'wP' for white pawn, 'bK' for black king).
-        """
-        board = [
-            ['bR', 'bN', 'bB', 'bQ', 'bK', 'bB', 'bN', 'bR'],  # Black pieces
-            ['bP'] * 8,                                        # Black pawns
-            ['..'] * 8,                                        # Empty squares
-            ['..'] * 8,
-            ['..'] * 8,
-            ['..'] * 8,
-            ['wP'] * 8,                                        # White pawns
-            ['wR', 'wN', 'wB', 'wQ', 'wK', 'wB', 'wN', 'wR'],  # White pieces
-        ]
+    __slots__ = ('squares', 'piece_squares', 'piece_slots', 'castling', 'ep_square', 'side', 'move_history',
+                 '_undo_stack', '_move_buffer', 'debug_zobrist', '_hashed_ep_file', 'zobrist_key', 'instrumentation',
+                 '_legal_index', '_start_clocks', '_null_stack', 'middlegame_score', 'endgame_score', 'phase',
+                 'debug_evaluation', 'pawn_key', 'accumulator')
+
+    def __init__(self, fen=None):
+        """
+        Initializes the chessboard and its game state variables.
+        Args:
+            fen (str): Optional position in Forsyth-Edwards Notation; the starting position if omitted.
+        """
+        self.move_history = []             # Packed moves made so far
+        self._undo_stack = []              # One record per move made, consumed by undo_move
+        self._null_stack = []              # One record per null move made, consumed by undo_null_move
+        self._move_buffer = [0] * MAX_MOVES  # Scratch buffer for the list-returning move queries
+        self.debug_zobrist = False         # When True, every make/undo checks the key against a full recompute
+        self.debug_evaluation = False      # When True, every make/undo checks the evaluation totals the same way
+        self.instrumentation = None        # Receives the events of execute_move when set
+        self.accumulator = None            # NNUE accumulator updated by every make/undo when set, see nnue.py
+        self._legal_index = None           # (zobrist key, side, index) behind legal_move_index
+        self._set_position(parse_fen(fen or STARTING_FEN))
+
+    @classmethod
+    def from_fen(cls, fen):
+        """
+        Creates a board from a position in Forsyth-Edwards Notation.
+        Args:
+            fen (str): The position, e.g. 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1'.
+        Returns:
+            ChessBoard: The new board.
+        Raises:
+            ValueError: If the FEN is malformed or a side does not have exactly one king.
+        """
+        board = cls(fen)
+        if len(board.piece_squares[KING]) != 1 or len(board.piece_squares[6 + KING]) != 1:
+            raise ValueError(f"Invalid FEN (each side needs exactly one king): {fen!r}")
         return board
 
+    def _set_position(self, position):
+        """
+        Replaces the board contents with a position parsed by fen.parse_fen.
+        """
+        self.squares = [EMPTY] * 128
+        self.piece_squares = [[] for _ in PIECE_NAMES]  # Squares of each piece code
+        self.piece_slots = [0] * 128                    # Index of each occupied square in its piece list
+        for piece, (row, col) in position['pieces']:
+            self._add(PIECE_CODES[piece], row * 16 + col)
+        self.castling = 0
+        for color, sides in CASTLING_BITS.items():
+            for side, bit in sides.items():
+                if position['castling_rights'][color][side]:
+                    self.castling |= bit
+        target = position['en_passant_target']
+        self.ep_square = target[0] * 16 + target[1] if target else None  # Square eligible for en passant capture
+        self.side = WHITE if position['turn'] == 'white' else BLACK
+        self._start_clocks = (position['halfmove_clock'], position['fullmove_number'])  # Move counters at load time
+        self._hashed_ep_file = self._ep_hash_file()  # En passant file included in the key
+        self.zobrist_key = self.compute_zobrist_key()
+        self.pawn_key = self.compute_pawn_key()  # Zobrist key of the pawns alone
+        # Running evaluation totals, see evaluation.py
+        self.middlegame_score, self.endgame_score, self.phase = self.compute_evaluation_terms()
+
+    # Piece list maintenance
+
+    def _add(self, piece, square):
+        squares = self.piece_squares[piece]
+        self.piece_slots[square] = len(squares)
+        squares.append(square)
+        self.squares[square] = piece
+
+    def _remove(self, piece, square):
+        """
+        Removes a piece by moving the last entry of its list into the freed slot.
+        Returns:
+            int: The slot the square occupied, needed by _restore.
+        """
+        squares = self.piece_squares[piece]
+        slot = self.piece_slots[square]
+        last = squares.pop()
+        if last != square:
+            squares[slot] = last
+            self.piece_slots[last] = slot
+        self.squares[square] = EMPTY
+        return slot
+
+    def _restore(self, piece, square, slot):
+        """
+        Reverses _remove, putting the square back into its original slot so list order is restored exactly.
+        """
+        squares = self.piece_squares[piece]
+        if slot < len(squares):
+            displaced = squares[slot]
+            self.piece_slots[displaced] = len(squares)
+            squares.append(displaced)
+            squares[slot] = square
+        else:
+            squares.append(square)
+        self.piece_slots[square] = slot
+        self.squares[square] = piece
+
+    def _relocate(self, piece, start, end):
+        slot = self.piece_slots[start]
+        self.piece_squares[piece][slot] = end
+        self.piece_slots[end] = slot
+        self.squares[start] = EMPTY
+        self.squares[end] = piece
+
+    # Views used by the GUI and the AI
+
+    @property
+    def turn(self):
+        return 'white' if self.side == WHITE else 'black'
+
+    @turn.setter
+    def turn(self, color):
+        self.side = WHITE if color == 'white' else BLACK
+
+    @property
+    def board(self):
+        """
+        Returns:
+            list: 8x8 grid with piece representation (e.g., 'wP' for white pawn, '..' for an empty square).
+        """
+        grid = [['..'] * 8 for _ in range(8)]
+        for piece, squares in enumerate(self.piece_squares):
+            for square in squares:
+                grid[square >> 4][square & 7] = PIECE_NAMES[piece]
+        return grid
+
+    @property
+    def piece_positions(self):
+        """
+        Returns:
+            dict: A dictionary mapping every piece type (even if absent) to its list of positions.
+        """
+        return {PIECE_NAMES[piece]: [POSITIONS_88[square] for square in squares]
+                for piece, squares in enumerate(self.piece_squares)}
+
+    @property
+    def king_positions(self):
+        return [POSITIONS_88[self.piece_squares[KING][0]], POSITIONS_88[self.piece_squares[6 + KING][0]]]
+
+    @property
+    def castling_rights(self):
+        return {color: {side: bool(self.castling & bit) for side, bit in sides.items()}
+                for color, sides in CASTLING_BITS.items()}
+
+    @property
+    def en_passant_target(self):
+        return POSITIONS_88[self.ep_square] if self.ep_square is not None else None
+
+    @property
+    def halfmove_clock(self):
+        """
+        Returns:
+            int: Plies since the last capture or pawn move, counting from the clock the position was loaded with.
+        """
+        clock = 0
+        for record in reversed(self._undo_stack):
+            if record[3] % 6 == PAWN or record[2] & CAPTURE:
+                return clock
+            clock += 1
+        return clock + self._start_clocks[0]
+
+    @property
+    def fullmove_number(self):
+        """
+        Returns:
+            int: The number of the current full move, starting from the number the position was loaded with.
+        """
+        started_black = (self.side ^ len(self._undo_stack)) & 1
+        return self._start_clocks[1] + (len(self._undo_stack) + started_black) // 2
+
+    def to_fen(self):
+        """
+        Returns:
+            str: The position in Forsyth-Edwards Notation.
+        """
+        return format_fen({
+            'pieces': [(piece, position) for piece, positions in self.piece_positions.items() for position in positions],
+            'turn': self.turn,
+            'castling_rights': self.castling_rights,
+            'en_passant_target': self.en_passant_target,
+            'halfmove_clock': self.halfmove_clock,
+            'fullmove_number': self.fullmove_number,
+        })
+
+    def piece_at(self, position):
+        """
+        Args:
+            position (tuple): The square (row, col).
+        Returns:
+            str: The piece on the square (e.g. 'wP'), or '..' if it is empty.
+        """
+        piece = self.squares[position[0] * 16 + position[1]]
+        return PIECE_NAMES[piece] if piece != EMPTY else '..'
+
     def display_board(self):
         """
         Prints the chessboard in a human-readable format.
@@ -68,430 +289,731 @@ class ChessBoard:
         Returns:
             bool: True if the path is clear, False otherwise.
         """
-        # Horizontal or vertical movement
-        row_start, col_start = start
-        row_end, col_end = end
-
-        if row_start == row_end:  # Horizontal
-            step = 1 if col_end > col_start else -1
-            for col in range(col_start + step, col_end, step):
-                if self.board[row_start][col] != '..':
-                    return False
-        elif col_start == col_end:  # Vertical
-            step = 1 if row_end > row_start else -1
-            for row in range(row_start + step, row_end, step):
-                if self.board[row][col_start] != '..':
-                    return False
-        else:  # Diagonal
-            row_step = 1 if row_end > row_start else -1
-            col_step = 1 if col_end > col_start else -1
-            row, col = row_start + row_step, col_start + col_step
-            while row != row_end and col != col_end:
-                if self.board[row][col] != '..':
-                    return False
-                row += row_step
-                col += col_step
-
+        squares = self.squares
+        for row, col in BETWEEN_POSITIONS[start[0] * 8 + start[1]][end[0] * 8 + end[1]]:
+            if squares[row * 16 + col] != EMPTY:
+                return False
         return True
 
-    def generate_legal_moves(self, color):
+    # Attack queries
+
+    def _is_attacked(self, square, by_color):
         """
-        Generates all legal moves for the current player.
+        Checks whether a square is attacked by a color, looking outward from the square.
         Args:
-            color (str): The color of the player ('white' or 'black').
+            square (int): The 0x88 target square.
+            by_color (int): WHITE or BLACK, the attacking side.
         Returns:
-            list: List of legal moves [(start_pos, end_pos)].
+            bool: True if any piece of by_color attacks the square.
         """
-        legal_moves = []
-        player_prefix = 'w' if color == 'white' else 'b'
+        squares = self.squares
+        base = by_color * 6
 
-        # Iterate through the player's pieces using piece_positions
-        for piece, positions in self.piece_positions.items():
-            if piece.startswith(player_prefix):
-                for position in positions:
-                    legal_moves.extend(self._get_piece_moves(position, piece))
+        knight = base + KNIGHT
+        for offset in KNIGHT_OFFSETS:
+            target = square + offset
+            if not target & 0x88 and squares[target] == knight:
+                return True
 
-        return legal_moves
+        # An attacking pawn stands where a pawn of the other color on the square would capture
+        pawn = base + PAWN
+        for offset in PAWN_CAPTURE_OFFSETS[by_color ^ 1]:
+            target = square + offset
+            if not target & 0x88 and squares[target] == pawn:
+                return True
 
-    def _get_piece_moves(self, position, piece):
+        king = base + KING
+        for offset in KING_OFFSETS:
+            target = square + offset
+            if not target & 0x88 and squares[target] == king:
+                return True
+
+        # Only the first piece on each ray can attack along it
+        queen = base + QUEEN
+        rook = base + ROOK
+        for offset in ROOK_OFFSETS:
+            target = square + offset
+            while not target & 0x88:
+                piece = squares[target]
+                if piece != EMPTY:
+                    if piece == rook or piece == queen:
+                        return True
+                    break
+                target += offset
+        bishop = base + BISHOP
+        for offset in BISHOP_OFFSETS:
+            target = square + offset
+            while not target & 0x88:
+                piece = squares[target]
+                if piece != EMPTY:
+                    if piece == bishop or piece == queen:
+                        return True
+                    break
+                target += offset
+        return False
+
+    def is_check(self, color):
         """
-        Helper function to get all legal moves for a specific piece.
+        Checks if the current player's king is in check without generating any opponent moves.
         Args:
-            position (tuple): Position of the piece (row, col).
-            piece (str): The piece at the position (e.g., 'wP', 'bK').
+            color (str): The color of the player ('white' or 'black').
         Returns:
-            list: List of legal moves [(start_pos, end_pos)].
+            bool: True if the king is in check, False otherwise.
         """
-        moves = []
-        color = 'white' if piece[0] == 'w' else 'black'
-        row, col = position
-    
-        if piece[1] == 'P':  # Pawn
-            moves.extend(self._get_pawn_moves(position, piece))
-        elif piece[1] == 'B':  # Bishop
-            moves.extend(self._get_bishop_moves(position, piece))
-        elif piece[1] == 'N':  # Knight
-            moves.extend(self._get_knight_moves(position, piece))
-        elif piece[1] == 'K':  # King
-            moves.extend(self._get_king_moves(position, piece))
-        elif piece[1] == 'R':  # Rook
-            moves.extend(self._get_rook_moves(position, piece))
-        elif piece[1] == 'Q':  # Queen
-            moves.extend(self._get_queen_moves(position, piece))
-    
-        # Filter out moves that would put the king in check
-        return [move for move in moves if not self.move_puts_king_in_check(move, color)]
-
-    def _get_opponent_piece_moves(self, position, piece):
-        """
-        Generates possible moves for an opponent piece without recursion.
+        side = WHITE if color == 'white' else BLACK
+        return self._is_attacked(self.piece_squares[side * 6 + KING][0], side ^ 1)
+
+    def is_check_on_position(self, position, color):
+        """
+        Checks if a specific position is under attack by opponent pieces.
         Args:
-            position (tuple): Position of the piece (row, col).
-            piece (str): The opponent piece at the position.
+            position (tuple): The position to check (row, col).
+            color (str): The color of the player ('white' or 'black').
+        Returns:
+            bool: True if the position is under attack, False otherwise.
+        """
+        return self._is_attacked(position[0] * 16 + position[1], BLACK if color == 'white' else WHITE)
+
+    def is_square_attacked(self, square, by_color):
+        """
+        Checks if a square is attacked by a color, stopping at the first attacker found.
+        Args:
+            square (tuple): The square to check (row, col).
+            by_color (str): The attacking color ('white' or 'black').
+        Returns:
+            bool: True if any piece of by_color attacks the square, False otherwise.
+        """
+        return self._is_attacked(square[0] * 16 + square[1], WHITE if by_color == 'white' else BLACK)
+
+    def king_squares(self):
+        """
         Returns:
-            list: List of potential moves [(start_pos, end_pos)].
+            tuple: The white and black king squares, numbered row * 8 + col.
         """
-        moves = []
-        if piece[1] == 'P':  # Pawn
-            moves.extend(self._get_pawn_moves(position, piece))
-        elif piece[1] == 'B':  # Bishop
-            moves.extend(self._get_bishop_moves(position, piece))
-        elif piece[1] == 'N':  # Knight
-            moves.extend(self._get_knight_moves(position, piece))
-        elif piece[1] == 'K':  # King
-            moves.extend(self._get_king_moves(position, piece, False))
-        elif piece[1] == 'R':  # Rook
-            moves.extend(self._get_rook_moves(position, piece))
-        elif piece[1] == 'Q':  # Queen
-            moves.extend(self._get_queen_moves(position, piece))
-        return moves
+        return SQUARE_64[self.piece_squares[KING][0]], SQUARE_64[self.piece_squares[6 + KING][0]]
 
+    def piece_codes(self):
+        """
+        Returns:
+            list: The piece code on each square numbered row * 8 + col, EMPTY (12) for an empty
+            square; pieces are numbered as in zobrist.PIECE_NAMES.
+        """
+        return [self.squares[square] for square in SQUARE_88]
 
-    def _get_pawn_moves(self, position, piece):
+    def pawn_bitboards(self):
+        """
+        Returns:
+            tuple: White and black pawns as 64-bit masks, bit row * 8 + col set for each pawn.
+        """
+        return (sum(1 << SQUARE_64[square] for square in self.piece_squares[PAWN]),
+                sum(1 << SQUARE_64[square] for square in self.piece_squares[6 + PAWN]))
+
+    def non_pawn_material(self, color):
         """
-        Generates legal moves for a pawn.
         Args:
-            position (tuple): Position of the pawn (row, col).
-            piece (str): The pawn ('wP' or 'bP').
-        Returns:
-            list: List of potential pawn moves [(start_pos, end_pos)].
-        """
-        moves = []
-        direction = -1 if piece.startswith('w') else 1
-        row, col = position
-
-        # Single step forward
-        if self.board[row + direction][col] == '..':
-            moves.append(((row, col), (row + direction, col)))
-
-        # Double step forward (only from starting position)
-        if (row == 6 and piece.startswith('w')) or (row == 1 and piece.startswith('b')):
-            if self.board[row + direction][col] == '..' and self.board[row + 2 * direction][col] == '..':
-                moves.append(((row, col), (row + 2 * direction, col)))
-
-        # Captures
-        for offset in [-1, 1]:  # Left and right diagonal
-            capture_col = col + offset
-            if 0 <= capture_col < 8 and self.board[row + direction][capture_col].startswith('b' if piece.startswith('w') else 'w'):
-                moves.append(((row, col), (row + direction, capture_col)))
-
-        # En passant
-        if self.en_passant_target:
-            target_row, target_col = self.en_passant_target
-            if abs(target_col - col) == 1 and target_row == row + direction:
-                # Ensure the en passant target is an opponent's pawn
-                en_passant_piece = self.board[row][target_col]  # Piece on the en passant target column
-                if en_passant_piece.startswith('b' if piece.startswith('w') else 'w'):  # Must be an opponent's pawn
-                    moves.append(((row, col), (target_row, target_col)))
-
-        return moves
-        
-    def _get_bishop_moves(self, position, piece):
-        """
-        Generates legal moves for a bishop.
+            color (str): 'white' or 'black'.
+        Returns:
+            int: The SEE_VALUES total of the color's knights, bishops, rooks and queens.
+        """
+        base = 0 if color == 'white' else 6
+        return sum(SEE_VALUES[piece_type] * len(self.piece_squares[base + piece_type])
+                   for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN))
+
+    def _least_valuable_attacker(self, square, by_color):
+        """
+        Finds the cheapest piece of a color attacking a 0x88 square. Among attackers of the same type
+        the one on the lowest square is taken, as on the bitboard board.
+        Returns:
+            tuple: (square, piece type) of the attacker, or (None, None) if there is none.
+        """
+        squares = self.squares
+        base = by_color * 6
+        pawn = base + PAWN
+        found = [target for target in (square + offset for offset in PAWN_CAPTURE_OFFSETS[by_color ^ 1])
+                 if not target & 0x88 and squares[target] == pawn]
+        if found:
+            return min(found), PAWN
+        knight = base + KNIGHT
+        found = [target for target in (square + offset for offset in KNIGHT_OFFSETS)
+                 if not target & 0x88 and squares[target] == knight]
+        if found:
+            return min(found), KNIGHT
+        queens = []
+        for offsets, slider in ((BISHOP_OFFSETS, base + BISHOP), (ROOK_OFFSETS, base + ROOK)):
+            found = []
+            for offset in offsets:
+                target = square + offset
+                while not target & 0x88:
+                    piece = squares[target]
+                    if piece != EMPTY:
+                        if piece == slider:
+                            found.append(target)
+                        elif piece == base + QUEEN:
+                            queens.append(target)
+                        break
+                    target += offset
+            if found:
+                return min(found), slider - base
+        if queens:
+            return min(queens), QUEEN
+        king = base + KING
+        for offset in KING_OFFSETS:
+            target = square + offset
+            if not target & 0x88 and squares[target] == king:
+                return target, KING
+        return None, None
+
+    def see(self, move):
+        """
+        Static exchange evaluation: the material the side to move wins by playing a move and then
+        letting both sides keep recapturing on its destination square with their least valuable
+        attacker, each side free to stop when continuing would lose more. X-ray attackers behind
+        the pieces that capture join in as the line opens.
         Args:
-            position (tuple): Position of the bishop (row, col).
-            piece (str): The bishop ('wB' or 'bB').
-        Returns:
-            list: List of potential bishop moves [(start_pos, end_pos)].
-        """
-        moves = []
-        row, col = position
-    
-        # Directions for diagonal movement (row_delta, col_delta)
-        directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-    
-        for row_delta, col_delta in directions:
-            current_row, current_col = row + row_delta, col + col_delta
-    
-            while 0 <= current_row < 8 and 0 <= current_col < 8:
-                target_square = self.board[current_row][current_col]
-    
-                if target_square == '..':  # Empty square
-                    moves.append(((row, col), (current_row, current_col)))
-                elif target_square.startswith(piece[0]):  # Own piece, block further movement
-                    break
-                else:  # Opponent's piece, capture allowed, but stop further movement
-                    moves.append(((row, col), (current_row, current_col)))
-                    break
-    
-                # Move to the next square in the current direction
-                current_row += row_delta
-                current_col += col_delta
-    
-        return moves
-        
-    def _get_knight_moves(self, position, piece):
-        """
-        Generates legal moves for a knight.
+            move (int): A packed move of the side to move, usually a capture.
+        Returns:
+            int: The expected material balance of the exchange, in SEE_VALUES units (negative if it loses).
+        """
+        squares = self.squares
+        start, end, flags = SQUARE_88[move & 63], SQUARE_88[move >> 6 & 63], move >> 12
+        gains = [0]
+        if flags == EN_PASSANT:
+            gains[0] = SEE_VALUES[PAWN]
+        elif flags & CAPTURE:
+            gains[0] = SEE_VALUES[squares[end] % 6]
+        attacker_value = SEE_VALUES[squares[start] % 6]
+        if flags & PROMOTION:
+            attacker_value = SEE_VALUES[KNIGHT + (flags & 3)]
+            gains[0] += attacker_value - SEE_VALUES[PAWN]
+
+        # Capturing pieces are lifted off the board as the exchange goes on, which uncovers x-rays
+        lifted = [(start, squares[start])]
+        squares[start] = EMPTY
+        if flags == EN_PASSANT:
+            captured_square = end - PAWN_PUSH[self.side]
+            lifted.append((captured_square, squares[captured_square]))
+            squares[captured_square] = EMPTY
+        side = self.side ^ 1
+        while True:
+            square, piece_type = self._least_valuable_attacker(end, side)
+            if square is None:
+                break
+            if piece_type == KING and self._least_valuable_attacker(end, side ^ 1)[0] is not None:
+                break  # The king may not capture into check
+            gains.append(attacker_value - gains[-1])
+            attacker_value = SEE_VALUES[piece_type]
+            lifted.append((square, squares[square]))
+            squares[square] = EMPTY
+            side ^= 1
+        for square, piece in lifted:
+            squares[square] = piece
+
+        # Work back from the end of the sequence: each side only captures if it does not lose by it
+        for index in range(len(gains) - 1, 0, -1):
+            gains[index - 1] = -max(-gains[index - 1], gains[index])
+        return gains[0]
+
+    # Move generation
+
+    def _checkers_and_pins(self, side):
+        """
+        Works out the pieces giving check and the absolutely pinned pieces by looking outward from the king.
         Args:
-            position (tuple): Position of the knight (row, col).
-            piece (str): The knight ('wN' or 'bN').
-        Returns:
-            list: List of potential knight moves [(start_pos, end_pos)].
-        """
-        moves = []
-        row, col = position
-        
-        # Directions for l-shaped movement (row_delta, col_delta)
-        directions = [(1, 2), (1, -2), (-1, 2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1)]
-        
-        for row_delta, col_delta in directions:
-            current_row, current_col = row + row_delta, col + col_delta
-            
-            if 0 <= current_row < 8 and 0 <= current_col < 8:
-                target_square = self.board[current_row][current_col]
-                if target_square == '..': # Empty Square
-                    moves.append(((row, col), (current_row, current_col)))
-                elif not target_square.startswith(piece[0]): # Make sure we dont capture our own piece
-                    moves.append(((row, col), (current_row, current_col)))
-        
-        return moves
-        
-    def _get_rook_moves(self, position, piece):
-        """
-        Generates legal moves for a rook.
+            side (int): WHITE or BLACK, the side whose king is examined.
+        Returns:
+            tuple: (checkers, targets, pins). checkers is the number of checking pieces, targets a mask
+            (bit n = 0x88 square n) of the squares that capture or block a single checker, or -1 when
+            not in check, and pins maps each pinned square to the offset of its pin line.
+        """
+        squares = self.squares
+        king_square = self.piece_squares[side * 6 + KING][0]
+        enemy = (side ^ 1) * 6
+        checkers = 0
+        targets = 0
+        pins = {}
+
+        # Sliders: the first piece on each ray checks, or an own piece followed by a slider is pinned
+        queen = enemy + QUEEN
+        for offsets, slider in ((ROOK_OFFSETS, enemy + ROOK), (BISHOP_OFFSETS, enemy + BISHOP)):
+            for offset in offsets:
+                pinned = None
+                ray = 0
+                target = king_square + offset
+                while not target & 0x88:
+                    ray |= 1 << target
+                    piece = squares[target]
+                    if piece != EMPTY:
+                        if piece // 6 == side:
+                            if pinned is not None:  # Two own pieces on the ray, nothing is pinned
+                                break
+                            pinned = target
+                        else:
+                            if piece == slider or piece == queen:
+                                if pinned is None:
+                                    checkers += 1
+                                    targets |= ray
+                                else:
+                                    pins[pinned] = offset
+                            break
+                    target += offset
+
+        # Knights and pawns can only check, never pin
+        knight = enemy + KNIGHT
+        for offset in KNIGHT_OFFSETS:
+            target = king_square + offset
+            if not target & 0x88 and squares[target] == knight:
+                checkers += 1
+                targets |= 1 << target
+        pawn = enemy + PAWN
+        for offset in PAWN_CAPTURE_OFFSETS[side]:
+            target = king_square + offset
+            if not target & 0x88 and squares[target] == pawn:
+                checkers += 1
+                targets |= 1 << target
+
+        return checkers, targets if checkers else -1, pins
+
+    def _legal_moves(self, side, moves, count=0, origin=None):
+        """
+        Generates legal moves directly from the piece lists, using the checkers and pins so that
+        only king moves and en passant need an attack test.
         Args:
-            position (tuple): Position of the rook (row, col).
-            piece (str): The rook ('wR' or 'bR').
-        Returns:
-            list: List of potential rook moves [(start_pos, end_pos)].
-        """
-        moves = []
-        row, col = position
-    
-        # Directions for horizontal and vertical movement (row_delta, col_delta)
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-    
-        for row_delta, col_delta in directions:
-            current_row, current_col = row + row_delta, col + col_delta
-    
-            while 0 <= current_row < 8 and 0 <= current_col < 8:
-                target_square = self.board[current_row][current_col]
-    
-                if target_square == '..':  # Empty square
-                    moves.append(((row, col), (current_row, current_col)))
-                elif target_square.startswith(piece[0]):  # Own piece, block further movement
-                    break
-                else:  # Opponent's piece, capture allowed, but stop further movement
-                    moves.append(((row, col), (current_row, current_col)))
+            side (int): WHITE or BLACK.
+            moves (list): Buffer the packed moves are stored into.
+            count (int): Index of the first free slot in the buffer.
+            origin (int): Optional 0x88 square whose moves alone are generated.
+        Returns:
+            int: The index after the last stored move.
+        """
+        checkers, targets, pins = self._checkers_and_pins(side)
+        base = side * 6
+        king_square = self.piece_squares[base + KING][0]
+        if origin is None or origin == king_square:
+            count = self._king_moves(side, king_square, not checkers, moves, count)
+        if checkers > 1 or origin == king_square:  # Double check, only the king can move
+            return count
+
+        if origin is not None:
+            piece = self.squares[origin]
+            if piece // 6 == side:
+                if piece == base + PAWN:
+                    count = self._pawn_moves(side, origin, targets, pins, moves, count)
+                else:
+                    count = self._piece_moves(side, origin, piece - base, targets, pins, moves, count)
+            return count
+
+        piece_squares = self.piece_squares
+        for square in piece_squares[base + PAWN]:
+            count = self._pawn_moves(side, square, targets, pins, moves, count)
+        for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN):
+            for square in piece_squares[base + piece_type]:
+                count = self._piece_moves(side, square, piece_type, targets, pins, moves, count)
+        return count
+
+    def _king_moves(self, side, king_square, castling_allowed, moves, count):
+        """
+        Stores the king moves whose destination is not attacked once the king has left its square.
+        """
+        squares = self.squares
+        enemy = side ^ 1
+        start = SQUARE_64[king_square]
+        king = squares[king_square]
+        squares[king_square] = EMPTY  # Lifted so that it cannot shield itself from a slider
+        for offset in KING_OFFSETS:
+            target = king_square + offset
+            if target & 0x88:
+                continue
+            piece = squares[target]
+            if piece // 6 != side and not self._is_attacked(target, enemy):
+                moves[count] = start | SQUARE_64[target] << 6 | (_CAPTURE if piece != EMPTY else 0)
+                count += 1
+        squares[king_square] = king
+        if castling_allowed and self.castling:
+            for right, king_from, _, empty_squares, king_path, move in CASTLING_MOVES[side]:
+                if (self.castling & right and king_square == king_from
+                        and all(squares[square] == EMPTY for square in empty_squares)
+                        and not any(self._is_attacked(square, enemy) for square in king_path)):
+                    moves[count] = move
+                    count += 1
+        return count
+
+    def _pawn_moves(self, side, square, targets, pins, moves, count):
+        """
+        Stores the legal moves of one pawn, expanding moves to the last rank into the four promotions.
+        """
+        squares = self.squares
+        start = SQUARE_64[square]
+        pin = pins.get(square)
+        push = PAWN_PUSH[side]
+        target = square + push
+        if squares[target] == EMPTY and (pin is None or pin == push or pin == -push):
+            if targets >> target & 1:
+                if target < 8 or target >= 112:
+                    for promotion in _PROMOTIONS:
+                        moves[count] = start | SQUARE_64[target] << 6 | promotion
+                        count += 1
+                else:
+                    moves[count] = start | SQUARE_64[target] << 6
+                    count += 1
+            if square >> 4 == PAWN_START_ROW[side]:
+                target += push
+                if squares[target] == EMPTY and targets >> target & 1:
+                    moves[count] = start | SQUARE_64[target] << 6 | _DOUBLE_PAWN_PUSH
+                    count += 1
+        for offset in PAWN_CAPTURE_OFFSETS[side]:
+            target = square + offset
+            if target & 0x88 or (pin is not None and pin != offset and pin != -offset):
+                continue
+            piece = squares[target]
+            if piece != EMPTY:
+                if piece // 6 != side and targets >> target & 1:
+                    if target < 8 or target >= 112:
+                        for promotion in _PROMOTIONS:
+                            moves[count] = start | SQUARE_64[target] << 6 | _CAPTURE | promotion
+                            count += 1
+                    else:
+                        moves[count] = start | SQUARE_64[target] << 6 | _CAPTURE
+                        count += 1
+            elif target == self.ep_square and side == self.side and self._is_legal_en_passant(side, square, target):
+                moves[count] = start | SQUARE_64[target] << 6 | _EN_PASSANT
+                count += 1
+        return count
+
+    def _piece_moves(self, side, square, piece_type, targets, pins, moves, count):
+        """
+        Stores the legal moves of a knight, bishop, rook or queen. A pinned piece stays on its pin line.
+        """
+        squares = self.squares
+        start = SQUARE_64[square]
+        pin = pins.get(square)
+        if piece_type == KNIGHT:
+            if pin is not None:  # A pinned knight can never move
+                return count
+            for offset in KNIGHT_OFFSETS:
+                target = square + offset
+                if target & 0x88 or not targets >> target & 1:
+                    continue
+                piece = squares[target]
+                if piece == EMPTY:
+                    moves[count] = start | SQUARE_64[target] << 6
+                    count += 1
+                elif piece // 6 != side:
+                    moves[count] = start | SQUARE_64[target] << 6 | _CAPTURE
+                    count += 1
+            return count
+        for offset in SLIDER_OFFSETS[piece_type]:
+            if pin is not None and pin != offset and pin != -offset:
+                continue
+            target = square + offset
+            while not target & 0x88:
+                piece = squares[target]
+                if piece == EMPTY:
+                    if targets >> target & 1:
+                        moves[count] = start | SQUARE_64[target] << 6
+                        count += 1
+                else:
+                    if piece // 6 != side and targets >> target & 1:
+                        moves[count] = start | SQUARE_64[target] << 6 | _CAPTURE
+                        count += 1
                     break
-    
-                # Move to the next square in the current direction
-                current_row += row_delta
-                current_col += col_delta
-    
-        return moves
-    
-    def _get_king_moves(self, position, piece, validate_castling=True):
-        """
-        Generates legal moves for a king.
+                target += offset
+        return count
+
+    def _is_legal_en_passant(self, side, start, end):
+        """
+        En passant removes a second piece from the board, so it is tested by playing it on the squares.
+        """
+        squares = self.squares
+        captured_square = end - PAWN_PUSH[side]
+        pawn, captured = squares[start], squares[captured_square]
+        squares[start] = squares[captured_square] = EMPTY
+        squares[end] = pawn
+        legal = not self._is_attacked(self.piece_squares[side * 6 + KING][0], side ^ 1)
+        squares[end] = EMPTY
+        squares[start], squares[captured_square] = pawn, captured
+        return legal
+
+    def _pseudo_legal_moves(self, side, moves, count=0, origin=None, noisy=True, quiet=True):
+        """
+        Generates pseudo-legal moves from the piece lists, leaving out the king safety test.
         Args:
-            position (tuple): Position of the king (row, col).
-            piece (str): The king ('wK' or 'bK').
-            validate_castling (bool): Whether to add castling moves or not
-        Returns:
-            list: List of potential knight moves [(start_pos, end_pos)].
-        """
-        moves = []
-        row, col = position
-        color = 'white' if piece[0] == 'w' else 'black'
-        
-        # Directions for  movement (row_delta, col_delta)
-        directions = [(1, 1), (1, 0), (1, -1), (0, 1), (0, -1), (-1, 1), (-1, 0), (-1, -1)]
-        
-        for row_delta, col_delta in directions:
-            current_row, current_col = row + row_delta, col + col_delta
-            
-            if 0 <= current_row < 8 and 0 <= current_col < 8:
-                target_square = self.board[current_row][current_col]
-                if target_square == '..': # Empty Square
-                    moves.append(((row, col), (current_row, current_col)))
-                elif not target_square.startswith(piece[0]): # Make sure we dont capture our own piece
-                    moves.append(((row, col), (current_row, current_col)))
-
-            # Castling moves
-        if validate_castling:
-            if self.can_castle(color, 'king_side'):
-                moves.append(((row, col), (row, col + 2)))
-            if self.can_castle(color, 'queen_side'):
-                moves.append(((row, col), (row, col - 2)))
-            
-        return moves
-        
-    def _get_queen_moves(self, position, piece):
-        """
-        Generates legal moves for a queen.
+            side (int): WHITE or BLACK.
+            moves (list): Buffer the packed moves are stored into.
+            count (int): Index of the first free slot in the buffer.
+            origin (int): Optional 0x88 square whose moves alone are generated.
+            noisy (bool): Whether to generate captures, en passant and promotions.
+            quiet (bool): Whether to generate the remaining moves, castling included.
+        Returns:
+            int: The index after the last stored move.
+        """
+        squares = self.squares
+        base = side * 6
+        if origin is None:
+            origins = [(square, piece_type) for piece_type in range(6)
+                       for square in self.piece_squares[base + piece_type]]
+        else:
+            origins = [(origin, squares[origin] - base)]
+
+        for square, piece_type in origins:
+            start = SQUARE_64[square]
+            if piece_type == PAWN:
+                push = PAWN_PUSH[side]
+                target = square + push
+                if squares[target] == EMPTY:
+                    if target < 8 or target >= 112:
+                        if noisy:
+                            for promotion in _PROMOTIONS:
+                                moves[count] = start | SQUARE_64[target] << 6 | promotion
+                                count += 1
+                    elif quiet:
+                        moves[count] = start | SQUARE_64[target] << 6
+                        count += 1
+                        target += push
+                        if square >> 4 == PAWN_START_ROW[side] and squares[target] == EMPTY:
+                            moves[count] = start | SQUARE_64[target] << 6 | _DOUBLE_PAWN_PUSH
+                            count += 1
+                if noisy:
+                    for offset in PAWN_CAPTURE_OFFSETS[side]:
+                        target = square + offset
+                        if target & 0x88:
+                            continue
+                        piece = squares[target]
+                        if piece == EMPTY:
+                            if target == self.ep_square and side == self.side:
+                                moves[count] = start | SQUARE_64[target] << 6 | _EN_PASSANT
+                                count += 1
+                        elif piece // 6 != side:
+                            if target < 8 or target >= 112:
+                                for promotion in _PROMOTIONS:
+                                    moves[count] = start | SQUARE_64[target] << 6 | _CAPTURE | promotion
+                                    count += 1
+                            else:
+                                moves[count] = start | SQUARE_64[target] << 6 | _CAPTURE
+                                count += 1
+            elif piece_type == KNIGHT or piece_type == KING:
+                for offset in (KNIGHT_OFFSETS if piece_type == KNIGHT else KING_OFFSETS):
+                    target = square + offset
+                    if target & 0x88:
+                        continue
+                    piece = squares[target]
+                    if piece == EMPTY:
+                        if quiet:
+                            moves[count] = start | SQUARE_64[target] << 6
+                            count += 1
+                    elif noisy and piece // 6 != side:
+                        moves[count] = start | SQUARE_64[target] << 6 | _CAPTURE
+                        count += 1
+                if piece_type == KING and quiet and self.castling:
+                    for right, king_from, _, empty_squares, king_path, move in CASTLING_MOVES[side]:
+                        if (self.castling & right and square == king_from
+                                and all(squares[empty] == EMPTY for empty in empty_squares)
+                                and not any(self._is_attacked(path, side ^ 1) for path in (king_from,) + king_path)):
+                            moves[count] = move
+                            count += 1
+            else:
+                for offset in SLIDER_OFFSETS[piece_type]:
+                    target = square + offset
+                    while not target & 0x88:
+                        piece = squares[target]
+                        if piece == EMPTY:
+                            if quiet:
+                                moves[count] = start | SQUARE_64[target] << 6
+                                count += 1
+                        else:
+                            if noisy and piece // 6 != side:
+                                moves[count] = start | SQUARE_64[target] << 6 | _CAPTURE
+                                count += 1
+                            break
+                        target += offset
+        return count
+
+    def generate_moves(self, moves):
+        """
+        Generates the legal moves of the side to move in packed form (see moves.py).
         Args:
-            position (tuple): Position of the queen (row, col).
-            piece (str): The queen ('wQ' or 'bQ').
-        Returns:
-            list: List of potential rook moves [(start_pos, end_pos)].
-        """
-        moves = []
-        row, col = position
-    
-        # Directions for horizontal, vertical and diagonal movement (row_delta, col_delta)
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
-    
-        for row_delta, col_delta in directions:
-            current_row, current_col = row + row_delta, col + col_delta
-    
-            while 0 <= current_row < 8 and 0 <= current_col < 8:
-                target_square = self.board[current_row][current_col]
-    
-                if target_square == '..':  # Empty square
-                    moves.append(((row, col), (current_row, current_col)))
-                elif target_square.startswith(piece[0]):  # Own piece, block further movement
-                    break
-                else:  # Opponent's piece, capture allowed, but stop further movement
-                    moves.append(((row, col), (current_row, current_col)))
-                    break
-    
-                # Move to the next square in the current direction
-                current_row += row_delta
-                current_col += col_delta
-    
-        return moves
-    
-    def execute_move(self, move):
+            moves (list): Buffer of at least MAX_MOVES slots, e.g. one from allocate_move_buffers.
+        Returns:
+            int: The number of moves stored at the start of the buffer.
         """
-        Executes a given move on the board, updates game state variables, 
-        and handles special cases like promotion, castling, and en passant.
+        return self._legal_moves(self.side, moves)
+
+    def generate_legal_moves(self, color):
+        """
+        Generates all legal moves for the current player.
         Args:
-            move (tuple): The move to execute, in the format ((start_row, start_col), (end_row, end_col)).
-        """
-        start_pos, end_pos = move
-        start_row, start_col = start_pos
-        end_row, end_col = end_pos
-        moving_piece = self.board[start_row][start_col]
-        captured_piece = self.board[end_row][end_col]
-
-        # Move the piece to the new position
-        self.board[end_row][end_col] = moving_piece
-        self.board[start_row][start_col] = '..'
-
-        print(moving_piece, start_pos, end_pos)
-        # Update piece_positions
-        self.piece_positions[moving_piece].remove(start_pos)
-        self.piece_positions[moving_piece].append(end_pos)
-
-        # If a piece was captured, remove its position
-        if captured_piece != '..':
-            self.piece_positions[captured_piece].remove(end_pos)
-            if not self.piece_positions[captured_piece]:  # If no instances of the piece remain
-                del self.piece_positions[captured_piece]
-    
-        # Update move history
-        self.move_history.append(move)
-    
-        # Update king position if the king moved
-        if moving_piece[1] == 'K':
-            if moving_piece.startswith('w'):
-                self.king_positions[0] = end_pos  # Update white king's position
+            color (str): The color of the player ('white' or 'black').
+        Returns:
+            list: List of legal moves [(start_pos, end_pos)].
+        """
+        side = WHITE if color == 'white' else BLACK
+        if side == self.side:
+            return [move for moves in self.legal_move_index().values() for move in moves]
+        buffer = self._move_buffer
+        return [decode_move(buffer[index]) for index in range(self._legal_moves(side, buffer))]
+
+    def legal_move_index(self):
+        """
+        Returns the legal moves of the side to move grouped by origin square. The index is built once per
+        position and reused until the position changes, so the GUI, the game-over checks and move
+        validation share a single generation per ply.
+        Returns:
+            dict: Maps each (row, col) with at least one legal move to its moves [(start_pos, end_pos)].
+            The dictionary and its lists are shared and must not be modified.
+        """
+        cached = self._legal_index
+        if cached is not None and cached[0] == self.zobrist_key and cached[1] == self.side:
+            return cached[2]
+        index = {}
+        buffer = self._move_buffer
+        for slot in range(self._legal_moves(self.side, buffer)):
+            move = decode_move(buffer[slot])
+            if move[0] in index:
+                index[move[0]].append(move)
             else:
-                self.king_positions[1] = end_pos  # Update black king's position
-
-        # Handle special cases
-        if moving_piece[1] == 'P':  # Pawn
-            self._handle_pawn_special_cases(start_pos, end_pos)
-        elif moving_piece[1] == 'K':  # King
-            self._handle_castling(start_pos, end_pos)
-    
-        # Update game state variables
-        self._update_castling_rights(moving_piece, start_pos)
-        self._update_en_passant(moving_piece, start_pos, end_pos)
-    
-        # Switch turn
-        self.turn = 'black' if self.turn == 'white' else 'white'
-
-        pprint(self.piece_positions)
-    
-    def temp_move(self, move):
-        """
-        Temporarily makes a move on the board and returns the previous state for restoration.
+                index[move[0]] = [move]
+        self._legal_index = (self.zobrist_key, self.side, index)
+        return index
+
+    def _get_piece_moves(self, position, piece):
+        """
+        Helper function to get all legal moves for a specific piece.
         Args:
-            move (tuple): The move to execute, in the format ((start_row, start_col), (end_row, end_col)).
-        Returns:
-            tuple: A tuple containing the previous state of the end position and the moving piece.
-        """
-        start_pos, end_pos = move
-        start_row, start_col = start_pos
-        end_row, end_col = end_pos
-    
-        # Save the previous state of the board
-        previous_end_piece = self.board[end_row][end_col]
-        moving_piece = self.board[start_row][start_col]
-    
-        # Temporarily make the move
-        self.board[end_row][end_col] = moving_piece
-        self.board[start_row][start_col] = '..'
-    
-        return previous_end_piece, moving_piece
-    
-    def is_check(self, color):
+            position (tuple): Position of the piece (row, col).
+            piece (str): The piece at the position (e.g., 'wP', 'bK').
+        Returns:
+            list: List of legal moves [(start_pos, end_pos)].
+        """
+        side = WHITE if piece[0] == 'w' else BLACK
+        if side == self.side:
+            return list(self.legal_move_index().get(tuple(position), ()))
+        buffer = self._move_buffer
+        count = self._legal_moves(side, buffer, 0, position[0] * 16 + position[1])
+        return [decode_move(buffer[index]) for index in range(count)]
+
+    def generate_noisy_moves(self, moves, count=0):
         """
-        Checks if the current player's king is in check without generating all opponent moves.
+        Generates the pseudo-legal captures, en passant captures and promotions of the side to move.
+        Legality is left to is_legal, so a search that cuts off early never pays for it.
         Args:
-            color (str): The color of the player ('white' or 'black').
+            moves (list): Buffer the packed moves are stored into.
+            count (int): Index of the first free slot in the buffer.
         Returns:
-            bool: True if the king is in check, False otherwise.
+            int: The index after the last stored move.
         """
-        # Get the king's position
-        king_position = self.king_positions[0] if color == 'white' else self.king_positions[1]
-
-        # Check if any opponent piece attacks the king's position
-        opponent_color = 'b' if color == 'white' else 'w'
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece.startswith(opponent_color):  # Opponent's piece
-                    moves = self._get_opponent_piece_moves((row, col), piece)
-                    if any(move[1] == king_position for move in moves):  # King is under attack
-                        return True
+        return self._pseudo_legal_moves(self.side, moves, count, None, True, False)
+
+    def generate_quiet_moves(self, moves, count=0):
+        """
+        Generates the pseudo-legal moves of the side to move that generate_noisy_moves leaves out.
+        Args:
+            moves (list): Buffer the packed moves are stored into.
+            count (int): Index of the first free slot in the buffer.
+        Returns:
+            int: The index after the last stored move.
+        """
+        return self._pseudo_legal_moves(self.side, moves, count, None, False, True)
 
+    def is_pseudo_legal(self, move):
+        """
+        Checks that a packed move from elsewhere (a hash table or killer slot) can be played by the side
+        to move in this position, apart from leaving its own king in check.
+        Args:
+            move (int): The packed move.
+        Returns:
+            bool: True if the move is among the pseudo-legal moves of the position.
+        """
+        start = SQUARE_88[move & 63]
+        if self.squares[start] // 6 != self.side:
+            return False
+        buffer = self._move_buffer
+        for index in range(self._pseudo_legal_moves(self.side, buffer, 0, start)):
+            if buffer[index] == move:
+                return True
         return False
-    
-    def is_check_on_position(self, position, color):
+
+    def is_legal(self, move, in_check=None):
         """
-        Checks if a specific position is under attack by opponent pieces.
+        Checks that a pseudo-legal move of the side to move does not leave its king attacked.
         Args:
-            position (tuple): The position to check (row, col).
-            color (str): The color of the player ('white' or 'black').
+            move (int): The packed move.
+            in_check (bool): Whether the side to move is in check, if the caller already knows. Out of
+                check, a move by any piece other than the king that is not lined up with it is always legal.
         Returns:
-            bool: True if the position is under attack, False otherwise.
+            bool: True if the move is legal.
+        """
+        side = self.side
+        squares = self.squares
+        start = SQUARE_88[move & 63]
+        end = SQUARE_88[move >> 6 & 63]
+        piece = squares[start]
+        king_square = self.piece_squares[side * 6 + KING][0]
+        if move >> 12 == EN_PASSANT:
+            return self._is_legal_en_passant(side, start, end)
+        if piece != side * 6 + KING:
+            if in_check is None:
+                in_check = self._is_attacked(king_square, side ^ 1)
+            if not in_check and not LINE[SQUARE_64[king_square]][move & 63]:
+                return True
+        else:
+            king_square = end
+        # Play the move on the squares alone; the captured piece, if any, is overwritten and so cannot attack
+        captured = squares[end]
+        squares[start] = EMPTY
+        squares[end] = piece
+        legal = not self._is_attacked(king_square, side ^ 1)
+        squares[start], squares[end] = piece, captured
+        return legal
+
+    def piece_type_at(self, square):
+        """
+        Args:
+            square (int): The square, numbered row * 8 + col.
+        Returns:
+            int: The type (PAWN to KING) of the piece on the square, or None if it is empty.
         """
-        opponent_prefix = 'b' if color == 'white' else 'w'
+        piece = self.squares[SQUARE_88[square]]
+        return piece % 6 if piece != EMPTY else None
 
-        # Iterate through opponent pieces only
-        for piece, positions in self.piece_positions.items():
-            if piece.startswith(opponent_prefix):
-                for piece_pos in positions:
-                    moves = self._get_opponent_piece_moves(piece_pos, piece)
-                    if any(move[1] == position for move in moves):  # Position is attacked
-                        return True
+    def encode_move(self, move):
+        """
+        Packs a move given in the public format, working out its flags from the position.
+        Args:
+            move (tuple): ((start_row, start_col), (end_row, end_col)), optionally followed by the
+                promotion piece type ('R', 'B' or 'N'; a queen by default).
+        Returns:
+            int: The packed move.
+        """
+        (start_row, start_col), (end_row, end_col) = move[0], move[1]
+        start, end = start_row * 16 + start_col, end_row * 16 + end_col
+        piece_type = self.squares[start] % 6
+        flags = CAPTURE if self.squares[end] != EMPTY else QUIET
+        if piece_type == PAWN:
+            if end == self.ep_square:
+                flags = EN_PASSANT
+            elif abs(end - start) == 32:
+                flags = DOUBLE_PAWN_PUSH
+            elif end_row in (0, 7):
+                flags |= PROMOTION_FLAGS[move[2] if len(move) > 2 else 'Q']
+        elif piece_type == KING and (start, end) in CASTLING_ROOK_MOVES:
+            flags = KING_CASTLE if end > start else QUEEN_CASTLE
+        return encode(start_row * 8 + start_col, end_row * 8 + end_col, flags)
 
-        return False
+    def has_legal_move(self, color):
+        """
+        Checks whether the player has at least one legal move.
+        Args:
+            color (str): The color of the player ('white' or 'black').
+        Returns:
+            bool: True if a legal move exists, False otherwise.
+        """
+        side = WHITE if color == 'white' else BLACK
+        cached = self._legal_index
+        if cached is not None and cached[0] == self.zobrist_key and cached[1] == side:
+            return bool(cached[2])
+        # Most positions have a king move; try the king before generating everything
+        buffer = self._move_buffer
+        return bool(self._legal_moves(side, buffer, 0, self.piece_squares[side * 6 + KING][0])
+                    or self._legal_moves(side, buffer))
 
     def move_puts_king_in_check(self, move, color):
         """
@@ -502,160 +1024,296 @@ class ChessBoard:
         Returns:
             bool: True if the move leaves the king in check, False otherwise.
         """
-        start_pos, end_pos = move
-        previous_end_piece, moving_piece = self.temp_move(move)
-
-        # Temporarily update the king's position if it's moving
-        original_king_position = None
-        if moving_piece[1] == 'K':
-            if color == 'white':
-                original_king_position = self.king_positions[0]
-                self.king_positions[0] = end_pos
-            else:
-                original_king_position = self.king_positions[1]
-                self.king_positions[1] = end_pos
-
-        # Check if the king is in check
-        in_check = self.is_check(color)
-
-        # Restore the previous board state
-        self.board[end_pos[0]][end_pos[1]] = previous_end_piece
-        self.board[start_pos[0]][start_pos[1]] = moving_piece
-
-        # Restore the original king position if updated
-        if moving_piece[1] == 'K' and original_king_position:
-            if color == 'white':
-                self.king_positions[0] = original_king_position
-            else:
-                self.king_positions[1] = original_king_position
-
+        side = WHITE if color == 'white' else BLACK
+        self._make(self.encode_move(move))
+        in_check = self._is_attacked(self.piece_squares[side * 6 + KING][0], side ^ 1)
+        self._unmake()
         return in_check
 
+    def can_castle(self, color, side):
+        """
+        Determines if castling is legal for the given color and side (king-side or queen-side).
+        Args:
+            color (str): 'white' or 'black', representing the player.
+            side (str): 'king_side' or 'queen_side', representing the side to castle.
+        Returns:
+            bool: True if castling is legal, False otherwise.
+        """
+        mover = WHITE if color == 'white' else BLACK
+        right = CASTLING_BITS[color][side]
+        for bit, king_from, _, empty_squares, king_path, _ in CASTLING_MOVES[mover]:
+            if bit == right:
+                return bool(self.castling & right and self.squares[king_from] == mover * 6 + KING
+                            and all(self.squares[square] == EMPTY for square in empty_squares)
+                            and not any(self._is_attacked(square, mover ^ 1) for square in (king_from,) + king_path))
+        return False
+
     def is_checkmate(self, color):
         """
         Returns True if player is checkmated
         """
-        return self.is_check(color) and len(self.generate_legal_moves(color)) == 0
-    
+        return self.is_check(color) and not self.has_legal_move(color)
+
     def is_stalemate(self, color):
         """
         Returns True if player is stalemated
         """
-        return not self.is_check(color) and len(self.generate_legal_moves(color)) == 0
+        return not self.is_check(color) and not self.has_legal_move(color)
+
+    # Making and unmaking moves
 
-    def _handle_pawn_special_cases(self, start_pos, end_pos):
+    def execute_move(self, move):
         """
-        Handles special cases for pawns, such as promotion and en passant.
+        Executes a given move on the board, updates game state variables,
+        and handles special cases like promotion, castling, and en passant.
+        Events are reported to the board's instrumentation, if one is attached.
+        Args:
+            move (tuple): The move to execute, in the format ((start_row, start_col), (end_row, end_col)),
+                optionally followed by the promotion piece type ('R', 'B' or 'N'; a queen by default).
         """
-        start_row, start_col = start_pos
-        end_row, end_col = end_pos
-        moving_piece = self.board[end_row][end_col]
-        other_piece = 'wP' if moving_piece == 'bP' else 'bP'
-    
-        # Promotion
-        if (moving_piece == 'wP' and end_row == 0) or (moving_piece == 'bP' and end_row == 7):
-            promoting_to = self._promote_pawn()
-            self.board[end_row][end_col] = promoting_to
-            self.piece_positions[moving_piece].remove((end_row, end_col)) # Remove the pawn from the list of pawns in piece position
-            if promoting_to in self.piece_positions.keys(): # Make sure the promoting piece is still in piece positions
-                self.piece_positions[promoting_to].append((end_row, end_col)) # Add the position of the promoting piece to piece positions
-            else:
-                self.piece_positions[promoting_to] = []
-                self.piece_positions[promoting_to].append((end_row, end_col))
-    
-        # En passant capture
-        if self.en_passant_target == end_pos:
-            print('En passant capture')
-            self.board[start_row][end_col] = '..'
-            self.piece_positions[other_piece].remove((start_row, end_col)) # Update piece positions to make sure captured pawn is removed
+        move = self.encode_move(move)
+        if self.instrumentation is None:
+            self.make_packed_move(move)
+        else:
+            self.instrumentation.execute(self, move)
 
-    def can_castle(self, color, side):
+    def make_move(self, move):
         """
-        Determines if castling is legal for the given color and side (king-side or queen-side).
+        Makes a move and pushes an undo record so that undo_move can reverse it exactly.
         Args:
-            color (str): 'white' or 'black', representing the player.
-            side (str): 'king_side' or 'queen_side', representing the side to castle.
-        Returns:
-            bool: True if castling is legal, False otherwise.
+            move (tuple): The move to execute, in the format ((start_row, start_col), (end_row, end_col)),
+                optionally followed by the promotion piece type ('R', 'B' or 'N'; a queen by default).
         """
-        # Define rows and columns for king and rook positions
-        row = 7 if color == 'white' else 0
-        king_col = 4
-        rook_col = 7 if side == 'king_side' else 0
-        col_step = 1 if side == 'king_side' else -1
+        self.make_packed_move(self.encode_move(move))
 
-        # Check if castling rights exist
-        if not self.castling_rights[color][side]:
-            return False
+    def make_packed_move(self, move):
+        """
+        Makes a packed move, as produced by generate_moves or encode_move.
+        Args:
+            move (int): The packed move.
+        """
+        self._make(move)
+        self.move_history.append(move)
 
-        # Check if path between king and rook is clear
-        for col in range(king_col + col_step, rook_col, col_step):
-            if self.board[row][col] != '..':
-                return False
+    def undo_move(self):
+        """
+        Reverts the last move made with make_move, make_packed_move or execute_move, restoring the board,
+        piece lists (in their original order), castling rights, en passant target and turn.
+        """
+        self._unmake()
+        self.move_history.pop()
 
-        # Ensure the king does not pass through or land in check
-        for col in range(king_col, king_col + 3 * col_step, col_step):  # 3 positions to check (current, next, and end)
-            temp_position = (row, col)
-            if self.is_check_on_position(temp_position, color):
-                return False
+    def make_null_move(self):
+        """
+        Passes the turn without moving, for null-move pruning in the search. The en passant right
+        lapses and NULL_MOVE is recorded in move_history. Not allowed while the side to move is in check.
+        """
+        self._null_stack.append((self.ep_square, self.zobrist_key, self._hashed_ep_file))
+        key = self.zobrist_key
+        if self._hashed_ep_file is not None:
+            key ^= EN_PASSANT_KEYS[self._hashed_ep_file]
+        self.ep_square = None
+        self._hashed_ep_file = None
+        self.side ^= 1
+        self.zobrist_key = key ^ SIDE_KEY
+        self.move_history.append(NULL_MOVE)
+        if self.debug_zobrist:
+            self._verify_zobrist_key()
 
-        return True
+    def undo_null_move(self):
+        """
+        Reverts the last make_null_move.
+        """
+        self.ep_square, self.zobrist_key, self._hashed_ep_file = self._null_stack.pop()
+        self.side ^= 1
+        self.move_history.pop()
 
-    def _handle_castling(self, start_pos, end_pos):
-        """
-        Handles castling if the move is a king's castling move.
-        """
-        if abs(start_pos[1] - end_pos[1]) == 2:  # Castling detected
-            if end_pos[1] > start_pos[1]:  # King-side castling
-                rook_start = (start_pos[0], 7)
-                rook_end = (start_pos[0], 5)
-            else:  # Queen-side castling
-                rook_start = (start_pos[0], 0)
-                rook_end = (start_pos[0], 3)
-            piece = self.board[rook_start[0]][rook_start[1]][0] + "R"
-        
-            # Move the rook
-            self.board[rook_end[0]][rook_end[1]] = self.board[rook_start[0]][rook_start[1]]
-            self.board[rook_start[0]][rook_start[1]] = '..'
-
-            # Update the rook position
-            self.piece_positions[piece].remove(rook_start)
-            self.piece_positions[piece].append(rook_end)
-    
-    def _update_castling_rights(self, moving_piece, start_pos):
-        """
-        Updates castling rights if a king or rook has moved.
-        """
-        if moving_piece[1] == 'K':  # King moved
-            self.castling_rights[self.turn]['king_side'] = False
-            self.castling_rights[self.turn]['queen_side'] = False
-        elif moving_piece[1] == 'R':  # Rook moved
-            if start_pos == (0, 0) or start_pos == (7, 0):  # Queen-side rook
-                self.castling_rights[self.turn]['queen_side'] = False
-            elif start_pos == (0, 7) or start_pos == (7, 7):  # King-side rook
-                self.castling_rights[self.turn]['king_side'] = False
-    
-    def _update_en_passant(self, moving_piece, start_pos, end_pos):
-        """
-        Updates the en passant target square after a pawn's double-step move.
-        """
-        if moving_piece[1] == 'P':  # Pawn
-            if abs(end_pos[0] - start_pos[0]) == 2:  # Double-step move
-                self.en_passant_target = ((start_pos[0] + end_pos[0]) // 2, start_pos[1])
-            else:
-                self.en_passant_target = None
+    def _make(self, move):
+        start = SQUARE_88[move & 63]
+        end = SQUARE_88[move >> 6 & 63]
+        flags = move >> 12
+        squares = self.squares
+        piece = squares[start]
+        side = piece // 6
+        key = self.zobrist_key
+        pawn_key = self.pawn_key
+        middlegame = self.middlegame_score
+        endgame = self.endgame_score
+        phase = self.phase
+
+        captured = squares[end]
+        captured_square = end
+        captured_slot = None
+        if flags == EN_PASSANT:
+            captured_square = end - PAWN_PUSH[side]
+            captured = squares[captured_square]
+        if captured != EMPTY:
+            captured_slot = self._remove(captured, captured_square)
+            key ^= PIECE_KEYS_88[captured][captured_square]
+            if captured % 6 == PAWN:
+                pawn_key ^= PIECE_KEYS_88[captured][captured_square]
+            middlegame -= MIDDLEGAME_TABLES_88[captured][captured_square]
+            endgame -= ENDGAME_TABLES_88[captured][captured_square]
+            phase -= PIECE_PHASES[captured]
+
+        moved_slot = None
+        if flags & PROMOTION:
+            moved_slot = self._remove(piece, start)
+            promoted = side * 6 + KNIGHT + (flags & 3)
+            self._add(promoted, end)
+            key ^= PIECE_KEYS_88[piece][start] ^ PIECE_KEYS_88[promoted][end]
+            pawn_key ^= PIECE_KEYS_88[piece][start]
+            middlegame += MIDDLEGAME_TABLES_88[promoted][end] - MIDDLEGAME_TABLES_88[piece][start]
+            endgame += ENDGAME_TABLES_88[promoted][end] - ENDGAME_TABLES_88[piece][start]
+            phase += PIECE_PHASES[promoted]
         else:
-            self.en_passant_target = None
-    
-    def _promote_pawn(self):
+            self._relocate(piece, start, end)
+            key ^= PIECE_KEYS_88[piece][start] ^ PIECE_KEYS_88[piece][end]
+            if piece % 6 == PAWN:
+                pawn_key ^= PIECE_KEYS_88[piece][start] ^ PIECE_KEYS_88[piece][end]
+            middlegame += MIDDLEGAME_TABLES_88[piece][end] - MIDDLEGAME_TABLES_88[piece][start]
+            endgame += ENDGAME_TABLES_88[piece][end] - ENDGAME_TABLES_88[piece][start]
+            if flags == KING_CASTLE or flags == QUEEN_CASTLE:
+                rook_start, rook_end = CASTLING_ROOK_MOVES[(start, end)]
+                rook = squares[rook_start]
+                self._relocate(rook, rook_start, rook_end)
+                key ^= PIECE_KEYS_88[rook][rook_start] ^ PIECE_KEYS_88[rook][rook_end]
+                middlegame += MIDDLEGAME_TABLES_88[rook][rook_end] - MIDDLEGAME_TABLES_88[rook][rook_start]
+                endgame += ENDGAME_TABLES_88[rook][rook_end] - ENDGAME_TABLES_88[rook][rook_start]
+
+        self._undo_stack.append((start, end, flags, piece, captured, captured_square, captured_slot, moved_slot,
+                                 self.castling, self.ep_square, self.zobrist_key, self._hashed_ep_file,
+                                 self.middlegame_score, self.endgame_score, self.phase, self.pawn_key))
+        if self.accumulator is not None:
+            self.accumulator.push(move, piece, None if captured == EMPTY or flags == EN_PASSANT else captured)
+        self.pawn_key = pawn_key
+        self.middlegame_score = middlegame
+        self.endgame_score = endgame
+        self.phase = phase
+        key ^= CASTLING_KEYS[self.castling]
+        self.castling &= CASTLING_MASK[start] & CASTLING_MASK[end]
+        key ^= CASTLING_KEYS[self.castling]
+        self.ep_square = (start + end) // 2 if flags == DOUBLE_PAWN_PUSH else None
+        self.side ^= 1
+
+        if self._hashed_ep_file is not None:
+            key ^= EN_PASSANT_KEYS[self._hashed_ep_file]
+        self._hashed_ep_file = self._ep_hash_file()
+        if self._hashed_ep_file is not None:
+            key ^= EN_PASSANT_KEYS[self._hashed_ep_file]
+        self.zobrist_key = key ^ SIDE_KEY
+        if self.debug_zobrist:
+            self._verify_zobrist_key()
+        if self.debug_evaluation:
+            self._verify_evaluation()
+
+    def _unmake(self):
+        (start, end, flags, piece, captured, captured_square, captured_slot, moved_slot,
+         castling, ep_square, key, hashed_ep_file, middlegame, endgame, phase, pawn_key) = self._undo_stack.pop()
+        if self.accumulator is not None:
+            self.accumulator.pop()
+        # Undo the steps of _make in reverse order, so every piece list slot is restored exactly
+        if flags & PROMOTION:
+            self._remove(self.squares[end], end)  # The promoted piece was appended last
+            self._restore(piece, start, moved_slot)
+        else:
+            if flags == KING_CASTLE or flags == QUEEN_CASTLE:
+                rook_start, rook_end = CASTLING_ROOK_MOVES[(start, end)]
+                self._relocate(self.squares[rook_end], rook_end, rook_start)
+            self._relocate(piece, end, start)
+        if captured_slot is not None:
+            self._restore(captured, captured_square, captured_slot)
+        self.castling = castling
+        self.ep_square = ep_square
+        self.side ^= 1
+        self.zobrist_key = key
+        self._hashed_ep_file = hashed_ep_file
+        self.pawn_key = pawn_key
+        self.middlegame_score = middlegame
+        self.endgame_score = endgame
+        self.phase = phase
+        if self.debug_zobrist:
+            self._verify_zobrist_key()
+        if self.debug_evaluation:
+            self._verify_evaluation()
+
+    # Evaluation
+
+    def evaluate(self):
         """
-        Prompts the player to select a piece for pawn promotion.
+        Evaluates the position from its running piece-square totals, without looking at the pieces.
         Returns:
-            str: The chosen piece (e.g., 'wQ' for a white queen).
+            int: The tapered score in centipawns, positive when white is better (see evaluation.py).
+        """
+        return tapered_score(self.middlegame_score, self.endgame_score, self.phase)
+
+    def compute_evaluation_terms(self):
+        """
+        Computes the running evaluation totals from scratch.
+        Returns:
+            tuple: (middlegame, endgame, phase), as kept in middlegame_score, endgame_score and phase.
+        """
+        return evaluation_terms((piece, SQUARE_64[square])
+                                for piece, squares in enumerate(self.piece_squares) for square in squares)
+
+    def _verify_evaluation(self):
         """
-        # For simplicity in the code, default to a queen
-        return f'{self.turn[0]}Q'  # Example: 'wQ' for white
-    
+        Raises RuntimeError if the incrementally updated evaluation totals differ from a full recompute.
+        """
+        expected = self.compute_evaluation_terms()
+        if (self.middlegame_score, self.endgame_score, self.phase) != expected:
+            raise RuntimeError(f"Evaluation out of sync: {(self.middlegame_score, self.endgame_score, self.phase)} "
+                               f"!= {expected} after {[decode_move(move) for move in self.move_history]}")
+
+    # Position key
+
+    def _ep_hash_file(self):
+        """
+        Returns:
+            int: The en passant file to include in the key, or None. The file only counts when the
+            side to move has a pawn that could capture en passant, so transpositions hash alike.
+        """
+        if self.ep_square is None:
+            return None
+        pawn = self.side * 6 + PAWN
+        for offset in PAWN_CAPTURE_OFFSETS[self.side ^ 1]:
+            square = self.ep_square + offset
+            if not square & 0x88 and self.squares[square] == pawn:
+                return self.ep_square & 7
+        return None
+
+    def compute_zobrist_key(self):
+        """
+        Computes the position's Zobrist key from scratch.
+        Returns:
+            int: The 64-bit key.
+        """
+        pieces = ((PIECE_NAMES[piece], SQUARE_64[square])
+                  for piece, squares in enumerate(self.piece_squares) for square in squares)
+        return compute_key(pieces, self.turn, self.castling, self._ep_hash_file())
+
+    def compute_pawn_key(self):
+        """
+        Computes the position's pawn key from scratch.
+        Returns:
+            int: The 64-bit key of the pawns alone.
+        """
+        return compute_pawn_key((PIECE_NAMES[piece], SQUARE_64[square])
+                                for piece in (PAWN, 6 + PAWN) for square in self.piece_squares[piece])
+
+    def _verify_zobrist_key(self):
+        """
+        Raises RuntimeError if the incrementally updated keys differ from a full recompute.
+        """
+        expected = self.compute_zobrist_key()
+        if self.zobrist_key != expected:
+            raise RuntimeError(f"Zobrist key out of sync: {self.zobrist_key:#018x} != {expected:#018x} "
+                               f"after {[decode_move(move) for move in self.move_history]}")
+        expected = self.compute_pawn_key()
+        if self.pawn_key != expected:
+            raise RuntimeError(f"Pawn key out of sync: {self.pawn_key:#018x} != {expected:#018x} "
+                               f"after {[decode_move(move) for move in self.move_history]}")
+
 # # Testing
 # import pprint
 
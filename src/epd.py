@@ -0,0 +1,133 @@
+# epd.py
+#
+# Extended Position Description files: one position per line, the first four FEN fields followed
+# by semicolon-terminated operations, e.g.
+#
+#   r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - bm Qxf7#; id "mate.001";
+#
+# read_epd streams a file line by line and builds each board straight from the parsed fields,
+# so memory use does not grow with the file and no intermediate grid is built.
+
+import re
+
+from backends import create_board
+
+_OPCODE = re.compile(r'\s*([A-Za-z][\w+-]*)')
+# An operand is a quoted string (which may contain spaces and semicolons) or a bare token
+_OPERAND = re.compile(r'"([^"]*)"|([^\s;]+)')
+_SAN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+
+def parse_epd(line):
+    """
+    Parses one EPD record.
+    Args:
+        line (str): The record, e.g. '8/8/8/8/8/8/8/K1k5 w - - bm Ka2; id "test";'.
+    Returns:
+        dict: 'fen' (a complete FEN, taking the move counters from the hmvc and fmvn operations when
+        present) and 'operations' (maps each opcode to its list of operands, quotes removed).
+    Raises:
+        ValueError: If the record has fewer than four position fields, an unterminated string, or an
+            hmvc or fmvn operation without exactly one move count.
+    """
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"Invalid EPD (expected at least 4 fields): {line!r}")
+    operations = {}
+    rest = fields[4] if len(fields) > 4 else ''
+    position = 0
+    while position < len(rest):
+        match = _OPCODE.match(rest, position)
+        if not match:
+            break
+        opcode = match.group(1)
+        position = match.end()
+        operands = []
+        while True:
+            while position < len(rest) and rest[position].isspace():
+                position += 1
+            if position >= len(rest) or rest[position] == ';':
+                position += 1
+                break
+            if rest[position] == '"' and rest.find('"', position + 1) < 0:
+                raise ValueError(f"Invalid EPD (unterminated string): {line!r}")
+            operand = _OPERAND.match(rest, position)
+            operands.append(operand.group(1) if operand.group(1) is not None else operand.group(2))
+            position = operand.end()
+        operations[opcode] = operands
+
+    for opcode in ('hmvc', 'fmvn'):
+        operands = operations.get(opcode)
+        if operands is not None and (len(operands) != 1 or not operands[0].isdigit()):
+            raise ValueError(f"Invalid EPD ({opcode} needs one move count): {line!r}")
+    halfmove_clock = operations.get('hmvc', ['0'])[0]
+    fullmove_number = operations.get('fmvn', ['1'])[0]
+    return {'fen': ' '.join(fields[:4] + [halfmove_clock, fullmove_number]), 'operations': operations}
+
+
+def read_epd(source, backend='mailbox'):
+    """
+    Streams the positions of an EPD file. Blank lines and lines starting with '#' are skipped.
+    Args:
+        source (str or iterable): A path, or an open file or other iterable of lines.
+        backend (str): Name of the board backend to build the positions on.
+    Yields:
+        tuple: (board, operations) for each record, operations as returned by parse_epd.
+    Raises:
+        ValueError: If a record is malformed; the message gives its line number.
+    """
+    if isinstance(source, str):
+        with open(source) as lines:
+            yield from read_epd(lines, backend)
+        return
+    for number, line in enumerate(source, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            record = parse_epd(line)
+            board = create_board(backend, record['fen'])
+        except ValueError as error:
+            raise ValueError(f"line {number}: {error}") from None
+        yield board, record['operations']
+
+
+def parse_san(board, san):
+    """
+    Finds the legal move written in Standard Algebraic Notation, as used by the bm and am operations.
+    Args:
+        board (ChessBoard or BitboardChessBoard): The position the move is played in.
+        san (str): The move, e.g. 'e4', 'Nbd7', 'exd5', 'O-O', 'e8=Q+' or 'Qxf7#'.
+    Returns:
+        tuple: The move in the public format ((start_row, start_col), (end_row, end_col)), with the
+        piece type appended for under-promotions.
+    Raises:
+        ValueError: If no legal move or more than one matches.
+    """
+    text = san.rstrip('+#!?')
+    candidates = [move for moves in board.legal_move_index().values() for move in moves]
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        king = board.king_positions[0 if board.turn == 'white' else 1]
+        end_col = 6 if len(text) == 3 else 2
+        matches = [move for move in candidates if move[0] == king and move[1] == (king[0], end_col)
+                   and abs(king[1] - end_col) == 2]
+    else:
+        match = _SAN.match(text)
+        if not match:
+            raise ValueError(f"Invalid SAN move: {san!r}")
+        piece_type, from_file, from_rank, target, promotion = match.groups()
+        end = (8 - int(target[1]), ord(target[0]) - ord('a'))
+        piece = board.turn[0] + (piece_type or 'P')
+        matches = []
+        for move in candidates:
+            start = move[0]
+            if (move[1] != end or board.piece_at(start) != piece
+                    or (from_file and start[1] != ord(from_file) - ord('a'))
+                    or (from_rank and start[0] != 8 - int(from_rank))):
+                continue
+            if (move[2] if len(move) > 2 else 'Q' if end[0] in (0, 7) and piece[1] == 'P' else None) != promotion:
+                continue
+            matches.append(move)
+    if len(matches) != 1:
+        raise ValueError(f"{'Ambiguous' if matches else 'Illegal'} SAN move {san!r} in {board.to_fen()}")
+    return matches[0]
@@ -0,0 +1,206 @@
+# epd_suite.py
+#
+# Tactical test-suite runner. Streams an EPD file, searches every position with ChessAI under a
+# time or node budget and checks the chosen move against the record's bm (best move) and
+# am (avoid move) operations. ChessAI deepens its search one ply at a time within the budget, and
+# the iteration at which it settled on its final move gives the time to solution.
+#
+# Usage:
+#   python epd_suite.py wac.epd --time 2                  two seconds per position
+#   python epd_suite.py wac.epd --nodes 50000 --workers 4  node budget, four processes
+#   python epd_suite.py wac.epd --json report.json        write the per-position results
+#   python epd_suite.py wac.epd --disable lmr             measure a search feature by switching it off
+#   python epd_suite.py wac.epd --search-workers 8        search each position with eight processes
+#   python epd_suite.py wac.epd --network weights.nnue    evaluate with an NNUE network
+
+import argparse
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from backends import BACKENDS, create_board
+from chess_ai import SEARCH_FEATURES, ChessAI
+from epd import parse_san, read_epd
+from moves import decode_move
+from perft import build_report, format_move
+
+
+def solve_position(fen, operations, backend='mailbox', max_time=1.0, max_nodes=None, max_depth=5,
+                   features=SEARCH_FEATURES, search_workers=1, network=None):
+    """
+    Searches one position with ChessAI under a time or node budget.
+    Args:
+        fen (str): The position.
+        operations (dict): Its EPD operations; 'bm' and 'am' decide whether it is solved.
+        backend (str): Name of the board backend.
+        max_time (float): Seconds per position, or None for no limit.
+        max_nodes (int): Nodes per position, or None for no limit.
+        max_depth (int): The deepest search to run.
+        features (iterable): The search features to use (see chess_ai.SEARCH_FEATURES).
+        search_workers (int): Processes to search the position with (see parallel_search.py).
+        network (str): Path of an NNUE weight file to evaluate with, or None (see nnue.py).
+    Returns:
+        dict: 'id', 'fen', 'move' (coordinate notation, None if there is no legal move), 'solved'
+        (None when the record has neither bm nor am), 'time_to_solution' (seconds until the move that
+        was finally chosen was first found, if it is correct), 'nodes', 'depth', 'seconds',
+        'first_move_cutoff_rate' (see MoveOrdering.statistics) and 'pawn_hash_hit_rate' (see
+        PawnHashTable.statistics; 0.0 with a network).
+    """
+    board = create_board(backend, fen)
+    best_moves = [parse_san(board, san) for san in operations.get('bm', [])]
+    avoid_moves = [parse_san(board, san) for san in operations.get('am', [])]
+    checked = bool(best_moves or avoid_moves)
+
+    ai = ChessAI('hard', depth=max_depth, move_time=max_time, max_nodes=max_nodes, features=features,
+                 workers=search_workers, network=network)
+    try:
+        start = time.perf_counter()
+        move = ai.choose_move(board)
+        seconds = time.perf_counter() - start
+    finally:
+        ai.close()
+
+    solved_at = None
+    for iteration in ai.iterations:
+        found = decode_move(iteration['move']) if iteration['move'] is not None else None
+        if found is None or (best_moves and found not in best_moves) or found in avoid_moves:
+            solved_at = None
+        elif solved_at is None:
+            solved_at = iteration['seconds']
+
+    return {
+        'id': operations.get('id', [None])[0],
+        'fen': fen,
+        'best_moves': [format_move(best) for best in best_moves],
+        'avoid_moves': [format_move(avoid) for avoid in avoid_moves],
+        'move': format_move(move) if move is not None else None,
+        'solved': solved_at is not None if checked else None,
+        'time_to_solution': solved_at if checked else None,
+        'nodes': ai.nodes,
+        'depth': ai.iterations[-1]['depth'] if ai.iterations else 0,
+        'seconds': seconds,
+        'first_move_cutoff_rate': ai.ordering.statistics()['first_move_cutoff_rate'],
+        'pawn_hash_hit_rate': ai.evaluator.pawn_table.statistics()['hit_rate'] if network is None else 0.0,
+    }
+
+
+def run_suite(source, backend='mailbox', max_time=1.0, max_nodes=None, max_depth=5, workers=1, report=print,
+              features=SEARCH_FEATURES, search_workers=1, network=None):
+    """
+    Runs every position of an EPD file, yielding results in file order as they complete.
+    Args:
+        source (str or iterable): EPD path, or an iterable of EPD lines.
+        backend (str): Name of the board backend.
+        max_time (float): Per-position time budget in seconds, or None.
+        max_nodes (int): Per-position node budget, or None.
+        max_depth (int): The deepest search to run.
+        workers (int): Number of processes; 1 searches in this process. Only a few positions per
+            worker are queued at once, so large files are never loaded whole.
+        report (callable): Called with one formatted line per position, or None for silence.
+        features (iterable): The search features to use (see chess_ai.SEARCH_FEATURES).
+        search_workers (int): Processes to search each position with; positions are still run
+            workers at a time.
+        network (str): Path of an NNUE weight file to evaluate with, or None (see nnue.py).
+    Yields:
+        dict: One result per position, as returned by solve_position.
+    """
+    features = frozenset(features)
+    tasks = ((board.to_fen(), operations, backend, max_time, max_nodes, max_depth, features, search_workers,
+              network)
+             for board, operations in read_epd(source, backend))
+    for number, result in enumerate(_solve_all(tasks, workers), 1):
+        if report:
+            status = {True: 'solved', False: 'FAILED', None: '-'}[result['solved']]
+            found = f" in {result['time_to_solution']:.2f}s" if result['solved'] else ''
+            report(f"{number:>4} {result['id'] or '':<12} {result['move'] or '(none)':<6} {status}{found:<10} "
+                   f"depth {result['depth']} {result['nodes']:>9} nodes {result['seconds']:7.2f}s")
+        yield result
+
+
+def _solve_all(tasks, workers):
+    if workers <= 1:
+        for task in tasks:
+            yield solve_position(*task)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(solve_position, *task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def summarize(results):
+    """
+    Returns:
+        dict: Totals over a suite run: 'positions', 'solved', 'failed', 'unchecked' (records without
+        bm or am), 'mean_time_to_solution', 'nodes', 'seconds', 'nodes_per_second' and the means of
+        'first_move_cutoff_rate' and 'pawn_hash_hit_rate'.
+    """
+    solved = [result for result in results if result['solved']]
+    nodes = sum(result['nodes'] for result in results)
+    seconds = sum(result['seconds'] for result in results)
+    return {
+        'positions': len(results),
+        'solved': len(solved),
+        'failed': sum(1 for result in results if result['solved'] is False),
+        'unchecked': sum(1 for result in results if result['solved'] is None),
+        'mean_time_to_solution': (sum(result['time_to_solution'] for result in solved) / len(solved)
+                                  if solved else None),
+        'nodes': nodes,
+        'seconds': seconds,
+        'nodes_per_second': nodes / seconds if seconds > 0 else 0.0,
+        'first_move_cutoff_rate': (sum(result['first_move_cutoff_rate'] for result in results) / len(results)
+                                   if results else 0.0),
+        'pawn_hash_hit_rate': (sum(result['pawn_hash_hit_rate'] for result in results) / len(results)
+                               if results else 0.0),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run ChessAI over an EPD test suite.")
+    parser.add_argument('epd', help="EPD file with bm/am operations")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='mailbox', help="board backend")
+    parser.add_argument('--time', type=float, help="seconds per position (default: 1.0 unless --nodes is given)")
+    parser.add_argument('--nodes', type=int, help="nodes per position (default: no limit)")
+    parser.add_argument('--max-depth', type=int, default=5, help="deepest search (default: 5)")
+    parser.add_argument('--workers', type=int, default=1, help="positions searched at once (default: 1)")
+    parser.add_argument('--search-workers', type=int, default=1,
+                        help="processes searching each position, see parallel_search.py (default: 1)")
+    parser.add_argument('--network', metavar='PATH', help="NNUE weight file to evaluate with, see nnue.py")
+    parser.add_argument('--json', metavar='PATH', help="write a JSON report with one entry per position")
+    parser.add_argument('--disable', action='append', default=[], choices=sorted(SEARCH_FEATURES), metavar='FEATURE',
+                        help=f"switch off a search feature, repeatable ({', '.join(sorted(SEARCH_FEATURES))})")
+    args = parser.parse_args(argv)
+    if args.time is None and args.nodes is None:
+        args.time = 1.0
+    features = SEARCH_FEATURES - set(args.disable)
+
+    results = list(run_suite(args.epd, args.backend, args.time, args.nodes, args.max_depth, args.workers,
+                             features=features, search_workers=args.search_workers, network=args.network))
+    summary = summarize(results)
+    checked = summary['solved'] + summary['failed']
+    print(f"Solved {summary['solved']} of {checked}"
+          + (f", mean time to solution {summary['mean_time_to_solution']:.2f}s" if summary['solved'] else '')
+          + f"; {summary['nodes']} nodes in {summary['seconds']:.1f}s ({summary['nodes_per_second']:.0f} nps)"
+          + f"; first-move cutoffs {summary['first_move_cutoff_rate']:.1%}"
+          + f"; pawn hash hits {summary['pawn_hash_hit_rate']:.1%}")
+
+    if args.json:
+        report = build_report(results)
+        report['summary'] = summary
+        report['settings'] = {'backend': args.backend, 'time': args.time, 'nodes': args.nodes,
+                              'max_depth': args.max_depth, 'workers': args.workers,
+                              'search_workers': args.search_workers, 'features': sorted(features),
+                              'network': args.network}
+        with open(args.json, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
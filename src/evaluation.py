@@ -0,0 +1,393 @@
+# evaluation.py
+#
+# Tapered piece-square evaluation, in centipawns from white's point of view. Every piece has a
+# middlegame and an endgame value that depend on its square; the two totals are blended by the game
+# phase, which falls from MAX_PHASE with all minor and major pieces on the board to 0 with none:
+#
+#   score = (middlegame * phase + endgame * (MAX_PHASE - phase)) / MAX_PHASE
+#
+# The values are the PeSTO tables. Boards keep the middlegame and endgame totals and the phase as
+# running sums, updated by every move they make and restored by undo, so evaluating a position
+# does not look at its pieces at all.
+#
+# Evaluator adds pawn structure on top: doubled, isolated, backward and passed pawns, the pawn
+# shield in front of each king, and how close the kings are to the passed pawns. Everything that
+# depends on the pawns alone is cached in a PawnHashTable under the boards' pawn key, since the
+# same pawn configuration comes up across most of a search tree.
+
+from array import array
+
+from attack_tables import PAWN_ATTACKS, RAYS, NORTH, SOUTH
+
+# Piece values by piece type, used by static exchange evaluation; knight and bishop are equal so
+# that trading one for the other is not counted as losing material
+SEE_VALUES = (100, 300, 300, 500, 900, 10000)
+
+MIDDLEGAME_VALUES = (82, 337, 365, 477, 1025, 0)
+ENDGAME_VALUES = (94, 281, 297, 512, 936, 0)
+# Phase contributed by each piece type
+PHASE_VALUES = (0, 1, 1, 2, 4, 0)
+MAX_PHASE = 24
+
+# Square bonuses for white, squares numbered row * 8 + col from a8; black uses the mirrored square
+_MIDDLEGAME_SQUARES = (
+    (   0,    0,    0,    0,    0,    0,    0,    0,
+       98,  134,   61,   95,   68,  126,   34,  -11,
+       -6,    7,   26,   31,   65,   56,   25,  -20,
+      -14,   13,    6,   21,   23,   12,   17,  -23,
+      -27,   -2,   -5,   12,   17,    6,   10,  -25,
+      -26,   -4,   -4,  -10,    3,    3,   33,  -12,
+      -35,   -1,  -20,  -23,  -15,   24,   38,  -22,
+        0,    0,    0,    0,    0,    0,    0,    0),
+    (-167,  -89,  -34,  -49,   61,  -97,  -15, -107,
+      -73,  -41,   72,   36,   23,   62,    7,  -17,
+      -47,   60,   37,   65,   84,  129,   73,   44,
+       -9,   17,   19,   53,   37,   69,   18,   22,
+      -13,    4,   16,   13,   28,   19,   21,   -8,
+      -23,   -9,   12,   10,   19,   17,   25,  -16,
+      -29,  -53,  -12,   -3,   -1,   18,  -14,  -19,
+     -105,  -21,  -58,  -33,  -17,  -28,  -19,  -23),
+    ( -29,    4,  -82,  -37,  -25,  -42,    7,   -8,
+      -26,   16,  -18,  -13,   30,   59,   18,  -47,
+      -16,   37,   43,   40,   35,   50,   37,   -2,
+       -4,    5,   19,   50,   37,   37,    7,   -2,
+       -6,   13,   13,   26,   34,   12,   10,    4,
+        0,   15,   15,   15,   14,   27,   18,   10,
+        4,   15,   16,    0,    7,   21,   33,    1,
+      -33,   -3,  -14,  -21,  -13,  -12,  -39,  -21),
+    (  32,   42,   32,   51,   63,    9,   31,   43,
+       27,   32,   58,   62,   80,   67,   26,   44,
+       -5,   19,   26,   36,   17,   45,   61,   16,
+      -24,  -11,    7,   26,   24,   35,   -8,  -20,
+      -36,  -26,  -12,   -1,    9,   -7,    6,  -23,
+      -45,  -25,  -16,  -17,    3,    0,   -5,  -33,
+      -44,  -16,  -20,   -9,   -1,   11,   -6,  -71,
+      -19,  -13,    1,   17,   16,    7,  -37,  -26),
+    ( -28,    0,   29,   12,   59,   44,   43,   45,
+      -24,  -39,   -5,    1,  -16,   57,   28,   54,
+      -13,  -17,    7,    8,   29,   56,   47,   57,
+      -27,  -27,  -16,  -16,   -1,   17,   -2,    1,
+       -9,  -26,   -9,  -10,   -2,   -4,    3,   -3,
+      -14,    2,  -11,   -2,   -5,    2,   14,    5,
+      -35,   -8,   11,    2,    8,   15,   -3,    1,
+       -1,  -18,   -9,   10,  -15,  -25,  -31,  -50),
+    ( -65,   23,   16,  -15,  -56,  -34,    2,   13,
+       29,   -1,  -20,   -7,   -8,   -4,  -38,  -29,
+       -9,   24,    2,  -16,  -20,    6,   22,  -22,
+      -17,  -20,  -12,  -27,  -30,  -25,  -14,  -36,
+      -49,   -1,  -27,  -39,  -46,  -44,  -33,  -51,
+      -14,  -14,  -22,  -46,  -44,  -30,  -15,  -27,
+        1,    7,   -8,  -64,  -43,  -16,    9,    8,
+      -15,   36,   12,  -54,    8,  -28,   24,   14),
+)
+_ENDGAME_SQUARES = (
+    (   0,    0,    0,    0,    0,    0,    0,    0,
+      178,  173,  158,  134,  147,  132,  165,  187,
+       94,  100,   85,   67,   56,   53,   82,   84,
+       32,   24,   13,    5,   -2,    4,   17,   17,
+       13,    9,   -3,   -7,   -7,   -8,    3,   -1,
+        4,    7,   -6,    1,    0,   -5,   -1,   -8,
+       13,    8,    8,   10,   13,    0,    2,   -7,
+        0,    0,    0,    0,    0,    0,    0,    0),
+    ( -58,  -38,  -13,  -28,  -31,  -27,  -63,  -99,
+      -25,   -8,  -25,   -2,   -9,  -25,  -24,  -52,
+      -24,  -20,   10,    9,   -1,   -9,  -19,  -41,
+      -17,    3,   22,   22,   22,   11,    8,  -18,
+      -18,   -6,   16,   25,   16,   17,    4,  -18,
+      -23,   -3,   -1,   15,   10,   -3,  -20,  -22,
+      -42,  -20,  -10,   -5,   -2,  -20,  -23,  -44,
+      -29,  -51,  -23,  -15,  -22,  -18,  -50,  -64),
+    ( -14,  -21,  -11,   -8,   -7,   -9,  -17,  -24,
+       -8,   -4,    7,  -12,   -3,  -13,   -4,  -14,
+        2,   -8,    0,   -1,   -2,    6,    0,    4,
+       -3,    9,   12,    9,   14,   10,    3,    2,
+       -6,    3,   13,   19,    7,   10,   -3,   -9,
+      -12,   -3,    8,   10,   13,    3,   -7,  -15,
+      -14,  -18,   -7,   -1,    4,   -9,  -15,  -27,
+      -23,   -9,  -23,   -5,   -9,  -16,   -5,  -17),
+    (  13,   10,   18,   15,   12,   12,    8,    5,
+       11,   13,   13,   11,   -3,    3,    8,    3,
+        7,    7,    7,    5,    4,   -3,   -5,   -3,
+        4,    3,   13,    1,    2,    1,   -1,    2,
+        3,    5,    8,    4,   -5,   -6,   -8,  -11,
+       -4,    0,   -5,   -1,   -7,  -12,   -8,  -16,
+       -6,   -6,    0,    2,   -9,   -9,  -11,   -3,
+       -9,    2,    3,   -1,   -5,  -13,    4,  -20),
+    (  -9,   22,   22,   27,   27,   19,   10,   20,
+      -17,   20,   32,   41,   58,   25,   30,    0,
+      -20,    6,    9,   49,   47,   35,   19,    9,
+        3,   22,   24,   45,   57,   40,   57,   36,
+      -18,   28,   19,   47,   31,   34,   39,   23,
+      -16,  -27,   15,    6,    9,   17,   10,    5,
+      -22,  -23,  -30,  -16,  -16,  -23,  -36,  -32,
+      -33,  -28,  -22,  -43,   -5,  -32,  -20,  -41),
+    ( -74,  -35,  -18,  -18,  -11,   15,    4,  -17,
+      -12,   17,   14,   17,   17,   38,   23,   11,
+       10,   17,   23,   15,   20,   45,   44,   13,
+       -8,   22,   24,   27,   26,   33,   26,    3,
+      -18,   -4,   21,   24,   27,   23,    9,  -11,
+      -19,   -3,   11,   21,   23,   16,    7,   -9,
+      -27,  -11,    4,   13,   14,    4,   -5,  -17,
+      -53,  -34,  -21,  -11,  -28,  -14,  -24,  -43),
+)
+
+
+def _signed_tables(values, squares):
+    """
+    Folds piece values into the square tables, indexed [piece][square] with pieces numbered as in
+    zobrist.PIECE_NAMES, black's entries mirrored vertically and negated.
+    """
+    white = [[values[piece_type] + squares[piece_type][square] for square in range(64)] for piece_type in range(6)]
+    black = [[-white[piece_type][square ^ 56] for square in range(64)] for piece_type in range(6)]
+    return white + black
+
+
+# MIDDLEGAME_TABLES[piece][square] and ENDGAME_TABLES[piece][square]: what a piece on a square adds to
+# each total, squares numbered row * 8 + col
+MIDDLEGAME_TABLES = _signed_tables(MIDDLEGAME_VALUES, _MIDDLEGAME_SQUARES)
+ENDGAME_TABLES = _signed_tables(ENDGAME_VALUES, _ENDGAME_SQUARES)
+PIECE_PHASES = PHASE_VALUES * 2  # Phase by piece, as numbered in zobrist.PIECE_NAMES
+
+
+def evaluation_terms(pieces):
+    """
+    Computes the running evaluation totals of a position from scratch.
+    Args:
+        pieces (iterable): (piece, square) pairs for every piece on the board, pieces numbered as in
+            zobrist.PIECE_NAMES and squares row * 8 + col.
+    Returns:
+        tuple: (middlegame, endgame, phase) totals.
+    """
+    middlegame = endgame = phase = 0
+    for piece, square in pieces:
+        middlegame += MIDDLEGAME_TABLES[piece][square]
+        endgame += ENDGAME_TABLES[piece][square]
+        phase += PIECE_PHASES[piece]
+    return middlegame, endgame, phase
+
+
+def tapered_score(middlegame, endgame, phase):
+    """
+    Blends the middlegame and endgame totals by the game phase.
+    Returns:
+        int: The score in centipawns, positive when white is better.
+    """
+    phase = min(phase, MAX_PHASE)  # Promotions can take it past the starting phase
+    total = middlegame * phase + endgame * (MAX_PHASE - phase)
+    # Round towards zero, so that swapping the colors exactly negates the score
+    return total // MAX_PHASE if total >= 0 else -(-total // MAX_PHASE)
+
+
+# Pawn structure terms, as (middlegame, endgame) centipawns per pawn
+DOUBLED_PAWN = (-10, -20)   # For every pawn beyond the first on a file
+ISOLATED_PAWN = (-15, -20)  # No own pawn on either adjacent file
+BACKWARD_PAWN = (-10, -15)  # Cannot be supported, and its stop square is attacked by an enemy pawn
+# Bonus for a passed pawn (no enemy pawn ahead on its own or adjacent files) by ranks advanced
+PASSED_PAWN_MIDDLEGAME = (0, 5, 10, 15, 25, 40, 60, 0)
+PASSED_PAWN_ENDGAME = (0, 10, 15, 25, 45, 70, 110, 0)
+# Endgame bonus per square the enemy king is further than the own king from a passed pawn's stop square
+PASSED_PAWN_KING_DISTANCE = 5
+# Middlegame bonus per own pawn one and two ranks in front of a king on its first two ranks
+PAWN_SHIELD = (12, 6)
+
+PAWN_HASH_ENTRIES = 1 << 14
+
+FILE_MASKS = [sum(1 << (row * 8 + col) for row in range(8)) for col in range(8)]
+ADJACENT_FILE_MASKS = [(FILE_MASKS[col - 1] if col > 0 else 0) | (FILE_MASKS[col + 1] if col < 7 else 0)
+                       for col in range(8)]
+_FORWARD = (NORTH, SOUTH)  # White pawns move towards row 0
+
+
+def _passed_pawn_mask(color, square):
+    forward = RAYS[_FORWARD[color]]
+    col = square & 7
+    return (forward[square] | (forward[square - 1] if col > 0 else 0)
+            | (forward[square + 1] if col < 7 else 0))
+
+
+def _support_mask(color, square):
+    # Adjacent-file squares level with the pawn or behind it, from where own pawns could defend it
+    row = square >> 3
+    rows = range(row, 8) if color == 0 else range(0, row + 1)
+    return sum(1 << (other * 8 + col) for other in rows for col in range(8)) & ADJACENT_FILE_MASKS[square & 7]
+
+
+def _shield_masks(color, square):
+    # Squares one and two rows in front of a king on its first two ranks, on its own and adjacent files
+    row, col = square >> 3, square & 7
+    if (row < 6) if color == 0 else (row > 1):
+        return 0, 0
+    step = -1 if color == 0 else 1
+    files = FILE_MASKS[col] | ADJACENT_FILE_MASKS[col]
+    return tuple(sum(1 << ((row + step * distance) * 8 + other) for other in range(8)) & files
+                 for distance in (1, 2))
+
+
+PASSED_PAWN_MASKS = [[_passed_pawn_mask(color, square) for square in range(64)] for color in range(2)]
+SUPPORT_MASKS = [[_support_mask(color, square) for square in range(64)] for color in range(2)]
+SHIELD_MASKS = [[_shield_masks(color, square) for square in range(64)] for color in range(2)]
+DISTANCE = [[max(abs((a >> 3) - (b >> 3)), abs((a & 7) - (b & 7))) for b in range(64)] for a in range(64)]
+
+
+def pawn_structure(white_pawns, black_pawns):
+    """
+    Scores the pawn structure terms that depend on the pawns alone.
+    Args:
+        white_pawns (int): White pawns as a 64-bit mask, bit row * 8 + col.
+        black_pawns (int): Black pawns, the same way.
+    Returns:
+        tuple: (middlegame, endgame, white passed pawns, black passed pawns), the scores in centipawns
+        from white's point of view and the passed pawns as masks.
+    """
+    middlegame = endgame = 0
+    pawns = (white_pawns, black_pawns)
+    passed = [0, 0]
+    for color in (0, 1):
+        own, enemy = pawns[color], pawns[color ^ 1]
+        sign = 1 - 2 * color
+        for col in range(8):
+            count = bin(own & FILE_MASKS[col]).count('1')
+            if count > 1:
+                middlegame += sign * DOUBLED_PAWN[0] * (count - 1)
+                endgame += sign * DOUBLED_PAWN[1] * (count - 1)
+        remaining = own
+        while remaining:
+            bit = remaining & -remaining
+            remaining ^= bit
+            square = bit.bit_length() - 1
+            if not own & ADJACENT_FILE_MASKS[square & 7]:
+                middlegame += sign * ISOLATED_PAWN[0]
+                endgame += sign * ISOLATED_PAWN[1]
+            elif (not own & SUPPORT_MASKS[color][square]
+                  and PAWN_ATTACKS[color][square - 8 if color == 0 else square + 8] & enemy):
+                middlegame += sign * BACKWARD_PAWN[0]
+                endgame += sign * BACKWARD_PAWN[1]
+            if not enemy & PASSED_PAWN_MASKS[color][square]:
+                passed[color] |= bit
+                advanced = 7 - (square >> 3) if color == 0 else square >> 3
+                middlegame += sign * PASSED_PAWN_MIDDLEGAME[advanced]
+                endgame += sign * PASSED_PAWN_ENDGAME[advanced]
+    return middlegame, endgame, passed[0], passed[1]
+
+
+class PawnHashTable:
+    def __init__(self, entries=PAWN_HASH_ENTRIES):
+        """
+        Fixed-size cache of pawn structure results, keyed by the boards' pawn key. A new entry
+        replaces whatever shares its slot.
+        Args:
+            entries (int): Number of slots, rounded down to a power of two.
+        """
+        size = 1
+        while size * 2 <= entries:
+            size *= 2
+        self.mask = size - 1
+        self.keys = array('Q', bytes(size * 8))
+        self.entries = [None] * size
+        self.probes = 0  # Lookups since the table was created or cleared
+        self.hits = 0    # Lookups that found their pawn structure
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        """
+        Empties the table.
+        """
+        self.keys = array('Q', bytes(len(self.entries) * 8))
+        self.entries = [None] * len(self.entries)
+        self.probes = self.hits = 0
+
+    def probe(self, key):
+        """
+        Returns:
+            tuple: The entry stored for the pawn key, or None.
+        """
+        self.probes += 1
+        slot = key & self.mask
+        entry = self.entries[slot]
+        if entry is None or self.keys[slot] != key:
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, entry):
+        """
+        Stores the pawn structure entry for a pawn key.
+        """
+        slot = key & self.mask
+        self.keys[slot] = key
+        self.entries[slot] = entry
+
+    def statistics(self):
+        """
+        Returns:
+            dict: 'probes', 'hits' and 'hit_rate' (the fraction of probes that hit).
+        """
+        return {'probes': self.probes, 'hits': self.hits,
+                'hit_rate': self.hits / self.probes if self.probes else 0.0}
+
+
+class Evaluator:
+    def __init__(self, pawn_hash_entries=PAWN_HASH_ENTRIES):
+        """
+        Full evaluation: the board's running piece-square totals plus pawn structure, king pawn
+        shields and passed pawn king distances, tapered together.
+        Args:
+            pawn_hash_entries (int): Size of the pawn hash table.
+        """
+        self.pawn_table = PawnHashTable(pawn_hash_entries)
+
+    def attach(self, board):
+        """
+        Prepares a board for evaluation. The board's running totals are all this evaluator needs, so
+        there is nothing to do; see nnue.NNUEEvaluator for one that keeps state on the board.
+        """
+
+    def detach(self, board):
+        """
+        Reverses attach.
+        """
+
+    def pawn_entry(self, board):
+        """
+        Returns:
+            tuple: (middlegame, endgame, white passed, black passed, white pawns, black pawns) for the
+            board's pawns, from the pawn hash table when it has them.
+        """
+        entry = self.pawn_table.probe(board.pawn_key)
+        if entry is None:
+            white_pawns, black_pawns = board.pawn_bitboards()
+            entry = pawn_structure(white_pawns, black_pawns) + (white_pawns, black_pawns)
+            self.pawn_table.store(board.pawn_key, entry)
+        return entry
+
+    def evaluate(self, board):
+        """
+        Returns:
+            int: The score in centipawns, positive when white is better.
+        """
+        middlegame, endgame, white_passed, black_passed, white_pawns, black_pawns = self.pawn_entry(board)
+        white_king, black_king = board.king_squares()
+
+        close, far = SHIELD_MASKS[0][white_king]
+        if close:
+            middlegame += (PAWN_SHIELD[0] * bin(white_pawns & close).count('1')
+                           + PAWN_SHIELD[1] * bin(white_pawns & far).count('1'))
+        close, far = SHIELD_MASKS[1][black_king]
+        if close:
+            middlegame -= (PAWN_SHIELD[0] * bin(black_pawns & close).count('1')
+                           + PAWN_SHIELD[1] * bin(black_pawns & far).count('1'))
+
+        while white_passed:
+            bit = white_passed & -white_passed
+            white_passed ^= bit
+            stop = bit.bit_length() - 9
+            endgame += PASSED_PAWN_KING_DISTANCE * (DISTANCE[black_king][stop] - DISTANCE[white_king][stop])
+        while black_passed:
+            bit = black_passed & -black_passed
+            black_passed ^= bit
+            stop = bit.bit_length() + 7
+            endgame -= PASSED_PAWN_KING_DISTANCE * (DISTANCE[white_king][stop] - DISTANCE[black_king][stop])
+
+        return tapered_score(board.middlegame_score + middlegame, board.endgame_score + endgame, board.phase)
@@ -0,0 +1,112 @@
+# fen.py
+#
+# Forsyth-Edwards Notation. parse_fen and format_fen convert between FEN strings and a plain
+# position dictionary, which the boards load from (_set_position) and export to (to_fen).
+
+STARTING_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# Piece name by FEN letter
+FEN_PIECES = {letter: color + letter.upper() for color, letters in (('w', 'PNBRQK'), ('b', 'pnbrqk'))
+              for letter in letters}
+
+
+def parse_fen(fen):
+    """
+    Parses a FEN string.
+    Args:
+        fen (str): The position in Forsyth-Edwards Notation. The move counters may be omitted.
+    Returns:
+        dict: 'pieces' (list of (piece, (row, col)) pairs, e.g. ('wK', (7, 4))), 'turn' ('white' or 'black'),
+        'castling_rights' (same layout as ChessBoard.castling_rights), 'en_passant_target' ((row, col) or None),
+        'halfmove_clock' and 'fullmove_number'. Castling rights whose king or rook is not on its home
+        square are dropped.
+    Raises:
+        ValueError: If the FEN is malformed, or its en passant square does not fit the side to move.
+    """
+    fields = fen.split()
+    if len(fields) < 4:
+        raise ValueError(f"Invalid FEN (expected at least 4 fields): {fen!r}")
+    placement, turn, castling, en_passant = fields[:4]
+
+    rows = placement.split('/')
+    if len(rows) != 8:
+        raise ValueError(f"Invalid FEN (expected 8 ranks): {fen!r}")
+    pieces = []
+    for row, rank in enumerate(rows):
+        col = 0
+        for char in rank:
+            piece = FEN_PIECES.get(char)
+            if piece is not None:
+                if col > 7:
+                    raise ValueError(f"Invalid FEN (rank {8 - row} too long): {fen!r}")
+                pieces.append((piece, (row, col)))
+                col += 1
+            elif char in '12345678':
+                col += ord(char) - 48
+            else:
+                raise ValueError(f"Invalid FEN (unknown piece {char!r}): {fen!r}")
+        if col != 8:
+            raise ValueError(f"Invalid FEN (rank {8 - row} has {col} squares): {fen!r}")
+
+    if turn not in ('w', 'b'):
+        raise ValueError(f"Invalid FEN (side to move {turn!r}): {fen!r}")
+    if castling != '-' and not set(castling) <= set('KQkq'):
+        raise ValueError(f"Invalid FEN (castling {castling!r}): {fen!r}")
+    # The en passant square is behind a pawn that has just double-pushed, so on rank 6 with white to move
+    if en_passant == '-':
+        en_passant_target = None
+    elif len(en_passant) == 2 and en_passant[0] in 'abcdefgh' and en_passant[1] == ('6' if turn == 'w' else '3'):
+        en_passant_target = (8 - int(en_passant[1]), ord(en_passant[0]) - ord('a'))
+    else:
+        raise ValueError(f"Invalid FEN (en passant square {en_passant!r}): {fen!r}")
+
+    # A castling right is dropped unless its king and rook are on their home squares
+    grid = {square: piece for piece, square in pieces}
+    rights = {}
+    for color, prefix, row, letters in (('white', 'w', 7, 'KQ'), ('black', 'b', 0, 'kq')):
+        king_home = grid.get((row, 4)) == prefix + 'K'
+        rights[color] = {side: letter in castling and king_home and grid.get((row, col)) == prefix + 'R'
+                         for side, letter, col in (('king_side', letters[0], 7), ('queen_side', letters[1], 0))}
+
+    return {
+        'pieces': pieces,
+        'turn': 'white' if turn == 'w' else 'black',
+        'castling_rights': rights,
+        'en_passant_target': en_passant_target,
+        'halfmove_clock': int(fields[4]) if len(fields) > 4 else 0,
+        'fullmove_number': int(fields[5]) if len(fields) > 5 else 1,
+    }
+
+
+def format_fen(position):
+    """
+    Formats a position as FEN, the inverse of parse_fen.
+    Args:
+        position (dict): A position in the layout returned by parse_fen.
+    Returns:
+        str: The position in Forsyth-Edwards Notation.
+    """
+    grid = {square: piece for piece, square in position['pieces']}
+    ranks = []
+    for row in range(8):
+        rank = ''
+        empty = 0
+        for col in range(8):
+            piece = grid.get((row, col))
+            if piece is None:
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            rank += piece[1] if piece[0] == 'w' else piece[1].lower()
+        ranks.append(rank + str(empty) if empty else rank)
+
+    rights = position['castling_rights']
+    castling = ''.join(letter for letter, color, side in (('K', 'white', 'king_side'), ('Q', 'white', 'queen_side'),
+                                                          ('k', 'black', 'king_side'), ('q', 'black', 'queen_side'))
+                       if rights[color][side])
+    target = position['en_passant_target']
+    en_passant = 'abcdefgh'[target[1]] + str(8 - target[0]) if target else '-'
+    return (f"{'/'.join(ranks)} {'w' if position['turn'] == 'white' else 'b'} {castling or '-'} {en_passant} "
+            f"{position['halfmove_clock']} {position['fullmove_number']}")
@@ -1,20 +1,28 @@
 import pygame
 from pprint import pprint
-from chess_board import ChessBoard
+from backends import create_board
 
 class GameController:
-    def __init__(self, screen, ai=None):
+    def __init__(self, screen, ai=None, backend='mailbox', instrumentation=None):
         """
         Initializes the game controller, including the chessboard and pygame.
+        Args:
+            screen (pygame.Surface): The main display surface.
+            ai (ChessAI): Optional AI opponent playing black.
+            backend (str): Board representation to play on ('mailbox' or 'bitboard').
+            instrumentation (Instrumentation): Optional receiver for the events of every move played.
         """
         pygame.init()
         self.screen = screen  # 480x480 pixel window
         self.ai = ai
+        self.backend = backend
+        self.instrumentation = instrumentation
         pygame.display.set_caption("Chess Game")
         self.clock = pygame.time.Clock()
 
         # Chessboard and game state
-        self.board = ChessBoard()
+        self.board = create_board(backend)
+        self.board.instrumentation = instrumentation
         self.selected_piece = None  # Currently selected piece (row, col)
         self.legal_moves = []       # Legal moves for the selected piece
         self.running = True         # Main game loop flag
@@ -37,13 +45,14 @@ class GameController:
         Draws the chessboard and all pieces.
         """
         colors = [pygame.Color(240, 217, 181), pygame.Color(181, 136, 99)]  # Light and dark squares
+        grid = self.board.board  # Built on request by the board, so fetch it once per frame
         for row in range(8):
             for col in range(8):
                 color = colors[(row + col) % 2]
                 pygame.draw.rect(self.screen, color, pygame.Rect(col * 60, row * 60, 60, 60))
 
                 # Draw piece if present
-                piece = self.board.board[row][col]
+                piece = grid[row][col]
                 if piece != '..':
                     self.screen.blit(self.piece_images[piece], (col * 60, row * 60))
 
@@ -57,8 +66,7 @@ class GameController:
                              pygame.Rect(col * 60, row * 60, 60, 60), 5)  # Highlight selected piece
 
             for move in self.legal_moves:
-                _, end_pos = move
-                r, c = end_pos
+                r, c = move[1]  # Under-promotions carry the piece type as a third element
                 pygame.draw.circle(self.screen, pygame.Color(0, 255, 0),
                                    (c * 60 + 30, r * 60 + 30), 10)  # Highlight possible moves
 
@@ -89,20 +97,32 @@ class GameController:
                 piece = self.board.board[row][col]
                 if piece.startswith(self.board.turn[0]):  # Select a piece of the current player
                     self.selected_piece = (row, col)
-                    self.legal_moves = self.board._get_piece_moves((row, col), piece)
+                    # A click picks a square, not a piece type, so promotions from the GUI are always to a
+                    # queen and the under-promotions are left out
+                    self.legal_moves = [move for move in self.board.legal_move_index().get((row, col), [])
+                                        if len(move) == 2]
 
     def ai_turn(self):
         """
         Executes the AI's turn after the board is updated.
         """
-        legal_moves = self.board.generate_legal_moves(self.board.turn)  # Use updated board state
         ai_move = self.ai.choose_move(self.board)  # Choose a move
-        if ai_move in legal_moves:  # Ensure move is valid
+        if self.is_legal_move(ai_move):  # Ensure move is valid
             self.board.execute_move(ai_move)
             self.check_game_over()  # Check for game-ending conditions
         else:
             raise ValueError("AI attempted an illegal move!")
 
+    def is_legal_move(self, move):
+        """
+        Checks a move against the board's cached legal move index.
+        Args:
+            move (tuple): ((start_row, start_col), (end_row, end_col)), or None.
+        Returns:
+            bool: True if the move is legal for the side to move.
+        """
+        return move is not None and move in self.board.legal_move_index().get(move[0], ())
+
     def handle_ai_turn(self):
         """
         Handles the AI's turn by generating and executing its move.
@@ -117,10 +137,8 @@ class GameController:
         """
         Checks for game-ending conditions (checkmate or stalemate) and handles them.
         """
-        # Generate legal moves for the current player
-        legal_moves = self.board.generate_legal_moves(self.board.turn)
-
-        if not legal_moves:  # No legal moves
+        # The legal move index of the new position, reused by the next selection and AI move check
+        if not self.board.legal_move_index():  # No legal moves
             if self.board.is_check(self.board.turn):
                 self.show_popup("Checkmate", f"{self.board.turn.capitalize()} is checkmated! "
                                             f"{'Black' if self.board.turn == 'white' else 'White'} wins.")
@@ -200,7 +218,8 @@ class GameController:
         """
         Resets the game state to the initial setup for a new game.
         """
-        self.board = ChessBoard()  # Reinitialize the chessboard
+        self.board = create_board(self.backend)  # Reinitialize the chessboard
+        self.board.instrumentation = self.instrumentation
         self.selected_piece = None
         self.legal_moves = []
         self.running = True  # Resume the game loop
@@ -211,9 +230,8 @@ class GameController:
         """
         while self.running:
             if self.ai and self.board.turn == 'black':  # AI's turn (assuming AI plays as black)
-                legal_moves = self.board.generate_legal_moves(self.board.turn)
                 ai_move = self.ai.choose_move(self.board)
-                if ai_move in legal_moves:  # Validate AI move
+                if self.is_legal_move(ai_move):  # Validate AI move
                     self.board.execute_move(ai_move)
                     self.check_game_over()  # Check for game-ending conditions
                 else:
@@ -0,0 +1,131 @@
+# instrumentation.py
+#
+# Structured game events and counters. A board's instrumentation attribute is None by default,
+# so execute_move pays a single attribute test and search (which uses make_packed_move) pays
+# nothing at all. Attach an Instrumentation to a board to count events and pass them to sinks.
+#
+# Usage:
+#   events = Instrumentation(RingBufferSink(100), JsonLinesSink('game.jsonl'))
+#   board.instrumentation = events
+#   board.execute_move(((6, 4), (4, 4)))
+#   events.counters['move']  ->  1
+
+import json
+import logging
+from collections import Counter, deque
+
+from attack_tables import POSITIONS
+from moves import CAPTURE, EN_PASSANT, KING_CASTLE, QUEEN_CASTLE, PROMOTION, PROMOTION_LETTERS, move_to_uci
+
+# Event names
+MOVE = 'move'
+CAPTURE_EVENT = 'capture'
+CASTLE = 'castle'
+EN_PASSANT_EVENT = 'en_passant'
+PROMOTION_EVENT = 'promotion'
+CHECK = 'check'
+EVENTS = (MOVE, CAPTURE_EVENT, CASTLE, EN_PASSANT_EVENT, PROMOTION_EVENT, CHECK)
+
+
+class Instrumentation:
+    def __init__(self, *sinks):
+        """
+        Args:
+            sinks: Callables that receive each event as a dictionary with at least 'event' and 'ply'.
+        """
+        self.sinks = list(sinks)
+        self.counters = Counter()  # Number of events seen, by event name
+
+    def emit(self, event, **fields):
+        """
+        Counts an event and passes it to every sink.
+        Args:
+            event (str): The event name.
+            fields: Event details.
+        """
+        self.counters[event] += 1
+        if self.sinks:
+            record = {'event': event, **fields}
+            for sink in self.sinks:
+                sink(record)
+
+    def execute(self, board, move):
+        """
+        Makes a packed move on the board and emits the events it produces.
+        Args:
+            board (ChessBoard or BitboardChessBoard): The board to play on.
+            move (int): The packed move.
+        """
+        start, end = POSITIONS[move & 63], POSITIONS[move >> 6 & 63]
+        flags = move >> 12
+        color = board.turn
+        piece = board.piece_at(start)
+        captured_position = (start[0], end[1]) if flags == EN_PASSANT else end
+        captured = board.piece_at(captured_position)
+
+        board.make_packed_move(move)
+        ply = len(board.move_history)
+        uci = move_to_uci(move)
+        self.emit(MOVE, ply=ply, move=uci, color=color, piece=piece)
+        if flags & CAPTURE:
+            self.emit(CAPTURE_EVENT, ply=ply, move=uci, color=color, piece=piece, captured=captured,
+                      square=list(captured_position))
+        if flags == EN_PASSANT:
+            self.emit(EN_PASSANT_EVENT, ply=ply, move=uci, color=color)
+        elif flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            self.emit(CASTLE, ply=ply, move=uci, color=color,
+                      side='king_side' if flags == KING_CASTLE else 'queen_side')
+        elif flags & PROMOTION:
+            self.emit(PROMOTION_EVENT, ply=ply, move=uci, color=color,
+                      piece=color[0] + PROMOTION_LETTERS[flags & 3])
+        if board.is_check(board.turn):
+            self.emit(CHECK, ply=ply, move=uci, color=board.turn)
+
+
+class LoggingSink:
+    def __init__(self, logger=None, level=logging.DEBUG):
+        """
+        Args:
+            logger (logging.Logger): Destination logger, the 'chess.events' logger if omitted.
+            level (int): Level the events are logged at.
+        """
+        self.logger = logger or logging.getLogger('chess.events')
+        self.level = level
+
+    def __call__(self, record):
+        self.logger.log(self.level, "%s %s", record['event'], record)
+
+
+class RingBufferSink:
+    def __init__(self, capacity=1000):
+        """
+        Keeps the most recent events in memory.
+        Args:
+            capacity (int): Number of events kept; older ones are dropped.
+        """
+        self.events = deque(maxlen=capacity)
+
+    def __call__(self, record):
+        self.events.append(record)
+
+
+class JsonLinesSink:
+    def __init__(self, destination):
+        """
+        Writes one JSON object per event.
+        Args:
+            destination (str or file): A path to append to, or an open text stream.
+        """
+        if isinstance(destination, str):
+            self.stream = open(destination, 'a')
+            self._owns_stream = True
+        else:
+            self.stream = destination
+            self._owns_stream = False
+
+    def __call__(self, record):
+        self.stream.write(json.dumps(record) + '\n')
+
+    def close(self):
+        if self._owns_stream:
+            self.stream.close()
@@ -2,6 +2,9 @@ import pygame
 from game import GameController
 from chess_ai import ChessAI
 
+# Seconds the hard AI may think per move, so the window stays responsive
+AI_MOVE_TIME = 2.0
+
 class MainMenu:
     def __init__(self, screen):
         """
@@ -137,5 +140,5 @@ if __name__ == "__main__":
         ai_menu = AIDifficultyMenu(screen)
         ai_menu.run()
         if ai_menu.selected_difficulty:
-            ai = ChessAI(ai_menu.selected_difficulty)
+            ai = ChessAI(ai_menu.selected_difficulty, move_time=AI_MOVE_TIME)
             GameController(screen, ai).game_loop()
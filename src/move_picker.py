@@ -0,0 +1,218 @@
+# move_picker.py
+#
+# Staged, lazy move generation for the search. Instead of building and legality-filtering every
+# move up front, pick_moves yields legal packed moves one stage at a time:
+#
+#   1. the hash move (the best move from an earlier search of the position), if still playable
+#   2. captures and promotions, most valuable victim first, least valuable attacker breaking ties
+#   3. killer moves (quiet moves that caused a cutoff at the same ply elsewhere in the tree)
+#   4. the counter-move (the quiet move that last refuted the opponent's previous move)
+#   5. the remaining quiet moves, highest history score first
+#
+# Quiet moves are only generated once the earlier stages are exhausted, and each move is tested
+# for legality only when it is about to be yielded, so a node that cuts off on its first move
+# pays for little more than that move. pick_captures runs stage 2 alone, for quiescence search.
+# MoveOrdering holds the killer, history and counter-move tables a search learns as it goes,
+# together with statistics on how well the ordering works.
+
+from moves import CAPTURE, EN_PASSANT, PROMOTION, MAX_PLY
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+# Piece values for capture ordering, by piece type
+ORDER_VALUES = (1, 3, 3, 5, 9, 100)
+
+_NOISY = (CAPTURE | PROMOTION) << 12
+
+# History scores are halved for every new search, and whenever one grows past HISTORY_LIMIT
+HISTORY_LIMIT = 1 << 20
+
+
+def capture_score(board, move):
+    """
+    Scores a capture or promotion for ordering: the victim's value dominates and the attacker's value
+    breaks ties (MVV-LVA), with a promotion counting as winning the promoted piece.
+    Args:
+        board (ChessBoard or BitboardChessBoard): The position before the move.
+        move (int): The packed move.
+    Returns:
+        int: Higher scores are searched first.
+    """
+    flags = move >> 12
+    if flags == EN_PASSANT:
+        victim = ORDER_VALUES[PAWN]
+    elif flags & CAPTURE:
+        victim = ORDER_VALUES[board.piece_type_at(move >> 6 & 63)]
+    else:
+        victim = 0
+    if flags & PROMOTION:
+        victim += ORDER_VALUES[KNIGHT + (flags & 3)] - ORDER_VALUES[PAWN]
+    return victim * 128 - ORDER_VALUES[board.piece_type_at(move & 63)]
+
+
+def pick_moves(board, moves, scores, hash_move=0, killers=(), counter_move=0, history=None, in_check=None):
+    """
+    Yields the legal moves of the side to move in packed form, in search order.
+    The board must not be changed between resumptions except by moves that are undone before
+    the next one is requested, as in a normal make/search/undo loop.
+    Args:
+        board (ChessBoard or BitboardChessBoard): The position.
+        moves (list): Move buffer owned by this ply, e.g. one from allocate_move_buffers.
+        scores (list): Score buffer of the same size, also owned by this ply.
+        hash_move (int): Packed move to try first, or 0 for none.
+        killers (sequence): Packed quiet moves to try after the captures; 0 entries are ignored.
+        counter_move (int): Packed quiet move to try after the killers, or 0 for none.
+        history (list): Butterfly history scores (see MoveOrdering) that order the remaining quiet
+            moves, or None to leave them in generation order.
+        in_check (bool): Whether the side to move is in check, if the caller already knows.
+    Yields:
+        int: Each legal move exactly once.
+    """
+    if in_check is None:
+        in_check = board.is_check(board.turn)
+
+    if hash_move and board.is_pseudo_legal(hash_move) and board.is_legal(hash_move, in_check):
+        yield hash_move
+    tried = [hash_move]
+
+    # Captures and promotions: selection sort, so only as much ordering work is done as moves are taken
+    count = board.generate_noisy_moves(moves)
+    for index in range(count):
+        scores[index] = capture_score(board, moves[index])
+    yield from _select(board, moves, scores, count, tried, in_check)
+
+    # Killers and counter-moves are remembered from other positions, so they must be checked against this one
+    for move in (*killers, counter_move):
+        if move and move not in tried and not move & _NOISY:
+            tried.append(move)
+            if board.is_pseudo_legal(move) and board.is_legal(move, in_check):
+                yield move
+
+    count = board.generate_quiet_moves(moves)
+    if history is None:
+        for index in range(count):
+            move = moves[index]
+            if move not in tried and board.is_legal(move, in_check):
+                yield move
+        return
+    base = 0 if board.turn == 'white' else 4096
+    for index in range(count):
+        scores[index] = history[base + (moves[index] & 4095)]
+    yield from _select(board, moves, scores, count, tried, in_check)
+
+
+def pick_captures(board, moves, scores):
+    """
+    Yields the legal captures and promotions of the side to move in packed form, ordered by capture_score.
+    Args:
+        board (ChessBoard or BitboardChessBoard): The position.
+        moves (list): Move buffer owned by this ply.
+        scores (list): Score buffer of the same size, also owned by this ply.
+    Yields:
+        int: Each legal capture or promotion exactly once.
+    """
+    count = board.generate_noisy_moves(moves)
+    for index in range(count):
+        scores[index] = capture_score(board, moves[index])
+    yield from _select(board, moves, scores, count, (), board.is_check(board.turn))
+
+
+def _select(board, moves, scores, count, skip, in_check):
+    """
+    Yields the legal moves of a buffer from the highest score down, skipping moves already tried.
+    """
+    for index in range(count):
+        best = index
+        for other in range(index + 1, count):
+            if scores[other] > scores[best]:
+                best = other
+        move = moves[best]
+        if best != index:
+            moves[best], scores[best] = moves[index], scores[index]
+            moves[index] = move
+        if move not in skip and board.is_legal(move, in_check):
+            yield move
+
+
+class MoveOrdering:
+    def __init__(self):
+        """
+        Killer, history and counter-move tables for a search, and statistics on how often the first
+        move searched at a node was good enough to cut it off.
+        """
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]  # Two quiet cutoff moves per ply
+        # Butterfly tables, indexed by side * 4096 + (move & 4095), i.e. side, from and to squares.
+        # History accumulates depth * depth for every quiet cutoff move; the counter-move table is
+        # indexed by the opponent's previous move and holds the quiet move that refuted it.
+        self.history = [0] * 8192
+        self.counter_moves = [0] * 8192
+        self.cutoffs = 0             # Nodes that failed high
+        self.first_move_cutoffs = 0  # Of those, the nodes whose first move caused it
+        self.searched_before_cutoff = 0  # Moves searched before the cutoff move, summed over cutoffs
+
+    def new_search(self):
+        """
+        Starts a search: killers and statistics are cleared and history is aged, so that it follows
+        the current position rather than earlier ones.
+        """
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self._age_history()
+        self.cutoffs = self.first_move_cutoffs = self.searched_before_cutoff = 0
+
+    def _age_history(self):
+        history = self.history
+        for index in range(len(history)):
+            history[index] >>= 1
+
+    def counter_move(self, board):
+        """
+        Returns:
+            int: The stored reply to the move that led to the board's position, or 0.
+        """
+        history = board.move_history
+        if not history:
+            return 0
+        return self.counter_moves[(0 if board.turn == 'white' else 4096) + (history[-1] & 4095)]
+
+    def record_cutoff(self, board, move, ply, depth, move_number):
+        """
+        Learns from a move that failed high. Captures and promotions are already ordered by
+        capture_score, so only quiet moves update the killers, history and counter-moves.
+        Args:
+            board (ChessBoard or BitboardChessBoard): The position the move was played in.
+            move (int): The packed move.
+            ply (int): Distance from the root.
+            depth (int): The remaining depth the move was searched to.
+            move_number (int): How many moves were searched at the node before this one.
+        """
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+        self.searched_before_cutoff += move_number
+        if move & _NOISY:
+            return
+
+        killers = self.killers[ply]
+        if move != killers[0]:
+            killers[1] = killers[0]
+            killers[0] = move
+        base = 0 if board.turn == 'white' else 4096
+        index = base + (move & 4095)
+        self.history[index] += depth * depth
+        if self.history[index] > HISTORY_LIMIT:
+            self._age_history()
+        if board.move_history:
+            self.counter_moves[base + (board.move_history[-1] & 4095)] = move
+
+    def statistics(self):
+        """
+        Returns:
+            dict: 'cutoffs', 'first_move_cutoff_rate' (fraction of cutoffs made by the first move searched;
+            close to 1 means near-perfect ordering) and 'average_cutoff_index' (moves searched before the
+            cutoff move, on average).
+        """
+        return {
+            'cutoffs': self.cutoffs,
+            'first_move_cutoff_rate': self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+            'average_cutoff_index': self.searched_before_cutoff / self.cutoffs if self.cutoffs else 0.0,
+        }
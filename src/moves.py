@@ -0,0 +1,98 @@
+# moves.py
+#
+# Packed 16-bit move format used by move generation and search. Squares are numbered
+# row * 8 + col as in attack_tables, so a8 is 0 and h1 is 63.
+#
+#   bits 0-5    from square
+#   bits 6-11   to square
+#   bits 12-15  flags: bit 14 (CAPTURE) marks captures, bit 15 (PROMOTION) promotions, whose
+#               low two bits select the piece (knight, bishop, rook, queen)
+#
+# The GUI and the public board API keep using ((row, col), (row, col)) tuples; encode_move on
+# a board and decode_move here convert at that boundary.
+
+from attack_tables import POSITIONS
+
+QUIET = 0
+DOUBLE_PAWN_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EN_PASSANT = 5
+PROMOTION = 8
+KNIGHT_PROMOTION, BISHOP_PROMOTION, ROOK_PROMOTION, QUEEN_PROMOTION = 8, 9, 10, 11
+
+# Promotion piece letter by the low two flag bits, and the reverse
+PROMOTION_LETTERS = 'NBRQ'
+PROMOTION_FLAGS = {letter: PROMOTION | index for index, letter in enumerate(PROMOTION_LETTERS)}
+
+# Marks a null move (the side to move passing) in move_history; a8-a8 is never a real move
+NULL_MOVE = 0
+
+# Longest legal move list in any chess position is 218
+MAX_MOVES = 256
+MAX_PLY = 128
+
+
+def encode(from_square, to_square, flags=QUIET):
+    return from_square | to_square << 6 | flags << 12
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return move >> 6 & 63
+
+
+def move_flags(move):
+    return move >> 12
+
+
+def is_capture(move):
+    return bool(move & CAPTURE << 12)
+
+
+def is_promotion(move):
+    return bool(move & PROMOTION << 12)
+
+
+def decode_move(move):
+    """
+    Converts a packed move into the public move format.
+    Args:
+        move (int): The packed move.
+    Returns:
+        tuple: ((start_row, start_col), (end_row, end_col)), followed by the piece type for
+        under-promotions ('R', 'B' or 'N'); queen promotions use the plain two-square form.
+    """
+    flags = move >> 12
+    if flags & PROMOTION and flags & 3 != 3:
+        return POSITIONS[move & 63], POSITIONS[move >> 6 & 63], PROMOTION_LETTERS[flags & 3]
+    return POSITIONS[move & 63], POSITIONS[move >> 6 & 63]
+
+
+def move_to_uci(move):
+    """
+    Formats a packed move in UCI coordinate notation, e.g. 'e2e4' or 'e7e8q'.
+    """
+    text = ''
+    for square in (move & 63, move >> 6 & 63):
+        text += 'abcdefgh'[square & 7] + str(8 - (square >> 3))
+    if move >> 12 & PROMOTION:
+        text += PROMOTION_LETTERS[move >> 12 & 3].lower()
+    return text
+
+
+def allocate_move_buffers(plies=MAX_PLY):
+    """
+    Allocates one reusable move list per search ply, filled in place by a board's generate_moves.
+    Plain lists written by index are used rather than array('H'): CPython stores into them about
+    twice as fast as it appends to an array, and neither allocates once the buffer exists.
+    Args:
+        plies (int): The number of plies (search depth) to allocate for.
+    Returns:
+        list: plies lists of MAX_MOVES slots each.
+    """
+    return [[0] * MAX_MOVES for _ in range(plies)]
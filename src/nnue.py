@@ -0,0 +1,275 @@
+# nnue.py
+#
+# Efficiently updatable neural network evaluation. The input layer has one feature per piece code
+# and square (768 in all), seen from both sides: from white's side a feature is piece * 64 + square,
+# and from black's the colors are swapped and the board is mirrored, so that one set of weights
+# serves both. The input layer's output, the accumulator, is the feature bias plus the weight rows
+# of the features present. A move only switches a handful of features on or off, so an Accumulator
+# attached to a board adds and subtracts those rows as moves are made and restores the previous
+# values on undo, and no position is ever run through the input layer from scratch during a search.
+#
+# To evaluate, the side to move's accumulator and then the opponent's are clipped to [0, QA] and
+# passed through a few small dense layers, each also clipped, down to a single output:
+#
+#   768 -> HIDDEN (x 2 sides) -> layers ... -> 1
+#
+# Weights are quantized: the input layer's are int16 at scale QA, the dense layers' int16 at scale
+# QB with int32 biases at scale QA * QB, and the output is multiplied by the file's output scale to
+# give centipawns. Weight files (see save_network) are memory-mapped rather than read, so every
+# engine process using the same file shares one copy of the input layer weights, by far the
+# largest part of the network.
+#
+# Usage:
+#   ai = ChessAI('hard', network='weights.nnue')
+
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bitboard import CASTLING_ROOK_MOVES
+from moves import EN_PASSANT, KING_CASTLE, QUEEN_CASTLE, PROMOTION
+from zobrist import PIECE_NAMES
+
+MAGIC = b'NNUE'
+VERSION = 1
+# Magic, version, accumulator size, dense layer count and output scale, then each dense layer's size
+HEADER = struct.Struct('<4sIIII')
+LAYER_SIZE = struct.Struct('<I')
+ALIGNMENT = 64  # Every array in a weight file starts at a multiple of this many bytes
+
+INPUTS = 12 * 64
+QA = 255
+QB = 64
+
+# Evaluations are kept this far inside the mate scores of the search
+EVALUATION_LIMIT = 20000
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+# Feature of each piece code and 0-63 square from (white's side, black's side)
+FEATURES = [[(piece * 64 + square, (piece + 6) % 12 * 64 + (square ^ 56)) for square in range(64)]
+            for piece in range(12)]
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("The NNUE evaluation needs NumPy (pip install numpy)")
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_network(path, feature_weights, feature_bias, layers, output_scale):
+    """
+    Writes quantized weights in the format Network loads.
+    Args:
+        path (str): The file to write.
+        feature_weights (array-like): int16 input layer weights, shaped (INPUTS, hidden).
+        feature_bias (array-like): int16 input layer bias, shaped (hidden,).
+        layers (list): (weights, bias) of each dense layer in order: int16 weights shaped
+            (inputs, outputs), where the first layer has 2 * hidden inputs and the last one output,
+            and int32 biases shaped (outputs,).
+        output_scale (int): Centipawns per unit of the final output.
+    Raises:
+        ValueError: If the shapes do not fit together.
+    """
+    _require_numpy()
+    arrays = [np.ascontiguousarray(feature_weights, dtype='<i2'), np.ascontiguousarray(feature_bias, dtype='<i2')]
+    hidden = arrays[1].shape[0]
+    if arrays[0].shape != (INPUTS, hidden):
+        raise ValueError(f"Input layer weights must be shaped ({INPUTS}, {hidden}), not {arrays[0].shape}")
+    inputs = 2 * hidden
+    for weights, bias in layers:
+        weights = np.ascontiguousarray(weights, dtype='<i2')
+        bias = np.ascontiguousarray(bias, dtype='<i4')
+        if weights.ndim != 2 or weights.shape[0] != inputs or bias.shape != weights.shape[1:]:
+            raise ValueError(f"Layer shaped {weights.shape} with bias {bias.shape} does not take {inputs} inputs")
+        arrays += [weights, bias]
+        inputs = weights.shape[1]
+    if not layers or inputs != 1:
+        raise ValueError("The last layer must have a single output")
+
+    with open(path, 'wb') as weight_file:
+        weight_file.write(HEADER.pack(MAGIC, VERSION, hidden, len(layers), output_scale))
+        for weights, _ in layers:
+            weight_file.write(LAYER_SIZE.pack(np.shape(weights)[1]))
+        for values in arrays:
+            weight_file.write(bytes(_aligned(weight_file.tell()) - weight_file.tell()))
+            weight_file.write(values.tobytes())
+
+
+class Network:
+    def __init__(self, path):
+        """
+        Maps a weight file written by save_network. The input layer stays memory-mapped; the dense
+        layers are small and are converted to int32 for the forward pass.
+        Args:
+            path (str): The weight file.
+        Raises:
+            ImportError: If NumPy is not installed.
+            ValueError: If the file is not a weight file of this version.
+        """
+        _require_numpy()
+        self.path = path
+        with open(path, 'rb') as weight_file:
+            header = weight_file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError(f"Not an NNUE weight file: {path}")
+            magic, version, hidden, layer_count, output_scale = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Not an NNUE weight file of version {VERSION}: {path}")
+            sizes = [LAYER_SIZE.unpack(weight_file.read(LAYER_SIZE.size))[0] for _ in range(layer_count)]
+        self.hidden = hidden
+        self.output_scale = output_scale
+
+        offset = HEADER.size + LAYER_SIZE.size * layer_count
+
+        def load(dtype, shape):
+            nonlocal offset
+            offset = _aligned(offset)
+            values = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+            offset += values.nbytes
+            return values
+
+        self.feature_weights = load('<i2', (INPUTS, hidden))
+        self.feature_bias = load('<i2', (hidden,))
+        self.layers = []  # (weights, bias) of each dense layer, as int32
+        inputs = 2 * hidden
+        for outputs in sizes:
+            weights = load('<i2', (inputs, outputs))
+            bias = load('<i4', (outputs,))
+            self.layers.append((weights.astype(np.int32), bias.astype(np.int32)))
+            inputs = outputs
+
+    def forward(self, own, other):
+        """
+        Runs the dense layers.
+        Args:
+            own (ndarray): The side to move's accumulator.
+            other (ndarray): The opponent's accumulator.
+        Returns:
+            int: The evaluation in centipawns from the side to move's point of view.
+        """
+        values = np.clip(np.concatenate((own, other)), 0, QA).astype(np.int32)
+        last = len(self.layers) - 1
+        for index, (weights, bias) in enumerate(self.layers):
+            values = values @ weights + bias
+            if index < last:
+                values = np.clip(values // QB, 0, QA)
+        return int(values[0]) * self.output_scale // (QA * QB)
+
+
+class Accumulator:
+    def __init__(self, network, board):
+        """
+        Input layer outputs for a board and for every position before it since the accumulator was
+        attached; the board updates it as it makes and undoes moves (see attach).
+        Args:
+            network (Network): The network whose input layer is accumulated.
+            board (ChessBoard or BitboardChessBoard): The position to start from.
+        """
+        self.network = network
+        self.values = np.empty((64, 2, network.hidden), dtype=np.int16)  # Grown as needed
+        self.current = 0  # Index of the board's position in values
+        self.refresh(board)
+
+    def refresh(self, board):
+        """
+        Recomputes the values of the board's position from its pieces, dropping all earlier ones.
+        """
+        self.current = 0
+        self.values[0] = self.compute(board)
+
+    def compute(self, board):
+        """
+        Returns:
+            ndarray: The accumulator values of the board's position from scratch, shaped (2, hidden):
+            white's side first.
+        """
+        features = [FEATURES[PIECE_NAMES.index(name)][row * 8 + col]
+                    for name, positions in board.piece_positions.items() for row, col in positions]
+        values = np.empty((2, self.network.hidden), dtype=np.int16)
+        values[:] = self.network.feature_bias
+        if features:
+            values += self.network.feature_weights[np.array(features).T].sum(axis=1, dtype=np.int16)
+        return values
+
+    def push(self, move, piece, captured):
+        """
+        Updates the accumulator for a move. Called by the board when it makes a move.
+        Args:
+            move (int): The packed move.
+            piece (int): Piece code of the moving piece (the pawn, for a promotion).
+            captured (int): Piece code taken on the destination square, or None. En passant captures
+                are worked out from the move.
+        """
+        start = move & 63
+        end = move >> 6 & 63
+        flags = move >> 12
+        if self.current + 1 == len(self.values):
+            self.values = np.concatenate((self.values, np.empty_like(self.values)))
+        weights = self.network.feature_weights
+        previous = self.values[self.current]
+        self.current += 1
+        values = self.values[self.current]
+
+        if flags & PROMOTION:
+            added = piece - PAWN + KNIGHT + (flags & 3)
+        else:
+            added = piece
+        np.add(previous, weights[FEATURES[added][end], ], out=values)
+        values -= weights[FEATURES[piece][start], ]
+        if flags == EN_PASSANT:
+            side = piece // 6
+            values -= weights[FEATURES[(side ^ 1) * 6 + PAWN][end + (8 if side == 0 else -8)], ]
+        elif captured is not None:
+            values -= weights[FEATURES[captured][end], ]
+        elif flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            rook_start, rook_end = CASTLING_ROOK_MOVES[(start, end)]
+            rook = piece - KING + ROOK
+            values += weights[FEATURES[rook][rook_end], ]
+            values -= weights[FEATURES[rook][rook_start], ]
+
+    def pop(self):
+        """
+        Returns to the values before the last push. Called by the board when it undoes a move.
+        """
+        self.current -= 1
+
+
+class NNUEEvaluator:
+    def __init__(self, network):
+        """
+        Evaluates with a network. Boards must be attached first, so that they keep an accumulator.
+        Args:
+            network (Network or str): The network, or the path of its weight file.
+        """
+        self.network = network if isinstance(network, Network) else Network(network)
+
+    def attach(self, board):
+        """
+        Gives the board an accumulator for this evaluator's network, built from its current position.
+        """
+        board.accumulator = Accumulator(self.network, board)
+
+    def detach(self, board):
+        """
+        Removes the board's accumulator, so that its moves no longer pay for updating it.
+        """
+        board.accumulator = None
+
+    def evaluate(self, board):
+        """
+        Returns:
+            int: The score in centipawns, positive when white is better.
+        """
+        accumulator = board.accumulator
+        own, other = accumulator.values[accumulator.current]
+        if board.side:
+            own, other = other, own
+        score = self.network.forward(own, other)
+        score = max(-EVALUATION_LIMIT, min(EVALUATION_LIMIT, score))
+        return score if not board.side else -score
@@ -0,0 +1,130 @@
+# parallel_search.py
+#
+# Lazy SMP for ChessAI's 'hard' search. CPython threads cannot run the search loop in parallel, so
+# helper processes search the same position as the main search, all sharing one transposition table
+# in multiprocessing shared memory. The helpers find and store results the main search then reuses
+# instead of searching them itself, and half of them start one ply deeper so that they run ahead of
+# it. The main search decides when to stop: it raises a stop flag kept in the same shared block,
+# which the helpers check along with their own budget, and ChessAI then takes the result of
+# whichever search completed the deepest iteration.
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from backends import BACKENDS, create_board
+from transposition import TranspositionTable, table_bytes
+
+CONTROL_BYTES = 8  # The stop flag, ahead of the table in the shared block
+
+_helper = None  # (shared memory, ChessAI) of a helper process
+
+
+class SearchPool:
+    def __init__(self, helpers, hash_megabytes=16, network=None):
+        """
+        Starts the helper processes and the shared transposition table.
+        Args:
+            helpers (int): Number of helper processes, besides the process running the main search.
+            hash_megabytes (float): Memory cap of the shared transposition table.
+            network (str): Path of the NNUE weight file the helpers evaluate with, or None for the
+                hand-written evaluation. The file is memory-mapped, so all processes share its weights.
+        Raises:
+            OSError: If shared memory or the processes cannot be created.
+        """
+        self.helpers = helpers
+        self.broken = False  # Set once a helper process has died; the pool cannot be used any more
+        self._executor = None
+        self._stop = None
+        self.table = None
+        self._memory = shared_memory.SharedMemory(create=True, size=CONTROL_BYTES + table_bytes(hash_megabytes))
+        try:
+            self._stop = self._memory.buf[:CONTROL_BYTES].cast('Q')
+            self.table = TranspositionTable(hash_megabytes, self._memory.buf[CONTROL_BYTES:])
+            self._executor = ProcessPoolExecutor(helpers, initializer=_start_helper,
+                                                 initargs=(self._memory.name, hash_megabytes, network))
+        except BaseException:
+            self.close()
+            raise
+
+    def start(self, board, depth, move_time, max_nodes, features):
+        """
+        Sets the helpers searching a position. The table's age must already be that of the new search.
+        Args:
+            board (ChessBoard or BitboardChessBoard): The position; the helpers search copies of it.
+            depth, move_time, max_nodes, features: The search settings, as for ChessAI.
+        Returns:
+            list: One future per helper, to be passed to finish; empty if the pool is broken.
+        """
+        self._stop[0] = 0
+        backend = next(name for name, board_class in BACKENDS.items() if isinstance(board, board_class))
+        fen = board.to_fen()
+        try:
+            return [self._executor.submit(_search, fen, backend, depth, move_time, max_nodes, features,
+                                          self.table.age, 2 - index % 2)
+                    for index in range(self.helpers)]
+        except BrokenProcessPool:
+            self.broken = True
+            return []
+
+    def finish(self, futures):
+        """
+        Stops the helpers and waits for them.
+        Returns:
+            list: The helpers' results, as returned by _search. Helpers that died are left out and
+            mark the pool as broken.
+        """
+        self._stop[0] = 1
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except BrokenProcessPool:
+                self.broken = True
+        return results
+
+    def close(self):
+        """
+        Shuts the helper processes down and frees the shared memory. Any table taken from the pool
+        must be dropped first.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        self.table = None
+        if self._memory is not None:
+            if self._stop is not None:
+                self._stop.release()
+                self._stop = None
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+
+def _start_helper(name, hash_megabytes, network):
+    global _helper
+    from chess_ai import ChessAI  # chess_ai imports this module
+
+    memory = shared_memory.SharedMemory(name)
+    ai = ChessAI('hard', hash_megabytes=0, network=network)  # Its own table is replaced by the shared one
+    ai.table = TranspositionTable(hash_megabytes, memory.buf[CONTROL_BYTES:])
+    ai.stop_signal = memory.buf[:CONTROL_BYTES].cast('Q')
+    _helper = (memory, ai)
+
+
+def _search(fen, backend, depth, move_time, max_nodes, features, age, first_depth):
+    """
+    Runs one helper's search, in a helper process.
+    Returns:
+        dict: 'iterations', 'principal_variation' and 'nodes' of the search, as ChessAI records them.
+    """
+    ai = _helper[1]
+    if ai.stop_signal[0]:  # The main search finished before this helper got started
+        return {'iterations': [], 'principal_variation': [], 'nodes': 0}
+    ai.depth, ai.move_time, ai.max_nodes, ai.features = depth, move_time, max_nodes, features
+    ai.table.age = age
+    ai.ordering.new_search()
+    board = create_board(backend, fen)
+    ai.evaluator.attach(board)
+    ai._iterative_deepening(board, first_depth)
+    return {'iterations': ai.iterations, 'principal_variation': ai.principal_variation, 'nodes': ai.nodes}
@@ -0,0 +1,244 @@
+# perft.py
+#
+# Move generation correctness and throughput harness. perft counts the leaf nodes of the legal
+# move tree to a fixed depth; the counts for the standard positions below are known exactly,
+# so any move generator bug shows up as a mismatch and any slowdown as a drop in nodes/sec.
+#
+# Usage:
+#   python perft.py --depth 4                          run the suite on every backend
+#   python perft.py --backend bitboard --json out.json  write a machine-readable report
+#   python perft.py --baseline out.json                 flag throughput regressions against a report
+#   python perft.py --fen "<fen>" --depth 3 --divide    per-root-move node counts for debugging
+#   python perft.py --backend bulk --depth 5            NumPy bulk generation, a whole level at a time
+
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+from backends import BACKENDS, create_board
+from batch_evaluation import NUMPY_AVAILABLE
+from bulk_movegen import BoardArray, bulk_perft
+from fen import STARTING_FEN
+from moves import allocate_move_buffers
+
+# Standard positions with known node counts by depth
+PERFT_SUITE = [
+    {'name': 'startpos', 'fen': STARTING_FEN,
+     'nodes': {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}},
+    {'name': 'kiwipete', 'fen': 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     'nodes': {1: 48, 2: 2039, 3: 97862, 4: 4085603}},
+    {'name': 'endgame', 'fen': '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     'nodes': {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}},
+    {'name': 'promotions', 'fen': 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     'nodes': {1: 6, 2: 264, 3: 9467, 4: 422333}},
+    {'name': 'talkchess', 'fen': 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     'nodes': {1: 44, 2: 1486, 3: 62379, 4: 2103487}},
+    {'name': 'middlegame', 'fen': 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     'nodes': {1: 46, 2: 2079, 3: 89890, 4: 3894594}},
+]
+
+# Name under which bulk_movegen runs alongside the board backends; needs NumPy
+BULK = 'bulk'
+
+# Runs shorter than this are too noisy to compare against a baseline
+MIN_TIMED_SECONDS = 0.05
+
+
+def perft(board, depth):
+    """
+    Counts the leaf nodes of the legal move tree below the current position.
+    Args:
+        board (ChessBoard or BitboardChessBoard): The position to search; it is restored on return.
+        depth (int): The number of plies to search.
+    Returns:
+        int: The number of leaf nodes.
+    """
+    return _perft(board, depth, allocate_move_buffers(max(depth, 1)))
+
+
+def _perft(board, depth, buffers):
+    if depth == 0:
+        return 1
+    moves = buffers[depth - 1]
+    count = board.generate_moves(moves)
+    if depth == 1:  # Bulk counting: the leaves are the legal moves themselves
+        return count
+    nodes = 0
+    for index in range(count):
+        board.make_packed_move(moves[index])
+        nodes += _perft(board, depth - 1, buffers)
+        board.undo_move()
+    return nodes
+
+
+def divide(board, depth):
+    """
+    Splits a perft count by root move, for narrowing down a move generation bug.
+    Args:
+        board (ChessBoard or BitboardChessBoard): The position to search; it is restored on return.
+        depth (int): The number of plies to search (at least 1).
+    Returns:
+        dict: Maps each legal root move to the number of leaf nodes below it.
+    """
+    counts = {}
+    buffers = allocate_move_buffers(depth)
+    for move in board.generate_legal_moves(board.turn):
+        board.make_move(move)
+        counts[move] = _perft(board, depth - 1, buffers)
+        board.undo_move()
+    return counts
+
+
+def format_move(move):
+    """
+    Formats a move in coordinate notation, e.g. 'e2e4' or 'e7e8n' for an under-promotion.
+    """
+    (start_row, start_col), (end_row, end_col) = move[0], move[1]
+    text = f"{'abcdefgh'[start_col]}{8 - start_row}{'abcdefgh'[end_col]}{8 - end_row}"
+    return text + move[2].lower() if len(move) > 2 else text
+
+
+def run_position(backend, fen, depth):
+    """
+    Times a single perft run.
+    Args:
+        backend (str): Name of the board backend, or BULK.
+        fen (str): The position.
+        depth (int): The search depth.
+    Returns:
+        dict: 'nodes', 'seconds' and 'nodes_per_second'.
+    """
+    if backend == BULK:
+        boards = BoardArray.from_fens([fen])
+        start = time.perf_counter()
+        nodes = int(bulk_perft(boards, depth)[0])
+    else:
+        board = create_board(backend, fen)
+        start = time.perf_counter()
+        nodes = perft(board, depth)
+    seconds = time.perf_counter() - start
+    return {'nodes': nodes, 'seconds': seconds, 'nodes_per_second': nodes / seconds if seconds > 0 else 0.0}
+
+
+def run_suite(backends, max_depth, positions=PERFT_SUITE, report=print):
+    """
+    Runs every suite position at every known depth up to max_depth on each backend.
+    Args:
+        backends (list): Backend names, which may include BULK.
+        max_depth (int): The deepest depth to run.
+        positions (list): Suite entries with 'name', 'fen' and 'nodes'.
+        report (callable): Called with one formatted line per run, or None for silence.
+    Returns:
+        list: One result dictionary per run, including the expected count and whether it matched.
+    """
+    results = []
+    for backend in backends:
+        for position in positions:
+            for depth, expected in sorted(position['nodes'].items()):
+                if depth > max_depth:
+                    break
+                result = run_position(backend, position['fen'], depth)
+                result.update({'position': position['name'], 'backend': backend, 'depth': depth,
+                               'expected': expected, 'passed': result['nodes'] == expected})
+                results.append(result)
+                if report:
+                    status = 'ok' if result['passed'] else f"MISMATCH (expected {expected})"
+                    report(f"{backend:<9} {position['name']:<11} depth {depth}: {result['nodes']:>9} nodes "
+                           f"{result['seconds']:8.3f}s {result['nodes_per_second']:>10.0f} nps  {status}")
+    return results
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Compares throughput with a previous report.
+    Args:
+        results (list): Results from run_suite.
+        baseline (dict): A report previously written by this module.
+        tolerance (float): Allowed fractional drop in nodes/sec (0.2 means 20% slower is accepted).
+    Returns:
+        list: (backend, position, depth, baseline nps, current nps) for each run that got slower.
+    """
+    previous = {(result['backend'], result['position'], result['depth']): result['nodes_per_second']
+                for result in baseline['results'] if result['seconds'] >= MIN_TIMED_SECONDS}
+    regressions = []
+    for result in results:
+        key = (result['backend'], result['position'], result['depth'])
+        if result['seconds'] < MIN_TIMED_SECONDS:
+            continue
+        if key in previous and result['nodes_per_second'] < previous[key] * (1 - tolerance):
+            regressions.append(key + (previous[key], result['nodes_per_second']))
+    return regressions
+
+
+def build_report(results):
+    """
+    Returns:
+        dict: A JSON-serialisable report of a suite run.
+    """
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft move generation correctness and speed suite.")
+    parser.add_argument('--backend', nargs='+', choices=sorted(BACKENDS) + ([BULK] if NUMPY_AVAILABLE else []),
+                        default=sorted(BACKENDS), help="board backends to run (default: all but bulk)")
+    parser.add_argument('--depth', type=int, default=3, help="maximum depth (default: 3)")
+    parser.add_argument('--position', nargs='+', choices=[position['name'] for position in PERFT_SUITE],
+                        help="suite positions to run (default: all)")
+    parser.add_argument('--fen', help="run a single position instead of the suite")
+    parser.add_argument('--divide', action='store_true', help="with --fen, print node counts per root move")
+    parser.add_argument('--json', metavar='PATH', help="write a JSON report of the suite run")
+    parser.add_argument('--baseline', metavar='PATH', help="JSON report to compare nodes/sec against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed fractional nodes/sec drop against the baseline (default: 0.2)")
+    args = parser.parse_args(argv)
+    if args.divide and BULK in args.backend:
+        parser.error("--divide needs a board backend, not bulk")
+
+    if args.fen:
+        for backend in args.backend:
+            if args.divide:
+                counts = divide(create_board(backend, args.fen), args.depth)
+                for move, nodes in sorted(counts.items(), key=lambda item: format_move(item[0])):
+                    print(f"{format_move(move)}: {nodes}")
+                print(f"{backend}: {len(counts)} moves, {sum(counts.values())} nodes")
+            else:
+                result = run_position(backend, args.fen, args.depth)
+                print(f"{backend}: {result['nodes']} nodes {result['seconds']:.3f}s "
+                      f"{result['nodes_per_second']:.0f} nps")
+        return 0
+
+    positions = PERFT_SUITE
+    if args.position:
+        positions = [position for position in PERFT_SUITE if position['name'] in args.position]
+    results = run_suite(args.backend, args.depth, positions)
+
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump(build_report(results), report_file, indent=2)
+
+    status = 0
+    failures = [result for result in results if not result['passed']]
+    if failures:
+        print(f"{len(failures)} of {len(results)} runs returned the wrong node count")
+        status = 1
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file), args.tolerance)
+        for backend, position, depth, before, after in regressions:
+            print(f"Regression: {backend} {position} depth {depth}: {before:.0f} -> {after:.0f} nps")
+        if regressions:
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# transposition.py
+#
+# Transposition table for the search, keyed by the boards' 64-bit Zobrist keys. Entries live in two
+# flat unsigned 64-bit arrays (the full key, and the packed entry) sized once from a memory cap, so
+# the table never grows and holds no per-entry Python objects. The arrays can also be laid over a
+# buffer shared between processes (see parallel_search.py); the key is stored XORed with its
+# entry, so an entry torn by two processes writing the same slot at once fails the key check
+# instead of being read back as another position's. Slots are paired into buckets:
+#
+#   slot 0  depth-preferred: replaced by a deeper (or equally deep) search of any position, or by
+#           anything once its entry is left over from an earlier search (a different age)
+#   slot 1  always-replace: takes every store that slot 0 refuses
+#
+# Packed entry layout:
+#
+#   bits 0-19   score + SCORE_OFFSET (scores must lie within +-SCORE_OFFSET)
+#   bits 20-35  packed best move (see moves.py), 0 for none
+#   bits 36-43  depth
+#   bits 44-45  bound type, 0 for an empty slot
+#   bits 46-51  age of the search that stored it
+
+from array import array
+
+# Bound types
+EXACT, LOWER, UPPER = 1, 2, 3
+
+SCORE_OFFSET = 1 << 19
+ENTRY_BYTES = 16  # Key and packed entry
+MAX_AGE = 64
+
+
+def table_bytes(megabytes):
+    """
+    Returns:
+        int: The memory a TranspositionTable with this cap uses: the largest power-of-two number
+        of buckets that fits.
+    """
+    buckets = 1
+    while buckets * 4 * ENTRY_BYTES <= megabytes * 1024 * 1024:
+        buckets *= 2
+    return buckets * 2 * ENTRY_BYTES
+
+
+class TranspositionTable:
+    def __init__(self, megabytes=16, buffer=None):
+        """
+        Args:
+            megabytes (float): Memory cap; the table uses table_bytes(megabytes) bytes.
+            buffer (buffer): Writable memory of at least that size to keep the table in, e.g. the buf of a
+                multiprocessing.shared_memory.SharedMemory, or None for memory of its own. Tables over
+                the same buffer share their entries.
+        """
+        size = table_bytes(megabytes)
+        slots = size // ENTRY_BYTES
+        self.mask = slots // 2 - 1
+        if buffer is None:
+            self.keys = array('Q', bytes(slots * 8))
+            self.entries = array('Q', bytes(slots * 8))
+        else:
+            words = memoryview(buffer)[:size].cast('Q')
+            self.keys = words[:slots]
+            self.entries = words[slots:]
+        self.age = 0
+        self.probes = 0  # Lookups since the table was created or cleared
+        self.hits = 0    # Lookups that found their position
+
+    def __len__(self):
+        return len(self.keys)
+
+    def clear(self):
+        """
+        Empties the table.
+        """
+        zeros = array('Q', bytes(len(self.keys) * 8))
+        self.keys[:] = zeros
+        self.entries[:] = zeros
+        self.age = 0
+        self.probes = self.hits = 0
+
+    def new_search(self):
+        """
+        Advances the age, so entries from earlier searches give way in the depth-preferred slots.
+        """
+        self.age = (self.age + 1) % MAX_AGE
+
+    def probe(self, key):
+        """
+        Looks up a position.
+        Args:
+            key (int): The position's Zobrist key.
+        Returns:
+            tuple: (depth, bound, score, move) for the stored entry, or None if the position is not stored.
+        """
+        self.probes += 1
+        slot = (key & self.mask) << 1
+        keys = self.keys
+        entries = self.entries
+        entry = entries[slot]
+        if keys[slot] ^ entry != key:
+            slot += 1
+            entry = entries[slot]
+            if keys[slot] ^ entry != key:
+                return None
+        if not entry >> 44 & 3:
+            return None
+        self.hits += 1
+        return entry >> 36 & 0xFF, entry >> 44 & 3, (entry & 0xFFFFF) - SCORE_OFFSET, entry >> 20 & 0xFFFF
+
+    def store(self, key, depth, bound, score, move):
+        """
+        Stores a search result, using the bucket's replacement scheme.
+        Args:
+            key (int): The position's Zobrist key.
+            depth (int): The remaining depth the position was searched to.
+            bound (int): EXACT, LOWER (the score is a lower bound) or UPPER.
+            score (int): The score.
+            move (int): The best packed move found, or 0.
+        """
+        slot = (key & self.mask) << 1
+        keys = self.keys
+        entries = self.entries
+        entry = entries[slot]
+        if keys[slot] ^ entry != key:
+            if entry >> 44 & 3 and entry >> 46 == self.age and entry >> 36 & 0xFF > depth:
+                slot += 1
+                entry = entries[slot]
+        if not move and keys[slot] ^ entry == key:  # Keep the best move of a shallower search of the same position
+            move = entry >> 20 & 0xFFFF
+        entry = (score + SCORE_OFFSET) | move << 20 | depth << 36 | bound << 44 | self.age << 46
+        entries[slot] = entry
+        keys[slot] = key ^ entry
@@ -0,0 +1,88 @@
+# zobrist.py
+#
+# Zobrist keys for 64-bit position hashing. A position key is the XOR of one key per piece on
+# its square, the side key when black is to move, the key of the current castling rights and
+# the en passant file key when the side to move can actually capture en passant. The pawn key
+# is the XOR of the pawns' piece keys alone, for caching evaluation terms that depend only on
+# the pawns.
+
+import random
+
+PIECE_NAMES = ['wP', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bP', 'bN', 'bB', 'bR', 'bQ', 'bK']
+
+# Castling right bits, also used as the bitboard backend's castling mask
+WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE = 1, 2, 4, 8
+CASTLING_BITS = {'white': {'king_side': WHITE_KING_SIDE, 'queen_side': WHITE_QUEEN_SIDE},
+                 'black': {'king_side': BLACK_KING_SIDE, 'queen_side': BLACK_QUEEN_SIDE}}
+
+_generator = random.Random(0x5EED)  # Fixed seed so keys are identical across runs and processes
+
+
+def _random_key():
+    return _generator.getrandbits(64)
+
+
+# PIECE_KEYS['wP'][square], squares numbered row * 8 + col
+PIECE_KEYS = {piece: [_random_key() for _ in range(64)] for piece in PIECE_NAMES}
+SIDE_KEY = _random_key()
+_CASTLING_BIT_KEYS = [_random_key() for _ in range(4)]
+# One key per castling mask (0-15), the XOR of the keys of its set bits
+CASTLING_KEYS = [0] * 16
+for _mask in range(16):
+    for _bit in range(4):
+        if _mask & (1 << _bit):
+            CASTLING_KEYS[_mask] ^= _CASTLING_BIT_KEYS[_bit]
+EN_PASSANT_KEYS = [_random_key() for _ in range(8)]  # Indexed by file (column)
+
+
+def castling_mask(castling_rights):
+    """
+    Converts a castling_rights dictionary into its 4-bit mask.
+    Args:
+        castling_rights (dict): {'white': {'king_side': bool, 'queen_side': bool}, 'black': {...}}.
+    Returns:
+        int: The castling mask.
+    """
+    mask = 0
+    for color, sides in CASTLING_BITS.items():
+        for side, bit in sides.items():
+            if castling_rights[color][side]:
+                mask |= bit
+    return mask
+
+
+def compute_key(pieces, turn, castling, en_passant_file):
+    """
+    Computes a position key from scratch.
+    Args:
+        pieces (iterable): (piece, square) pairs for every piece on the board.
+        turn (str): The side to move ('white' or 'black').
+        castling (int): The castling mask.
+        en_passant_file (int): File of a capturable en passant target, or None.
+    Returns:
+        int: The 64-bit Zobrist key.
+    """
+    key = 0
+    for piece, square in pieces:
+        key ^= PIECE_KEYS[piece][square]
+    if turn == 'black':
+        key ^= SIDE_KEY
+    key ^= CASTLING_KEYS[castling]
+    if en_passant_file is not None:
+        key ^= EN_PASSANT_KEYS[en_passant_file]
+    return key
+
+
+def compute_pawn_key(pieces):
+    """
+    Computes a pawn key from scratch.
+    Args:
+        pieces (iterable): (piece, square) pairs for every piece on the board; only pawns count.
+    Returns:
+        int: The 64-bit pawn key.
+    """
+    key = 0
+    for piece, square in pieces:
+        if piece[1] == 'P':
+            key ^= PIECE_KEYS[piece][square]
+    return key
@@ -0,0 +1,8 @@
+# conftest.py
+#
+# The engine's modules live flat in src/ and import each other by name, as when it is run from there.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
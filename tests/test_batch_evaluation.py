@@ -0,0 +1,90 @@
+# test_batch_evaluation.py
+#
+# Checks the NumPy batch evaluation against the boards' own evaluation, and its mobility term
+# against a square-by-square count.
+
+import random
+
+import pytest
+
+from backends import BACKENDS, create_board
+from evaluation import MAX_PHASE, Evaluator
+from perft import PERFT_SUITE
+
+np = pytest.importorskip('numpy')
+from batch_evaluation import MOBILITY, encode_boards, encode_fens, evaluate_encoded  # noqa: E402
+
+KNIGHT, BISHOP, ROOK, QUEEN = 1, 2, 3, 4
+EMPTY = 12
+DIRECTIONS = {KNIGHT: ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)),
+              BISHOP: ((-1, -1), (-1, 1), (1, -1), (1, 1)),
+              ROOK: ((-1, 0), (1, 0), (0, -1), (0, 1))}
+DIRECTIONS[QUEEN] = DIRECTIONS[BISHOP] + DIRECTIONS[ROOK]
+
+PAWNLESS = ['4k3/8/8/3n4/8/2B5/8/R3K3 w Q - 0 1', '2r1k3/8/1q6/8/8/5N2/8/3QK3 b - - 0 1']
+
+
+def _random_positions(backend, count=40, seed=0):
+    rng = random.Random(seed)
+    boards = []
+    for position in PERFT_SUITE:
+        board = create_board(backend, position['fen'])
+        for _ in range(count):
+            moves = board.generate_legal_moves(board.turn)
+            if not moves:
+                break
+            board.execute_move(rng.choice(moves))
+            boards.append(create_board(backend, board.to_fen()))
+    return boards
+
+
+def _reference_mobility(codes):
+    middlegame = endgame = 0
+    for square, code in enumerate(codes):
+        color, piece_type = divmod(code, 6)
+        if code == EMPTY or piece_type not in MOBILITY:
+            continue
+        count = 0
+        for row_step, col_step in DIRECTIONS[piece_type]:
+            row, col = divmod(square, 8)
+            while True:
+                row, col = row + row_step, col + col_step
+                if not (0 <= row < 8 and 0 <= col < 8):
+                    break
+                target = codes[row * 8 + col]
+                if target == EMPTY or target // 6 != color:
+                    count += 1
+                if target != EMPTY or piece_type == KNIGHT:
+                    break
+        sign = 1 if color == 0 else -1
+        middlegame += sign * MOBILITY[piece_type][0] * count
+        endgame += sign * MOBILITY[piece_type][1] * count
+    return middlegame, endgame
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_matches_board_evaluation(backend):
+    boards = _random_positions(backend)
+    codes = encode_boards(boards)
+    assert (codes == encode_fens([board.to_fen() for board in boards])).all()
+    assert evaluate_encoded(codes, mobility=False).tolist() == [board.evaluate() for board in boards]
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_matches_evaluator_without_pawns(backend):
+    boards = [create_board(backend, fen) for fen in PAWNLESS]
+    evaluator = Evaluator()
+    assert evaluate_encoded(encode_boards(boards), mobility=False).tolist() == \
+        [evaluator.evaluate(board) for board in boards]
+
+
+def test_mobility():
+    boards = _random_positions('bitboard', seed=1)
+    codes = encode_boards(boards)
+    with_mobility = evaluate_encoded(codes)
+    for board, row, score in zip(boards, codes.tolist(), with_mobility.tolist()):
+        middlegame, endgame = _reference_mobility(row)
+        phase = min(board.phase, MAX_PHASE)
+        total = ((board.middlegame_score + middlegame) * phase
+                 + (board.endgame_score + endgame) * (MAX_PHASE - phase))
+        assert score == (abs(total) // MAX_PHASE) * (1 if total >= 0 else -1)
@@ -0,0 +1,17 @@
+# test_epd.py
+
+import pytest
+
+from epd import parse_epd
+
+
+def test_parse_epd():
+    record = parse_epd('8/8/8/8/8/8/8/K1k5 w - - bm Ka2; id "test; one"; hmvc 3; fmvn 40;')
+    assert record['fen'] == '8/8/8/8/8/8/8/K1k5 w - - 3 40'
+    assert record['operations'] == {'bm': ['Ka2'], 'id': ['test; one'], 'hmvc': ['3'], 'fmvn': ['40']}
+
+
+@pytest.mark.parametrize('operations', ['hmvc;', 'fmvn;', 'hmvc 1 2;', 'fmvn x;'])
+def test_parse_epd_rejects_bad_move_counts(operations):
+    with pytest.raises(ValueError):
+        parse_epd(f'8/8/8/8/8/8/8/K1k5 w - - {operations}')
@@ -0,0 +1,33 @@
+# test_fen.py
+
+import pytest
+
+from backends import BACKENDS, create_board
+from fen import parse_fen
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_castling_rights_need_king_and_rook_at_home(backend):
+    board = create_board(backend, '4k3/8/8/8/8/8/8/4K3 w K - 0 1')
+    assert board.to_fen() == '4k3/8/8/8/8/8/8/4K3 w - - 0 1'
+    assert ((7, 4), (7, 6)) not in board.generate_legal_moves('white')
+    assert create_board(backend, 'r3k2r/8/8/8/8/8/8/R3K1R1 w KQkq - 0 1').to_fen() == \
+        'r3k2r/8/8/8/8/8/8/R3K1R1 w Qkq - 0 1'
+
+
+def test_en_passant_square_must_fit_side_to_move():
+    assert parse_fen('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1')['en_passant_target'] == (2, 3)
+    with pytest.raises(ValueError):
+        parse_fen('4k3/8/8/3pP3/8/8/8/4K3 b - d6 0 1')
+    with pytest.raises(ValueError):
+        parse_fen('4k3/8/8/8/3Pp3/8/8/4K3 w - d3 0 1')
+
+
+def test_bulk_castling_rights_need_king_and_rook_at_home():
+    pytest.importorskip('numpy')
+    from bulk_movegen import BoardArray
+
+    boards = BoardArray.from_fens(['4k3/8/8/8/8/8/8/4K3 w K - 0 1'])
+    assert boards.to_fens() == ['4k3/8/8/8/8/8/8/4K3 w - - 0 1']
+    positions, moves = boards.legal_moves()
+    assert '4k3/8/8/8/8/8/8/5RKR b - - 1 1' not in boards.make_moves(positions, moves).to_fens()
@@ -0,0 +1,54 @@
+# test_incremental.py
+#
+# Plays random games on both backends and checks the incrementally updated state against a full
+# recompute after every execute_move and undo_move.
+
+import random
+
+import pytest
+
+from backends import BACKENDS, create_board
+from perft import PERFT_SUITE
+
+GAMES = 4       # Random games per suite position
+GAME_LENGTH = 60
+
+
+def _check(board):
+    assert board.zobrist_key == board.compute_zobrist_key()
+    assert board.pawn_key == board.compute_pawn_key()
+    assert (board.middlegame_score, board.endgame_score, board.phase) == board.compute_evaluation_terms()
+
+
+def _play_random_games(backend, fen, seed):
+    """
+    Plays random moves from the position, taking some back again, and checks the board after each.
+    """
+    rng = random.Random(seed)
+    for _ in range(GAMES):
+        board = create_board(backend, fen)
+        board.debug_zobrist = True
+        board.debug_evaluation = True
+        start_key = board.zobrist_key
+        played = 0
+        for _ in range(GAME_LENGTH):
+            moves = board.generate_legal_moves(board.turn)
+            if not moves:
+                break
+            board.execute_move(rng.choice(moves))
+            played += 1
+            _check(board)
+            if rng.random() < 0.2:
+                board.undo_move()
+                played -= 1
+                _check(board)
+        for _ in range(played):
+            board.undo_move()
+            _check(board)
+        assert board.zobrist_key == start_key
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('position', PERFT_SUITE, ids=[position['name'] for position in PERFT_SUITE])
+def test_incremental_state_matches_recompute(backend, position):
+    _play_random_games(backend, position['fen'], position['name'])
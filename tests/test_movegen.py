@@ -0,0 +1,17 @@
+# test_movegen.py
+
+import pytest
+
+from backends import BACKENDS, create_board
+
+# After 1.e4 the en passant square e3 belongs to black's reply, not to white's pawns on d2 and f2
+AFTER_E4 = 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1'
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_en_passant_only_for_side_to_move(backend):
+    board = create_board(backend, AFTER_E4)
+    white_moves = board.generate_legal_moves('white')
+    assert ((6, 3), (5, 4)) not in white_moves and ((6, 5), (5, 4)) not in white_moves
+    assert len(white_moves) == 30
+    assert board._get_piece_moves((6, 3), 'wP') == [((6, 3), (5, 3)), ((6, 3), (4, 3))]
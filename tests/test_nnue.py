@@ -0,0 +1,87 @@
+# test_nnue.py
+#
+# Checks the incrementally updated NNUE accumulator against a full recompute, with a small random
+# network.
+
+import random
+
+import pytest
+
+from backends import BACKENDS, create_board
+from perft import PERFT_SUITE
+
+np = pytest.importorskip('numpy')
+from nnue import INPUTS, NNUEEvaluator, save_network  # noqa: E402
+
+HIDDEN = 32
+GAME_LENGTH = 40
+
+
+@pytest.fixture(scope='module')
+def evaluator(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    path = tmp_path_factory.mktemp('nnue') / 'random.nnue'
+    layers = [(rng.integers(-64, 64, (2 * HIDDEN, 8)), rng.integers(-4096, 4096, 8)),
+              (rng.integers(-64, 64, (8, 1)), rng.integers(-4096, 4096, 1))]
+    save_network(str(path), rng.integers(-32, 32, (INPUTS, HIDDEN)), rng.integers(-32, 32, HIDDEN), layers, 400)
+    return NNUEEvaluator(str(path))
+
+
+def _check(evaluator, backend, board):
+    accumulator = board.accumulator
+    assert (accumulator.values[accumulator.current] == accumulator.compute(board)).all()
+    fresh = create_board(backend, board.to_fen())
+    evaluator.attach(fresh)
+    assert evaluator.evaluate(board) == evaluator.evaluate(fresh)
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('position', PERFT_SUITE, ids=[position['name'] for position in PERFT_SUITE])
+def test_accumulator_matches_recompute(evaluator, backend, position):
+    rng = random.Random(position['name'])
+    board = create_board(backend, position['fen'])
+    evaluator.attach(board)
+    played = 0
+    for _ in range(GAME_LENGTH):
+        moves = board.generate_legal_moves(board.turn)
+        if not moves:
+            break
+        board.execute_move(rng.choice(moves))
+        played += 1
+        _check(evaluator, backend, board)
+        if rng.random() < 0.2:
+            board.undo_move()
+            played -= 1
+            _check(evaluator, backend, board)
+    for _ in range(played):
+        board.undo_move()
+        _check(evaluator, backend, board)
+    assert board.accumulator.current == 0
+    evaluator.detach(board)
+    assert board.accumulator is None
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_mirrored_positions_score_opposite(evaluator, backend):
+    board = create_board(backend, 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+    mirror = create_board(backend, 'r3k2r/pppbbppp/2n2q1P/1P2p3/3pn3/BN2PNP1/P1PPQPB1/R3K2R b KQkq - 0 1')
+    evaluator.attach(board)
+    evaluator.attach(mirror)
+    assert evaluator.evaluate(board) == -evaluator.evaluate(mirror)
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('position', PERFT_SUITE, ids=[position['name'] for position in PERFT_SUITE])
+def test_accumulator_every_move_two_plies(evaluator, backend, position):
+    # Every move to two plies, so that castling, en passant and promotions are all made and undone
+    board = create_board(backend, position['fen'])
+    evaluator.attach(board)
+    accumulator = board.accumulator
+    for move in board.generate_legal_moves(board.turn):
+        board.execute_move(move)
+        for reply in board.generate_legal_moves(board.turn):
+            board.execute_move(reply)
+            assert (accumulator.values[accumulator.current] == accumulator.compute(board)).all()
+            board.undo_move()
+        assert (accumulator.values[accumulator.current] == accumulator.compute(board)).all()
+        board.undo_move()
@@ -0,0 +1,31 @@
+# test_perft.py
+#
+# Runs the perft suite to a shallow depth, so that any move generator change that gets a count
+# wrong fails here.
+
+import pytest
+
+from backends import BACKENDS, create_board
+from perft import PERFT_SUITE, perft
+
+MAX_DEPTH = 3
+
+CASES = [(position['fen'], depth, nodes) for position in PERFT_SUITE
+         for depth, nodes in position['nodes'].items() if depth <= MAX_DEPTH]
+IDS = [f"{position['name']}-{depth}" for position in PERFT_SUITE for depth in position['nodes'] if depth <= MAX_DEPTH]
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('fen, depth, nodes', CASES, ids=IDS)
+def test_perft(backend, fen, depth, nodes):
+    assert perft(create_board(backend, fen), depth) == nodes
+
+
+def test_bulk_perft():
+    pytest.importorskip('numpy')
+    from bulk_movegen import BoardArray, bulk_perft
+
+    boards = BoardArray.from_fens([position['fen'] for position in PERFT_SUITE])
+    for depth in range(1, MAX_DEPTH + 1):
+        expected = [position['nodes'][depth] for position in PERFT_SUITE]
+        assert bulk_perft(boards, depth).tolist() == expected
@@ -0,0 +1,38 @@
+# test_search.py
+
+import pytest
+
+from backends import BACKENDS, create_board
+from chess_ai import SEARCH_FEATURES, ChessAI
+
+# WAC.001: Qg6 mates, which the search must not reduce away at the root or on the principal variation
+WAC_001 = '2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - 0 1'
+QG6 = ((5, 6), (2, 6))
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_hard_finds_mate_with_all_features(backend):
+    ai = ChessAI('hard', depth=4)
+    assert ai.choose_move(create_board(backend, WAC_001)) == QG6
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_hard_finds_mate_with_late_move_reductions(backend):
+    ai = ChessAI('hard', depth=4, features={'pvs', 'lmr'})
+    assert ai.choose_move(create_board(backend, WAC_001)) == QG6
+
+
+# A position where a depth 5 search is quick, and each feature alone prunes or reorders the tree
+ENDGAME = '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1'
+
+
+def _nodes(backend, features):
+    ai = ChessAI('hard', depth=5, features=features)
+    ai.choose_move(create_board(backend, ENDGAME))
+    return ai.nodes
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('feature', sorted(SEARCH_FEATURES))
+def test_each_feature_changes_the_search_alone(backend, feature):
+    assert _nodes(backend, {feature}) != _nodes(backend, set())
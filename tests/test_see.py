@@ -0,0 +1,28 @@
+# test_see.py
+
+import pytest
+
+from backends import BACKENDS, create_board
+from moves import CAPTURE, encode
+
+# (FEN, capture, expected SEE in SEE_VALUES units)
+CASES = [
+    ('1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1', 'e1e5', 100),           # Undefended pawn
+    ('1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1', 'd3e5', -200),  # Knight for a pawn
+    ('4k3/8/2p5/3p4/4P3/8/8/4K3 w - - 0 1', 'e4d5', 0),                          # Pawn trade
+    ('4k3/8/1n6/3p4/8/5B2/8/4K3 w - - 0 1', 'f3d5', -200),                       # Bishop for a pawn
+    ('4k3/8/1n6/3p4/8/5B2/8/4K2Q w - - 0 1', 'f3d5', 100),                       # X-ray queen behind it
+    # Two queens attack b1: the lowest square (e4) recaptures first and uncovers the g6 bishop
+    ('2r1kB1r/3p2pp/5pbN/nPp3b1/q1PPQ3/5N2/P5PP/qR3Q1K b k - 0 11', 'a1b1', 200),
+]
+
+
+def _square(name):
+    return (8 - int(name[1])) * 8 + ord(name[0]) - ord('a')
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('fen, capture, expected', CASES)
+def test_see(backend, fen, capture, expected):
+    board = create_board(backend, fen)
+    assert board.see(encode(_square(capture[:2]), _square(capture[2:]), CAPTURE)) == expected